@@ -1,5 +1,7 @@
+from collections import defaultdict
+from multiprocessing import Pool
 from statistics import mean
-from typing import List, Dict, Tuple, Iterable
+from typing import List, Dict, Tuple, Iterable, NamedTuple, Optional, Sequence
 from types import SimpleNamespace as Namespace
 
 from pandas import DataFrame
@@ -85,8 +87,28 @@ def convert_to_aa_scores(nucleotide_scores: List[float]) -> List[float]:
     return scores
 
 
-def scores_for_proteins(proteins: Iterable, genes_data: DataFrame, big_wig_path: str) -> Tuple[Dict, Namespace]:
-    """Load conservation scores, average when needed, and transform into protein space."""
+def combine_tracks(protein_tracks: List[List[float]]) -> List[float]:
+    """Average non-empty tracks of a transcript mapping to more than one genomic location."""
+    if len(protein_tracks) > 1:
+        return [
+            mean(scores)
+            for scores in zip(*protein_tracks)
+        ]
+    return protein_tracks[0]
+
+
+def scores_for_proteins(
+    proteins: Iterable, genes_data: DataFrame, big_wig_path: str, processes: Optional[int] = None
+) -> Tuple[Dict, Namespace]:
+    """Load conservation scores, average when needed, and transform into protein space.
+
+    Args:
+        processes: number of worker processes to use; when given, the proteins
+            will be grouped by chromosome and processed in parallel, see
+            `scores_for_proteins_by_chromosome`.
+    """
+    if processes:
+        return scores_for_proteins_by_chromosome(proteins, genes_data, big_wig_path, processes)
 
     bw = pyBigWig.open(big_wig_path)
 
@@ -132,14 +154,215 @@ def scores_for_proteins(proteins: Iterable, genes_data: DataFrame, big_wig_path:
             continue
         elif len(protein_tracks) > 1:
             mapping_to_many.add(protein)
-            protein_track = [
-                mean(scores)
-                for scores in zip(*protein_tracks)
-            ]
-        else:
-            protein_track = protein_tracks[0]
 
-        score_tracks[protein] = convert_to_aa_scores(protein_track)
+        score_tracks[protein] = convert_to_aa_scores(combine_tracks(protein_tracks))
+
+    details = summarize(mapping_to_many, skipped_premature, skipped_key_error, skipped_track_mismatch)
+
+    return score_tracks, details
+
+
+class GenomicLocation(NamedTuple):
+    strand: str
+    cdsStart: int
+    cdsEnd: int
+    exonStarts: Tuple[int]
+    exonEnds: Tuple[int]
+
+
+class ProteinLocations(NamedTuple):
+    # position of the protein on the list of proteins given to the parent process
+    key: int
+    refseq: str
+    length: int
+    locations: List[GenomicLocation]
+
+    def __repr__(self):
+        return f'<Protein {self.refseq}>'
+
+
+class ChromosomeResults(NamedTuple):
+    score_tracks: Dict[int, List[float]]
+    mapping_to_many: set
+    skipped_key_error: set
+    skipped_track_mismatch: set
+
+
+class RegionTrack:
+    """Scores of a continuous region of a chromosome, served as if from BigWig file.
+
+    The region is fetched with a single query so that all the exons of all the
+    transcripts overlapping with the region can be extracted with cheap slicing.
+    """
+
+    def __init__(self, bw, chrom: str, start: int, end: int):
+        self.bw = bw
+        self.chrom = chrom
+        self.start = start
+        self.end = end
+        self.scores = None
+
+    def values(self, chrom: str, start: int, end: int) -> List[float]:
+        assert chrom == self.chrom and self.start <= start and end <= self.end
+        if self.scores is None:
+            # fetched on the first use, so that errors (e.g. a chromosome absent
+            # from the BigWig file) are raised when and as in the sequential path
+            self.scores = self.bw.values(self.chrom, self.start, self.end, numpy=True)
+        return self.scores[start - self.start:end - self.start].tolist()
+
+
+def overlapping_clusters(locations: Sequence[Tuple[GenomicLocation, ProteinLocations]]):
+    """Group genomic locations (sorted by CDS start) into clusters of overlapping coding regions.
+
+    Yields:
+        start and end of each cluster and the locations (with proteins) belonging to it
+    """
+    cluster = []
+    cluster_start = cluster_end = None
+
+    for location, protein in locations:
+        if cluster and location.cdsStart > cluster_end:
+            yield cluster_start, cluster_end, cluster
+            cluster = []
+        if not cluster:
+            cluster_start, cluster_end = location.cdsStart, location.cdsEnd
+        cluster_end = max(cluster_end, location.cdsEnd)
+        cluster.append((location, protein))
+
+    if cluster:
+        yield cluster_start, cluster_end, cluster
+
+
+def chromosome_scores(task: Tuple[str, str, List[ProteinLocations]]) -> ChromosomeResults:
+    """Compute scores for proteins from a single chromosome, using a BigWig handle owned by the worker.
+
+    Coding regions are visited in the genomic order; each cluster of overlapping
+    regions is read from the BigWig file only once and released afterwards.
+    """
+    big_wig_path, chrom, proteins = task
+
+    bw = pyBigWig.open(big_wig_path)
+
+    protein_tracks = defaultdict(list)
+    skipped_key_error = set()
+    skipped_track_mismatch = set()
+
+    locations = sorted(
+        (
+            (location, protein)
+            for protein in proteins
+            for location in protein.locations
+        ),
+        key=lambda location_and_protein: location_and_protein[0].cdsStart
+    )
+
+    for start, end, cluster in overlapping_clusters(locations):
+
+        region = RegionTrack(bw, chrom, start, end)
+
+        for location, protein in cluster:
+            try:
+                track = extract_track(location, protein, chrom, region)
+            except MismatchError:
+                skipped_track_mismatch.add(protein.key)
+                continue
+            except TypeError:
+                skipped_key_error.add(protein.key)
+                continue
+
+            if track:
+                protein_tracks[protein.key].append(track)
+
+    bw.close()
+
+    score_tracks = {}
+    mapping_to_many = set()
+
+    for key, tracks in protein_tracks.items():
+        if len(tracks) > 1:
+            mapping_to_many.add(key)
+        score_tracks[key] = convert_to_aa_scores(combine_tracks(tracks))
+
+    return ChromosomeResults(score_tracks, mapping_to_many, skipped_key_error, skipped_track_mismatch)
+
+
+def group_locations(genes_data: DataFrame) -> Dict[Tuple[str, str], List[GenomicLocation]]:
+    """Convert genes data into a (chrom, refseq) -> locations mapping with a single pass."""
+    locations = defaultdict(list)
+    columns = genes_data[list(GenomicLocation._fields)]
+
+    for (chrom, refseq), (strand, cds_start, cds_end, exon_starts, exon_ends) in zip(
+        genes_data.index, columns.itertuples(index=False)
+    ):
+        locations[chrom, refseq].append(
+            GenomicLocation(strand, int(cds_start), int(cds_end), exon_starts, exon_ends)
+        )
+    return locations
+
+
+def scores_for_proteins_by_chromosome(
+    proteins: Iterable, genes_data: DataFrame, big_wig_path: str, processes: int
+) -> Tuple[Dict, Namespace]:
+    """Load conservation scores like `scores_for_proteins`, processing chromosomes in parallel.
+
+    Proteins are grouped by chromosome and each chromosome is handled by a worker
+    process with its own BigWig handle; the results and the skipped proteins
+    are merged back in the parent process.
+    """
+    proteins = list(proteins)
+    locations = group_locations(genes_data)
+
+    skipped_premature = set()
+    skipped_key_error = set()
+    by_chromosome = defaultdict(list)
+
+    for key, protein in enumerate(proteins):
+
+        if '*' in protein.sequence[:-1]:
+            skipped_premature.add(protein)
+            continue
+
+        chrom = 'chr' + protein.gene.chrom
+        protein_locations = locations.get((chrom, protein.refseq))
+
+        if not protein_locations:
+            skipped_key_error.add(protein)
+            continue
+
+        by_chromosome[chrom].append(
+            ProteinLocations(key, protein.refseq, protein.length, protein_locations)
+        )
+
+    del locations
+
+    # the largest chromosomes first, so that these do not end up processed last
+    tasks = sorted(
+        (
+            (big_wig_path, chrom, chromosome_proteins)
+            for chrom, chromosome_proteins in by_chromosome.items()
+        ),
+        key=lambda task: len(task[2]),
+        reverse=True
+    )
+
+    score_tracks = {}
+    mapping_to_many = set()
+    skipped_track_mismatch = set()
+
+    with Pool(processes) as pool:
+        for results in progress_bar(pool.imap_unordered(chromosome_scores, tasks), total=len(tasks)):
+            for key, scores in results.score_tracks.items():
+                score_tracks[proteins[key]] = scores
+            mapping_to_many.update(proteins[key] for key in results.mapping_to_many)
+            skipped_key_error.update(proteins[key] for key in results.skipped_key_error)
+            skipped_track_mismatch.update(proteins[key] for key in results.skipped_track_mismatch)
+
+    details = summarize(mapping_to_many, skipped_premature, skipped_key_error, skipped_track_mismatch)
+
+    return score_tracks, details
+
+
+def summarize(mapping_to_many, skipped_premature, skipped_key_error, skipped_track_mismatch) -> Namespace:
 
     print(f'Averaged data for {len(mapping_to_many)} proteins mapping to more than one genomic location.')
     # print({protein.refseq for protein in mapping_to_many})
@@ -162,4 +385,4 @@ def scores_for_proteins(proteins: Iterable, genes_data: DataFrame, big_wig_path:
         )
     )
 
-    return score_tracks, details
+    return details
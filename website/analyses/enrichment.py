@@ -3,19 +3,20 @@ import random
 from collections import namedtuple, Counter, defaultdict
 from functools import reduce, partial
 from statistics import median, mean
-from typing import List, NamedTuple, Mapping, Dict
+from typing import List, NamedTuple, Mapping, Dict, Tuple
 
 import numpy as np
 from numpy import NaN
-from sqlalchemy import and_, func, distinct, desc
+from sqlalchemy import and_, func, distinct, desc, case, select, union_all, literal, inspect
 from sqlalchemy.orm import aliased
+from sqlalchemy.sql.util import find_tables
 from pandas import Series
 from tqdm import tqdm
 from scipy.stats import fisher_exact
 from interval import fpu
 from interval import interval
 
-from database import join_unique, db
+from database import join_unique, db, supports_window_functions
 from models import (
     Protein, Mutation, The1000GenomesMutation, MC3Mutation, InheritedMutation, Gene, Site,
     MutationSource, source_manager,
@@ -450,7 +451,7 @@ def disease_muts_affecting_ptm_sites():
         count_mutations_from_genes(cancer_genes, [MC3Mutation], only_preferred_isoforms)
 
 
-def prepare_for_summing(sources: List[MutationSource], count_distinct_substitutions=False) -> List:
+def prepare_for_summing(sources: List[MutationSource], count_distinct_substitutions=False, where=None) -> List:
     """Mutations from various sources can be summed up differently.
 
     Given list of mutation sources, checks if the mutation sources
@@ -466,25 +467,31 @@ def prepare_for_summing(sources: List[MutationSource], count_distinct_substituti
     unique occurrences of mutations from incompatible mutation
     sources is possible with `count_distinct_substitutions=True`.
 
+    Args:
+        where: if given, only the rows meeting this condition are counted
+
     Returns:
         list of expressions counting mutations from provided sources
     """
 
+    def only_where(value):
+        return value if where is None else case([(where, value)])
+
     if count_distinct_substitutions:
-        counts = [func.count(distinct(source.id)) for source in sources]
+        counts = [func.count(distinct(only_where(source.id))) for source in sources]
     else:
         source = sources[0]
 
         if hasattr(source, 'count'):
             assert all(hasattr(s, 'count') for s in sources)
             counts = [
-                func.sum(source.count)
+                func.sum(only_where(source.count))
                 for source in sources
             ]
         elif hasattr(source, 'maf_all'):
             assert all(hasattr(s, 'maf_all') for s in sources)
             counts = [
-                func.sum(source.maf_all)
+                func.sum(only_where(source.maf_all))
                 for source in sources
             ]
         else:
@@ -561,12 +568,139 @@ def most_mutated_sites(
             aliased(Site, query),
             total_muts_count,
         )
-        .order_by(desc(total_muts_count))
+        .order_by(desc(total_muts_count), query.c.id)
     )
 
     return query.limit(limit)
 
 
+Track = Tuple[List[MutationSource], bool, List[MutationSource]]
+
+
+def most_mutated_sites_by_track(
+    tracks: List[Track], site_type: SiteType = None, limit=25, mutation_filter=None, use_window_functions=None
+) -> List[List[Tuple[Site, float]]]:
+    """Most mutated sites for each of the tracks, counted in a single scan.
+
+    Returns the same results as calling `most_mutated_sites(sources, intersection=intersection,
+    exclusive=exclusive)` for each of the tracks given as (sources, intersection, exclusive).
+    As all the sources are joined at once, every source has to be either counted
+    or excluded in each of the tracks (otherwise its rows would multiply the counts).
+
+    A `mutation_filter` referring to some of the sources (e.g. ClinVar significance)
+    restricts only the tracks counting these sources; the tracks which exclude them
+    (e.g. "MC3 only") are counted as with `most_mutated_sites` without the filter.
+
+    The top sites of all tracks are selected by the database with ROW_NUMBER() window
+    function if supported, otherwise the counts of all sites are fetched and the top
+    sites are selected in Python (e.g. for MySQL 5.7).
+    """
+    all_sources = list({source: True for sources, intersection, exclusive in tracks for source in sources})
+
+    filtered_sources = set()
+    if mutation_filter is not None:
+        filtered_tables = set(find_tables(mutation_filter, check_columns=True))
+        filtered_sources = {source for source in all_sources if source.__table__ in filtered_tables}
+
+    columns = []
+    counts_by_track = []
+
+    for i, (sources, intersection, exclusive) in enumerate(tracks):
+        assert not (intersection and exclusive)
+        assert set(sources) | set(exclusive or []) == set(all_sources)
+
+        if intersection:
+            condition = and_(*[source.id.isnot(None) for source in sources])
+        elif exclusive:
+            condition = and_(*[source.id.is_(None) for source in exclusive])
+        else:
+            condition = None
+
+        # filtering the shared rows would leave no rows for the tracks excluding the filtered
+        # sources (these have no such source), so the filter goes into the track condition
+        if filtered_sources & set(sources):
+            condition = mutation_filter if condition is None else and_(condition, mutation_filter)
+
+        counts = [
+            count.label(f'count_{i}_{j}')
+            for j, count in enumerate(prepare_for_summing(sources, where=condition))
+        ]
+        columns.extend(counts)
+        counts_by_track.append([count.name for count in counts])
+
+    query = db.session.query(Site.id.label('site_id'), *columns).select_from(Mutation)
+
+    for source in all_sources:
+        query = query.outerjoin(source)
+
+    if mutation_filter is not None and not filtered_sources:
+        query = query.filter(mutation_filter)
+
+    query = (
+        query
+        .join(Mutation.affected_sites)
+        .filter(Site.protein.has(Protein.is_preferred_isoform))
+    )
+
+    if site_type:
+        query = query.filter(SiteType.fuzzy_filter(site_type, join=True))
+
+    counts = query.group_by(Site.id).cte('site_counts')
+
+    if use_window_functions is None:
+        use_window_functions = supports_window_functions(db.session.get_bind(mapper=inspect(Site)))
+
+    top_sites = [[] for _ in tracks]
+
+    if use_window_functions:
+        by_track = union_all(*[
+            select([
+                counts.c.site_id,
+                literal(i).label('track'),
+                reduce(operator.add, [counts.c[name] for name in names]).label('mutations_count')
+            ])
+            .where(and_(*[counts.c[name] for name in names]))
+            for i, names in enumerate(counts_by_track)
+        ]).alias('by_track')
+
+        ranked = select([
+            by_track,
+            func.row_number().over(
+                partition_by=by_track.c.track,
+                order_by=(desc(by_track.c.mutations_count), by_track.c.site_id)
+            ).label('rank')
+        ]).alias('ranked')
+
+        query = (
+            db.session.query(Site, ranked.c.track, ranked.c.mutations_count)
+            .join(ranked, ranked.c.site_id == Site.id)
+            .filter(ranked.c.rank <= limit)
+            .order_by(ranked.c.track, ranked.c.rank)
+        )
+        for site, track, count in query:
+            top_sites[track].append((site, count))
+    else:
+        rows = db.session.query(counts).all()
+        top_ids = []
+        for names in counts_by_track:
+            top = sorted(
+                (
+                    (-sum(getattr(row, name) for name in names), row.site_id)
+                    for row in rows
+                    if all(getattr(row, name) for name in names)
+                )
+            )[:limit]
+            top_ids.append(top)
+        sites = {
+            site.id: site
+            for site in Site.query.filter(Site.id.in_([site_id for top in top_ids for count, site_id in top]))
+        }
+        for i, top in enumerate(top_ids):
+            top_sites[i] = [(sites[site_id], -count) for count, site_id in top]
+
+    return top_sites
+
+
 def genes_enrichment(observed_genes, reference_set):
 
     observed_from_reference = observed_genes.intersection(reference_set)
@@ -1,11 +1,12 @@
 import shutil
 from pathlib import Path
-from random import sample
+from random import Random
 from types import SimpleNamespace
-from typing import Set, NamedTuple, List
+from typing import Set, NamedTuple, List, Mapping, Iterable, Tuple
 from warnings import warn
 from collections import Counter, defaultdict
 
+import numpy as np
 from pandas import Series, to_numeric, DataFrame
 from rpy2 import robjects
 from rpy2.robjects import pandas2ri, StrVector, ListVector, r
@@ -15,8 +16,9 @@ from rpy2.robjects.packages import importr
 from tqdm import tqdm
 
 from analyses.active_driver import prepare_active_driver_data
+from database import db
 from helpers.plots import sequence_logo
-from models import Kinase, Site, SiteType, Protein, extract_padded_sequence
+from models import Kinase, Site, SiteType, Protein
 
 from ._paths import ANALYSES_OUTPUT_PATH
 
@@ -46,78 +48,140 @@ def save_kinase_sequences(kinase, sequences, seq_dir):
 
 
 class NegativeSite(NamedTuple):
-    protein: Protein
+    protein_id: int
+    # 0-based
     position: int
 
 
-def gather_negative_sites(residues: Set[str], exclude: Set[Site]) -> Set[NegativeSite]:
-    """
-    Gather sites for negative sequences which will be centered on
-    residues from `residues` set, from the proteome exclusive of
-    sites provided in `exclude` set.
+SEPARATOR = 0
+
+
+class Proteome:
+    """Sequences of proteins concatenated into a single byte array.
+
+    Sequences (without the trailing stop codon) are separated by `flank`
+    bytes of SEPARATOR, so that a window of `flank` residues around any
+    residue never reaches into a neighbouring protein.
     """
 
-    candidate_negative_sites: Set[NegativeSite] = set()
+    def __init__(self, sequences: Mapping[int, str], flank=7):
+        self.flank = flank
+        self.protein_ids = np.array(list(sequences), dtype=np.int64)
+        self.index = {protein_id: i for i, protein_id in enumerate(sequences)}
+
+        separator = bytes([SEPARATOR]) * flank
+        sequences = [sequence.rstrip('*').encode() for sequence in sequences.values()]
+
+        self.lengths = np.array([len(sequence) for sequence in sequences], dtype=np.int64)
+        self.starts = flank + np.concatenate([[0], np.cumsum(self.lengths + flank)])[:-1].astype(np.int64)
+        self.sequence = np.frombuffer(
+            separator + separator.join(sequences) + separator,
+            dtype=np.uint8
+        )
 
-    preferred_isoforms = Protein.query.filter(Protein.is_preferred_isoform)
+    @classmethod
+    def of_preferred_isoforms(cls, **kwargs):
+        return cls(
+            dict(
+                db.session.query(Protein.id, Protein.sequence).filter(Protein.is_preferred_isoform)
+            ),
+            **kwargs
+        )
 
-    for protein in tqdm(preferred_isoforms, total=preferred_isoforms.count()):
+    def global_positions(self, sites: Iterable[Tuple[int, int]]) -> np.ndarray:
+        """Convert (protein id, 0-based position) pairs to positions in the concatenated sequence.
+
+        Sites of proteins which are not a part of this proteome are skipped.
+        """
+        positions = []
+        for protein_id, position in sites:
+            i = self.index.get(protein_id)
+            if i is not None and 0 <= position < self.lengths[i]:
+                positions.append(self.starts[i] + position)
+        return np.array(positions, dtype=np.int64)
+
+    def sites_at(self, global_positions: np.ndarray) -> List[NegativeSite]:
+        proteins = np.searchsorted(self.starts, global_positions, side='right') - 1
+        return [
+            NegativeSite(protein_id, position)
+            for protein_id, position in zip(
+                self.protein_ids[proteins].tolist(),
+                (global_positions - self.starts[proteins]).tolist()
+            )
+        ]
 
-        positions_to_skip = {
-            site.position - 1   # convert to 0-based
-            for site in protein.sites
-            if site in exclude
-        }
+    def windows(self, global_positions: np.ndarray) -> List[str]:
+        """Extract sequences of `flank` residues around each of given positions, padded with '-'"""
+        offsets = np.arange(-self.flank, self.flank + 1)
+        windows = self.sequence[np.asarray(global_positions)[:, None] + offsets]
+        windows[windows == SEPARATOR] = ord('-')
+        return [window.tobytes().decode() for window in windows]
 
-        for i, aa in enumerate(protein.sequence):
-            if i in positions_to_skip:
-                continue
-            if aa in residues:
-                candidate_negative_sites.add(
-                    NegativeSite(protein, i)
-                )
 
-    return candidate_negative_sites
+class NegativeSites(NamedTuple):
+    """Candidate negative sites, iterable as NegativeSite tuples"""
+    proteome: Proteome
+    # positions in the concatenated proteome sequence
+    positions: np.ndarray
 
+    def __len__(self):
+        return len(self.positions)
 
-def sample_random_negative_sequences(negative_sites: Set[NegativeSite], n=10000) -> List[str]:
-    """Sample `n` negative sequences from set of negative sites."""
+    def __iter__(self):
+        return iter(self.proteome.sites_at(self.positions))
+
+
+def gather_negative_sites(residues: Set[str], exclude: Iterable[Site], proteome: Proteome = None) -> NegativeSites:
+    """
+    Gather sites for negative sequences which will be centered on
+    residues from `residues` set, from the proteome (of preferred
+    isoforms) exclusive of sites provided in `exclude` set.
+    """
+    if not proteome:
+        proteome = Proteome.of_preferred_isoforms()
+
+    is_candidate = np.isin(proteome.sequence, np.frombuffer(''.join(residues).encode(), dtype=np.uint8))
+
+    excluded = proteome.global_positions(
+        (site.protein_id, site.position - 1)   # convert to 0-based
+        for site in exclude
+    )
+    is_candidate[excluded] = False
+
+    return NegativeSites(proteome, np.flatnonzero(is_candidate))
+
+
+def sample_random_negative_sequences(negative_sites: NegativeSites, n=10000, generator: Random = None) -> List[str]:
+    """Sample `n` negative sequences from set of negative sites.
+
+    Only `n` indices are drawn (the candidates are not permuted),
+    using given (e.g. seeded) random generator.
+    """
     if n > len(negative_sites):
         warn(f'n = {n} is greater then len(negative_sites) = {len(negative_sites)}')
 
-    random_sites = sample(negative_sites, n)
+    if not generator:
+        generator = Random()
 
-    random_sequences = [
-        # here site.position is 0-based
-        extract_padded_sequence(
-            site.protein,
-            site.position - 7,
-            site.position + 7 + 1
-        )
-        for site in random_sites
-    ]
+    random_sites = negative_sites.positions[generator.sample(range(len(negative_sites)), n)]
 
-    return random_sequences
+    return negative_sites.proteome.windows(random_sites)
 
 
-def calculate_background_frequency():
+def calculate_background_frequency(proteome: Proteome = None):
     """Calculates background frequency of aminoacids (priors) for MIMP."""
-    counts = Counter()
-    total_length = 0
-
-    preferred_isoforms = Protein.query.filter(Protein.is_preferred_isoform)
-
-    for protein in tqdm(preferred_isoforms, total=preferred_isoforms.count()):
-        for aa in protein.sequence:
-            if aa == '*':
-                continue
-            counts[aa] += 1
-            total_length += 1
+    if not proteome:
+        proteome = Proteome.of_preferred_isoforms()
 
-    for aa, count in counts.items():
-        counts[aa] = count / total_length
+    counts = np.bincount(proteome.sequence, minlength=256)
+    counts[[SEPARATOR, ord('*')]] = 0
+    total_length = int(counts.sum())
 
-    return counts
+    return Counter({
+        chr(aa): count / total_length
+        for aa, count in enumerate(counts.tolist())
+        if count
+    })
 
 
 def residues_groups(site_type, modified_residues):
@@ -134,7 +198,7 @@ def residues_groups(site_type, modified_residues):
 
 def train_model(
     site_type: SiteType, sequences_dir='.tmp', sampling_n=10000, enzyme_type='kinase',
-    output_path=None, **kwargs
+    output_path=None, seed=None, **kwargs
 ):
     """Train MIMP model for given site type.
 
@@ -147,6 +211,7 @@ def train_model(
         sequences_dir: path to dir where sequences for trainModel should be dumped
         sampling_n: number of sampling iterations for negative sequence set
         output_path: path to .mimp file where the model should be saved
+        seed: seed for sampling of negative sequences
         **kwargs: will be passed to trainModel
 
     Returns:
@@ -161,6 +226,7 @@ def train_model(
     modified_residues = site_type.find_modified_residues()
 
     negative_sites = gather_negative_sites(modified_residues, exclude=sites_of_this_type)
+    generator = Random(seed)
 
     sequences_path = Path(sequences_dir)
 
@@ -199,7 +265,7 @@ def train_model(
         ]
 
         positive_sequences = [site.sequence for site in sites]
-        negative_sequences = sample_random_negative_sequences(negative_sites, sampling_n)
+        negative_sequences = sample_random_negative_sequences(negative_sites, sampling_n, generator)
 
         save_kinase_sequences(enzyme, positive_sequences, positive_path)
         save_kinase_sequences(enzyme, negative_sequences, negative_path)
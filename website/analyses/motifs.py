@@ -1,12 +1,21 @@
 import re
+from bisect import bisect_left, bisect_right
 from collections import defaultdict, ChainMap
-from typing import Iterable, Mapping, Union, List, NamedTuple
+from contextlib import nullcontext
+from functools import lru_cache
+from math import inf
+from multiprocessing import Pool
+from typing import Iterable, Mapping, Union, List, NamedTuple, Hashable, FrozenSet, Pattern, Sequence, Dict, Tuple, Set
 
 from flask_sqlalchemy import BaseQuery
+from sqlalchemy import true
 from tqdm import tqdm
 
 from analyses.active_driver import ActiveDriverResult
-from models import Site, SiteType, Mutation, MutationSource, Protein, Gene, and_, or_, SiteMotif
+from analyses.ptm_impact import source_value
+from database import db
+from helpers.parsers import chunked_list
+from models import Site, SiteType, Mutation, MutationSource, Protein, Gene, and_, or_, SiteMotif, are_details_managed
 
 
 def motifs_for_site_type(site_type_name: str):
@@ -56,6 +65,349 @@ def mutate_sequence(site: Site, mutation: Mutation, offset: int) -> str:
     return sequence
 
 
+def find_motifs(expression: Pattern, keys: Sequence[Hashable], sequence: str) -> FrozenSet[Hashable]:
+    match = expression.match(sequence)
+    return frozenset(
+        key
+        for i, key in enumerate(keys)
+        if match.group(f'motif_{i}') is not None
+    )
+
+
+def find_motifs_in_chunk(task: Tuple[Pattern, Sequence[Hashable], List[str]]) -> List[FrozenSet[Hashable]]:
+    expression, keys, sequences = task
+    return [find_motifs(expression, keys, sequence) for sequence in sequences]
+
+
+class MotifsMatcher:
+    """Tests sequences against many motifs at once.
+
+    All the motifs are compiled into a single expression, composed of an
+    optional look-ahead per motif, so that a single match call tells which of
+    the motifs are present in the sequence. Results are cached per sequence.
+
+    Args:
+        motifs: mapping of keys (e.g. names) to regular expressions of motifs
+        anchored: whether the motifs should match at the start of the sequence
+            (like `re.match`) or anywhere in the sequence (like `re.search`)
+        processes: number of worker processes used by `match_all`;
+            by default all sequences are tested in the main process
+    """
+
+    def __init__(self, motifs: Mapping[Hashable, str], anchored=False, processes: int = None, cache_size=2 ** 18):
+        self.keys = list(motifs)
+        self.processes = processes
+        prefix = '' if anchored else '.*?'
+        self.expression = re.compile(
+            ''.join(
+                f'(?=(?:{prefix}(?P<motif_{i}>{pattern}))?)'
+                for i, pattern in enumerate(motifs.values())
+            ),
+            re.DOTALL
+        )
+        self.cached_find = lru_cache(maxsize=cache_size)(self.find)
+
+    def find(self, sequence: str) -> FrozenSet[Hashable]:
+        """Return keys of the motifs present in given sequence"""
+        return find_motifs(self.expression, self.keys, sequence)
+
+    def __call__(self, sequence: str) -> FrozenSet[Hashable]:
+        return self.cached_find(sequence)
+
+    def match_all(self, sequences: Iterable[str], chunk_size=10000) -> Dict[str, FrozenSet[Hashable]]:
+        """Find motifs in many sequences, testing each of the distinct sequences only once.
+
+        Returns:
+            sequence -> keys of motifs present in the sequence
+        """
+        unique_sequences = list(set(sequences))
+
+        if not self.processes:
+            return {sequence: self(sequence) for sequence in unique_sequences}
+
+        chunks = [
+            unique_sequences[start:start + chunk_size]
+            for start in range(0, len(unique_sequences), chunk_size)
+        ]
+        tasks = [(self.expression, self.keys, chunk) for chunk in chunks]
+
+        results = {}
+        with Pool(self.processes) as pool:
+            for chunk, found in zip(chunks, pool.imap(find_motifs_in_chunk, tasks)):
+                results.update(zip(chunk, found))
+        return results
+
+
+@lru_cache()
+def matcher_for_patterns(patterns: FrozenSet[str], anchored=False) -> MotifsMatcher:
+    """Shared matcher using motifs patterns as keys"""
+    return MotifsMatcher({pattern: pattern for pattern in patterns}, anchored=anchored)
+
+
+class ProteinMutations(NamedTuple):
+    """Plain (picklable) data needed to find motifs broken by mutations of a single protein"""
+    sequence: str
+    # (position, ids of site types) for each of the sites
+    sites: List[Tuple[int, Sequence[int]]]
+    # (key, position, alternative residue) for each of the mutations
+    mutations: List[Tuple[Hashable, int, str]]
+    # site type id -> (motif id, pattern) pairs
+    motifs_by_site_type: Mapping[int, List[Tuple[int, str]]]
+
+
+def group_motifs_by_site_type(motifs: Iterable[SiteMotif]) -> Dict[int, List[Tuple[int, str]]]:
+    motifs_by_site_type = defaultdict(list)
+    for motif in motifs:
+        motifs_by_site_type[motif.site_type_id].append((motif.id, motif.pattern))
+    return dict(motifs_by_site_type)
+
+
+def padded_site_sequence(sequence: str, position: int, offset=7) -> str:
+    """Same as `Site.get_nearby_sequence`, but working on a raw protein sequence"""
+    length = len(sequence.rstrip('*'))
+    left = position - offset - 1
+    right = position + offset
+    return (
+        '-' * -min(0, left) +
+        sequence[max(0, left):min(right, length)] +
+        '-' * max(0, right - length)
+    )
+
+
+def find_motifs_affected_in_protein(task: ProteinMutations) -> Dict[Hashable, Set[int]]:
+    """Find motifs broken by mutations of a single protein, like `Mutation.affected_motifs` does.
+
+    Works on plain data only, so that proteins can be processed in worker processes.
+
+    Returns:
+        mutation key -> ids of motifs broken by the mutation
+    """
+    sites = sorted(task.sites)
+    positions = [position for position, site_types in sites]
+
+    affected_motifs = {}
+
+    for key, position, alt in task.mutations:
+        affected = set()
+
+        # sites considered by `Mutation.affected_sites`
+        first = bisect_left(positions, position - 7)
+        last = bisect_right(positions, position + 7)
+
+        for site_position, site_types in sites[first:last]:
+            site_sequence = padded_site_sequence(task.sequence, site_position)
+            mutated_sequence = None
+
+            for site_type_id in site_types:
+                motifs = task.motifs_by_site_type.get(site_type_id)
+                if not motifs:
+                    continue
+
+                patterns = frozenset(pattern for motif_id, pattern in motifs)
+                motifs_at_site = matcher_for_patterns(patterns, anchored=True)(site_sequence)
+
+                if not motifs_at_site:
+                    continue
+
+                if mutated_sequence is None:
+                    relative_position = position - site_position + 7
+                    mutated_sequence = (
+                        site_sequence[:relative_position] + alt + site_sequence[relative_position + 1:]
+                    )
+
+                motifs_at_mutated_site = matcher_for_patterns(patterns)(mutated_sequence)
+
+                for motif_id, pattern in motifs:
+                    if pattern in motifs_at_site and pattern not in motifs_at_mutated_site:
+                        affected.add(motif_id)
+
+        affected_motifs[key] = affected
+
+    return affected_motifs
+
+
+def find_affected_motifs(mutations: Iterable[Mutation], processes: int = None) -> Dict[Mutation, set]:
+    """Find motifs broken by each of given mutations, like `Mutation.affected_motifs` does.
+
+    Mutations are grouped by protein; each protein is processed with
+    `find_motifs_affected_in_protein` (possibly in worker processes).
+
+    Returns:
+        mutation -> set of SiteMotif objects broken by the mutation
+    """
+    motifs = {motif.id: motif for motif in SiteMotif.query}
+    motifs_by_site_type = group_motifs_by_site_type(motifs.values())
+
+    mutations = list(mutations)
+    mutations_by_protein = defaultdict(list)
+
+    for i, mutation in enumerate(mutations):
+        mutations_by_protein[mutation.protein].append((i, mutation.position, mutation.alt))
+
+    tasks = [
+        ProteinMutations(
+            sequence=protein.sequence,
+            sites=[(site.position, [site_type.id for site_type in site.types]) for site in protein.sites],
+            mutations=protein_mutations,
+            motifs_by_site_type=motifs_by_site_type
+        )
+        for protein, protein_mutations in mutations_by_protein.items()
+    ]
+
+    affected_motifs = {}
+
+    with Pool(processes) if processes else nullcontext() as pool:
+        for found in (pool.imap if pool else map)(find_motifs_affected_in_protein, tasks):
+            for i, motif_ids in found.items():
+                affected_motifs[mutations[i]] = {motifs[motif_id] for motif_id in motif_ids}
+
+    return affected_motifs
+
+
+def store_affected_motifs(affected_motifs: Mapping[Mutation, Iterable[SiteMotif]], chunk_size=10000):
+    """Save motifs affected by mutations as `precomputed_affected_motifs`, see `store_affected_motif_ids`"""
+    store_affected_motif_ids(
+        {
+            mutation.id: [motif.id for motif in motifs]
+            for mutation, motifs in affected_motifs.items()
+        },
+        chunk_size=chunk_size
+    )
+
+
+def store_affected_motif_ids(affected_motifs: Mapping[int, Iterable[int]], chunk_size=10000):
+    """Save motifs affected by mutations as `precomputed_affected_motifs`, using bulk inserts.
+
+    Previously stored motifs of given mutations are replaced and the mutations
+    are marked with `were_affected_motifs_precomputed` flag. Changes are flushed
+    but not committed.
+
+    Args:
+        affected_motifs: mutation id -> ids of motifs broken by the mutation
+    """
+    table = Mutation.precomputed_affected_motifs.property.secondary
+    mutation_column, motif_column = table.columns
+
+    mutation_ids = list(affected_motifs)
+
+    for chunk in chunked_list(mutation_ids, chunk_size):
+        db.session.execute(table.delete().where(mutation_column.in_(chunk)))
+        Mutation.query.filter(Mutation.id.in_(chunk)).update(
+            {Mutation.were_affected_motifs_precomputed: True},
+            synchronize_session=False
+        )
+
+    rows = [
+        {mutation_column.name: mutation_id, motif_column.name: motif_id}
+        for mutation_id, motif_ids in affected_motifs.items()
+        for motif_id in motif_ids
+    ]
+
+    for chunk in chunked_list(rows, chunk_size):
+        db.session.execute(table.insert(), chunk)
+
+    db.session.flush()
+
+
+def prepare_proteins_mutations(protein_ids: List[int], mutations_filter, motifs_by_site_type) -> List[ProteinMutations]:
+    """Fetch sequences, typed sites and (filtered) mutations of given proteins as plain data"""
+    site_column, site_type_column = Site.site_type_table.columns
+
+    sequences = dict(
+        db.session.query(Protein.id, Protein.sequence).filter(Protein.id.in_(protein_ids))
+    )
+
+    site_types = defaultdict(list)
+    sites_query = (
+        db.session.query(Site.protein_id, Site.id, Site.position, site_type_column)
+        .join(Site.site_type_table, site_column == Site.id)
+        .filter(Site.protein_id.in_(protein_ids))
+    )
+    for protein_id, site_id, position, site_type_id in sites_query:
+        site_types[protein_id, site_id, position].append(site_type_id)
+
+    sites = defaultdict(list)
+    for (protein_id, site_id, position), types in site_types.items():
+        sites[protein_id].append((position, types))
+
+    mutations = defaultdict(list)
+    mutations_query = (
+        db.session.query(Mutation.protein_id, Mutation.id, Mutation.position, Mutation.alt)
+        .filter(Mutation.protein_id.in_(protein_ids))
+        .filter(mutations_filter)
+    )
+    for protein_id, mutation_id, position, alt in mutations_query:
+        mutations[protein_id].append((mutation_id, position, alt))
+
+    return [
+        ProteinMutations(
+            sequence=sequences[protein_id],
+            sites=sites[protein_id],
+            mutations=protein_mutations,
+            motifs_by_site_type=motifs_by_site_type
+        )
+        for protein_id, protein_mutations in mutations.items()
+    ]
+
+
+def precompute_affected_motifs(processes: int = None, full=False, proteins_per_batch=1000) -> int:
+    """Precompute motifs broken by mutations, for all the mutations in the database.
+
+    The run is incremental: only mutations which were not precomputed yet, and
+    all mutations of proteins with sites not seen by the previous runs (flagged
+    by `Site.were_nearby_motifs_precomputed`) are processed. Use `full` to
+    recompute all mutations (e.g. after the motifs were changed).
+
+    Proteins are streamed in batches; mutations of each batch are evaluated
+    in worker processes and the results saved with bulk inserts and committed,
+    so that an interrupted run can be resumed.
+
+    Returns:
+        number of processed mutations
+    """
+    motifs_by_site_type = group_motifs_by_site_type(SiteMotif.query)
+
+    if full:
+        needs_update = true()
+    else:
+        needs_update = or_(
+            Mutation.were_affected_motifs_precomputed.isnot(True),
+            # sites could have been added near to already precomputed mutations
+            Mutation.protein_id.in_(
+                db.session.query(Site.protein_id).filter(Site.were_nearby_motifs_precomputed.isnot(True))
+            )
+        )
+
+    protein_ids = [
+        protein_id
+        for protein_id, in db.session.query(Mutation.protein_id).filter(needs_update).distinct()
+    ]
+    print(f'Precomputing affected motifs of mutations in {len(protein_ids)} proteins')
+
+    processed = 0
+
+    with Pool(processes) if processes else nullcontext() as pool:
+        for batch in chunked_list(protein_ids, proteins_per_batch):
+
+            tasks = prepare_proteins_mutations(batch, needs_update, motifs_by_site_type)
+            results = (pool.imap if pool else map)(find_motifs_affected_in_protein, tasks)
+
+            affected_motifs = {}
+            for found in results:
+                affected_motifs.update(found)
+
+            store_affected_motif_ids(affected_motifs)
+            Site.query.filter(Site.protein_id.in_(batch)).update(
+                {Site.were_nearby_motifs_precomputed: True},
+                synchronize_session=False
+            )
+            db.session.commit()
+            processed += len(affected_motifs)
+
+    print(f'Affected motifs of {processed} mutations were precomputed')
+    return processed
+
+
 MotifName = str
 
 
@@ -73,13 +425,17 @@ class MotifsData(NamedTuple):
     muts_breaking_sites_motif: Mapping[MotifName, Mapping[Mutation, int]]
 
 
-def select_sites_with_motifs(sites: Iterable, motifs) -> Mapping[MotifName, set]:
+def select_sites_with_motifs(sites: Iterable, motifs, matcher: MotifsMatcher = None) -> Mapping[MotifName, set]:
 
     sites_with_motif = defaultdict(set)
 
+    if not matcher:
+        matcher = MotifsMatcher(motifs)
+
     for site in sites:
-        for motif_name, motif in motifs.items():
-            if has_motif(site.sequence, motif):
+        found = matcher(site.sequence)
+        for motif_name in motifs:
+            if motif_name in found:
                 sites_with_motif[motif_name].add(site)
 
     return sites_with_motif
@@ -91,7 +447,7 @@ class NoKnownMotifs(Exception):
 
 class MotifsCounter:
 
-    def __init__(self, site_type: SiteType, mode='broken_motif', motifs_db=get_all_motifs):
+    def __init__(self, site_type: SiteType, mode='broken_motif', motifs_db=get_all_motifs, processes: int = None):
         self.site_type = site_type
         self.motifs_db = motifs_db() if callable(motifs_db) else motifs_db
         self.mode = mode
@@ -101,19 +457,20 @@ class MotifsCounter:
         except KeyError:
             raise NoKnownMotifs(f'No known motifs for {site_type} in {motifs_db}')
 
+        self.matcher = MotifsMatcher(self.site_specific_motifs, processes=processes)
+
         self.breaking_modes = {
             'change_of_motif': self.change_of_motif,
             'broken_motif': self.broken_motif
         }
 
     @staticmethod
-    def change_of_motif(mutated_seq, motif):
-        return not has_motif(mutated_seq, motif)
+    def change_of_motif(motifs_in_mutated_seq: FrozenSet[MotifName], motif_name: MotifName):
+        return motif_name not in motifs_in_mutated_seq
 
-    def broken_motif(self, mutated_seq, _):
-        return not any(
-            has_motif(mutated_seq, motif) for motif in self.site_specific_motifs.values()
-        )
+    @staticmethod
+    def broken_motif(motifs_in_mutated_seq: FrozenSet[MotifName], _):
+        return not motifs_in_mutated_seq
 
     def gather_muts_and_sites(
         self, mutations: BaseQuery, sites: BaseQuery,
@@ -125,11 +482,11 @@ class MotifsCounter:
         """
 
         if intersection:
-            accepted_sites = sites.join(Mutation.affected_sites).filter(and_(
+            accepted_sites = set(sites.join(Mutation.affected_sites).filter(and_(
                 *[Mutation.in_sources(source) for source in intersection]
-            )).all()
+            )))
         else:
-            accepted_sites = sites.all()
+            accepted_sites = set(sites)
 
         mutations_affecting_sites = mutations.filter(
             Mutation.affected_sites.any(Site.types.contains(self.site_type))
@@ -140,7 +497,12 @@ class MotifsCounter:
 
         sites_with_broken_motif = defaultdict(set)
 
-        sites_with_motif = select_sites_with_motifs(accepted_sites, self.site_specific_motifs)
+        sites_with_motif = select_sites_with_motifs(accepted_sites, self.site_specific_motifs, self.matcher)
+        motifs_by_site = defaultdict(list)
+
+        for motif_name, motif_sites in sites_with_motif.items():
+            for site in motif_sites:
+                motifs_by_site[site].append(motif_name)
 
         if occurrences_in:
             def mutation_count(mut: Mutation):
@@ -158,6 +520,8 @@ class MotifsCounter:
             ptm_muts = mutations_affecting_sites.count()
             mutations_affecting_sites = tqdm(mutations_affecting_sites, total=ptm_muts)
 
+        mutated_sites = []
+
         for mutation in mutations_affecting_sites:
             sites = mutation.affected_sites
 
@@ -165,16 +529,25 @@ class MotifsCounter:
                 if site not in accepted_sites:
                     continue
 
-                for motif_name, motif in self.site_specific_motifs.items():
-                    if site in sites_with_motif[motif_name]:
-                        count = mutation_count(mutation)
-                        muts_around_sites_with_motif[motif_name][mutation] = count
+                if site in motifs_by_site:
+                    mutated_sequence = mutate_sequence(site, mutation, offset=7)
+                    mutated_sites.append((mutation, site, mutated_sequence))
+
+        # all mutated sequences are tested at once (possibly in parallel)
+        motifs_in_mutated_sequences = self.matcher.match_all(
+            mutated_sequence for mutation, site, mutated_sequence in mutated_sites
+        )
+
+        for mutation, site, mutated_sequence in mutated_sites:
+            count = mutation_count(mutation)
+            mutated_motifs = motifs_in_mutated_sequences[mutated_sequence]
 
-                        mutated_sequence = mutate_sequence(site, mutation, offset=7)
+            for motif_name in motifs_by_site[site]:
+                muts_around_sites_with_motif[motif_name][mutation] = count
 
-                        if is_affected(mutated_sequence, motif):
-                            sites_with_broken_motif[motif_name].add(site)
-                            muts_breaking_sites_motif[motif_name][mutation] = count
+                if is_affected(mutated_motifs, motif_name):
+                    sites_with_broken_motif[motif_name].add(site)
+                    muts_breaking_sites_motif[motif_name][mutation] = count
 
         return MotifsData(
             sites_with_motif=sites_with_motif,
@@ -187,24 +560,141 @@ class MotifsCounter:
 
         data = self.gather_muts_and_sites(*args, **kwargs)
 
-        return MotifsRelatedCounts(
-            sites_with_motif=defaultdict(int, {
-                motif: len(sites)
-                for motif, sites in data.sites_with_motif.items()
-            }),
-            sites_with_broken_motif=defaultdict(int, {
-                motif: len(sites)
-                for motif, sites in data.sites_with_broken_motif.items()
-            }),
-            muts_around_sites_with_motif=defaultdict(int, {
-                motif: sum(counts_by_mutations.values())
-                for motif, counts_by_mutations in data.muts_around_sites_with_motif.items()
-            }),
-            muts_breaking_sites_motif=defaultdict(int, {
-                motif: sum(counts_by_mutations.values())
-                for motif, counts_by_mutations in data.muts_breaking_sites_motif.items()
-            })
-        )
+        return count_motifs_data(data)
+
+    def count_muts_and_sites_by_genes(
+        self, mutations: BaseQuery, genes: Iterable[Gene],
+        occurrences_in: List[MutationSource] = None, intersection: List[MutationSource] = None,
+        proteins_per_batch=1000
+    ) -> Dict[str, MotifsRelatedCounts]:
+        """Count mutations and sites of the preferred isoform of each of the genes.
+
+        Gives the same results as `count_muts_and_sites` called for each gene
+        with the mutations and sites limited to its preferred isoform, but
+        sites, sequences, mutations and their occurrences are fetched for
+        a batch of proteins at once (with a few queries per batch) and all
+        mutated sequences of the batch are matched together.
+        """
+        genes = list(genes)
+        gene_by_protein = {gene.preferred_isoform_id: gene.name for gene in genes if gene.preferred_isoform_id}
+        data_by_gene = {
+            gene.name: MotifsData(defaultdict(set), defaultdict(set), defaultdict(dict), defaultdict(dict))
+            for gene in genes
+        }
+
+        is_affected = self.breaking_modes[self.mode]
+
+        for batch in chunked_list(list(gene_by_protein), proteins_per_batch):
+
+            sites_query = (
+                db.session.query(Site.id, Site.protein_id, Site.position)
+                .filter(Site.types.contains(self.site_type))
+                .filter(Site.protein_id.in_(batch))
+            )
+            if intersection:
+                sites_query = (
+                    sites_query
+                    .join(Mutation, and_(
+                        Mutation.protein_id == Site.protein_id,
+                        Mutation.position.between(Site.position - 7, Site.position + 7)
+                    ))
+                    .filter(and_(*[Mutation.in_sources(source) for source in intersection]))
+                    .distinct()
+                )
+            sites = sites_query.all()
+
+            sequences = dict(
+                db.session.query(Protein.id, Protein.sequence)
+                .filter(Protein.id.in_({protein_id for site_id, protein_id, position in sites}))
+            )
+
+            # protein id -> (position, site id, site sequence, motifs) for sites with motifs, sorted by position
+            sites_with_motifs = defaultdict(list)
+
+            for site_id, protein_id, position in sites:
+                sequence = padded_site_sequence(sequences[protein_id], position)
+                found = self.matcher(sequence)
+                motifs = [motif_name for motif_name in self.site_specific_motifs if motif_name in found]
+                if motifs:
+                    sites_by_motif = data_by_gene[gene_by_protein[protein_id]].sites_with_motif
+                    for motif_name in motifs:
+                        sites_by_motif[motif_name].add(site_id)
+                    sites_with_motifs[protein_id].append((position, site_id, sequence, motifs))
+
+            for protein_sites in sites_with_motifs.values():
+                protein_sites.sort()
+
+            mutations_query = (
+                mutations
+                .filter(Mutation.protein_id.in_(list(sites_with_motifs)))
+                .with_entities(Mutation.id, Mutation.protein_id, Mutation.position, Mutation.alt)
+            )
+
+            mutated_sites = []
+
+            for mutation_id, protein_id, position, alt in mutations_query:
+                protein_sites = sites_with_motifs[protein_id]
+                first = bisect_left(protein_sites, (position - 7,))
+                last = bisect_right(protein_sites, (position + 7, inf))
+
+                for site_position, site_id, sequence, motifs in protein_sites[first:last]:
+                    relative_position = position - site_position + 7
+                    mutated_sequence = sequence[:relative_position] + alt + sequence[relative_position + 1:]
+                    mutated_sites.append((mutation_id, protein_id, site_id, motifs, mutated_sequence))
+
+            counts = defaultdict(int)
+
+            if occurrences_in:
+                mutation_ids = list({mutation_id for mutation_id, *rest in mutated_sites})
+                for source in occurrences_in:
+                    values = db.session.query(source.mutation_id, source_value(source))
+                    if are_details_managed(source):
+                        values = values.group_by(source.mutation_id)
+                    for chunk in chunked_list(mutation_ids):
+                        for mutation_id, value in values.filter(source.mutation_id.in_(chunk)):
+                            counts[mutation_id] += value or 0
+
+            motifs_in_mutated_sequences = self.matcher.match_all(
+                mutated_sequence for *rest, mutated_sequence in mutated_sites
+            )
+
+            for mutation_id, protein_id, site_id, motifs, mutated_sequence in mutated_sites:
+                count = counts[mutation_id] if occurrences_in else 1
+                mutated_motifs = motifs_in_mutated_sequences[mutated_sequence]
+                data = data_by_gene[gene_by_protein[protein_id]]
+
+                for motif_name in motifs:
+                    data.muts_around_sites_with_motif[motif_name][mutation_id] = count
+
+                    if is_affected(mutated_motifs, motif_name):
+                        data.sites_with_broken_motif[motif_name].add(site_id)
+                        data.muts_breaking_sites_motif[motif_name][mutation_id] = count
+
+        return {
+            gene_name: count_motifs_data(data)
+            for gene_name, data in data_by_gene.items()
+        }
+
+
+def count_motifs_data(data: MotifsData) -> MotifsRelatedCounts:
+    return MotifsRelatedCounts(
+        sites_with_motif=defaultdict(int, {
+            motif: len(sites)
+            for motif, sites in data.sites_with_motif.items()
+        }),
+        sites_with_broken_motif=defaultdict(int, {
+            motif: len(sites)
+            for motif, sites in data.sites_with_broken_motif.items()
+        }),
+        muts_around_sites_with_motif=defaultdict(int, {
+            motif: sum(counts_by_mutations.values())
+            for motif, counts_by_mutations in data.muts_around_sites_with_motif.items()
+        }),
+        muts_breaking_sites_motif=defaultdict(int, {
+            motif: sum(counts_by_mutations.values())
+            for motif, counts_by_mutations in data.muts_breaking_sites_motif.items()
+        })
+    )
 
 
 def count_by_sources(
@@ -226,20 +716,10 @@ def count_by_sources(
     if not by_genes:
         return counter.count_muts_and_sites(base_query, sites,  **kwargs)
 
-    counts_by_genes = {}
-
     if not genes:
         genes = Gene.query.all()
 
-    for gene in tqdm(genes):
-
-        query = base_query.filter(Mutation.protein == gene.preferred_isoform)
-        gene_sites = sites.filter(Site.protein == gene.preferred_isoform)
-        counts_by_genes[gene.name] = counter.count_muts_and_sites(
-            query, gene_sites, show_progress=False, **kwargs
-        )
-
-    return counts_by_genes
+    return counter.count_muts_and_sites_by_genes(base_query, genes, **kwargs)
 
 
 def count_by_active_driver(
@@ -0,0 +1,150 @@
+from typing import NamedTuple, List, Set
+
+from sqlalchemy import and_, func
+
+from database import db
+from helpers.parsers import chunked_list
+from models import (
+    Mutation, MutationSource, Protein, Gene, Site, SiteType, SiteMotif, MIMPMutation, are_details_managed
+)
+
+
+# ordered from the most to the least intense
+impact_types = ('direct', 'network-rewiring', 'motif-changing', 'proximal', 'distal')
+
+
+class PTMImpact(NamedTuple):
+    mutation_id: int
+    gene: str
+    refseq: str
+    position: int
+    alt: str
+    impact: str
+    # value of the mutation in the source (e.g. count of occurrences) or 1
+    value: float
+
+
+def source_value(source: MutationSource):
+    """SQL expression equivalent to `get_value()` of the details of a mutation in given source."""
+    if hasattr(source, 'maf_all'):
+        value = source.maf_all * source.scale
+    else:
+        value = source.count
+    return func.sum(value) if are_details_managed(source) else value
+
+
+def gather_ptm_impacts(
+    source: MutationSource,
+    site_type: SiteType,
+    muts_filter=None,
+    limit_to_genes: List[str] = None,
+    occurrences=True,
+    motif_changing: Set[int] = None,
+    chunk_size=10000
+) -> List[PTMImpact]:
+    """Classify mutations (of preferred isoforms) affecting sites of given type by their impact on the sites.
+
+    Set-based equivalent of calling `Mutation.impact_on_ptm()` with a filter
+    limiting the sites to `site_type` for every mutation from the source:
+    the distance to the closest site and the MIMP predictions are resolved
+    by grouped queries, so only the (few) mutations which could change
+    a motif defined in the database are loaded as objects.
+
+    Args:
+        source: mutation source to gather mutations from
+        site_type: sites of this type (including sub-types) are considered
+        muts_filter: SQLAlchemy filter for mutations
+        limit_to_genes: names of genes to limit the mutations to
+        occurrences: whether to return value of each mutation in the source or 1
+        motif_changing: identifiers of mutations known to change a motif of the site type
+            (e.g. from `MotifsCounter`); classified as 'motif-changing' unless 'direct'
+    """
+    site_filter = SiteType.fuzzy_filter(site_type, join=True)
+    motif_changing = motif_changing or set()
+
+    values = (
+        db.session.query(
+            source.mutation_id.label('mutation_id'),
+            source_value(source).label('value')
+        )
+    )
+    if are_details_managed(source):
+        values = values.group_by(source.mutation_id)
+    values = values.subquery()
+
+    mutations = (
+        db.session.query(Mutation.id)
+        .join(values, values.c.mutation_id == Mutation.id)
+        .join(Protein, Protein.id == Mutation.protein_id)
+        .join(Gene, Gene.preferred_isoform_id == Protein.id)
+        .join(Site, and_(
+            Site.protein_id == Mutation.protein_id,
+            Site.position.between(Mutation.position - 7, Mutation.position + 7)
+        ))
+        .filter(site_filter)
+    )
+    if muts_filter is not None:
+        mutations = mutations.filter(muts_filter)
+    if limit_to_genes is not None:
+        mutations = mutations.filter(Gene.name.in_(limit_to_genes))
+
+    closest_sites = (
+        mutations
+        .with_entities(
+            Mutation.id, Gene.name, Protein.refseq, Mutation.position, Mutation.alt, values.c.value,
+            func.min(func.abs(Mutation.position - Site.position))
+        )
+        .group_by(Mutation.id, Gene.id, Protein.id, values.c.value)
+    )
+
+    network_rewiring = {
+        mutation_id
+        for mutation_id, in (
+            db.session.query(MIMPMutation.mutation_id)
+            .join(Mutation, Mutation.id == MIMPMutation.mutation_id)
+            .join(Site, and_(
+                Site.id == MIMPMutation.site_id,
+                Site.position.between(Mutation.position - 7, Mutation.position + 7)
+            ))
+            .filter(site_filter)
+            .filter(MIMPMutation.mutation_id.in_(mutations.subquery()))
+            .distinct()
+        )
+    }
+
+    impacts = {}
+    motif_candidates = []
+
+    for mutation_id, gene, refseq, position, alt, value, distance in closest_sites:
+        if distance == 0:
+            impact = 'direct'
+        elif mutation_id in motif_changing:
+            impact = 'motif-changing'
+        elif mutation_id in network_rewiring:
+            impact = 'network-rewiring'
+        else:
+            motif_candidates.append(mutation_id)
+            impact = 'proximal' if distance <= 2 else 'distal'
+        impacts[mutation_id] = PTMImpact(
+            mutation_id, gene, refseq, position, alt, impact,
+            (value or 0) if occurrences else 1
+        )
+
+    if motif_candidates and db.session.query(SiteMotif.query.exists()).scalar():
+
+        def of_site_type(site):
+            # matches 'O-glycosylation' for site_type 'glycosylation'
+            return any(site_type.name in type_name for type_name in site.types_names)
+
+        for chunk in chunked_list(motif_candidates, chunk_size):
+            candidates = Mutation.query.filter(
+                Mutation.id.in_(chunk),
+                # only these can change a motif if the affected motifs were precomputed
+                Mutation.precomputed_affected_motifs.any() | (Mutation.were_affected_motifs_precomputed.isnot(True))
+            )
+            for mutation in candidates:
+                sites = [site for site in mutation.affected_sites if of_site_type(site)]
+                if mutation.affected_motifs(sites):
+                    impacts[mutation.id] = impacts[mutation.id]._replace(impact='motif-changing')
+
+    return list(impacts.values())
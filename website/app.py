@@ -64,6 +64,18 @@ def create_app(config_filename='config.py', config_override={}):
     for key, value in config_override.items():
         app.config[key] = value
 
+    # Disk caches (before the modules creating these are imported)
+    if app.config.get('CACHE_ROOT'):
+        from helpers.cache import set_cache_root
+        set_cache_root(app.config['CACHE_ROOT'])
+
+    profile_startup = app.config.get('PROFILE_STARTUP', False)
+
+    if profile_startup:
+        from helpers.profiling import StartupProfiler
+        profiler = StartupProfiler()
+        profiler.start()
+
     # ReCaptcha
     recaptcha.init_app(app)
 
@@ -193,6 +205,10 @@ def create_app(config_filename='config.py', config_override={}):
         #  optimally, the CMS logic would be moved out from views.
         register_jinja_functions(app)
 
+    if profile_startup:
+        profiler.stop()
+        profiler.report()
+
     return app
 
 
@@ -201,9 +217,13 @@ def register_jinja_functions(app):
     from website.views.cms import substitute_variables
     from website.views.cms import thousand_separated_number
     from website.views.cms import ContentManagementSystem
+    from website.views.cms import content_cache
     from jinja2_pluralize import pluralize
     import json
 
+    # the CMS content used by the functions below is cached per request (and per process)
+    app.before_request(content_cache.start_request)
+
     jinja_globals = app.jinja_env.globals
     jinja_filters = app.jinja_env.filters
 
@@ -217,6 +237,7 @@ def register_jinja_functions(app):
     jinja_globals['is_debug_mode'] = app.debug
 
     from stats import STORES
+    from stats.store import LazyMapping
 
     def rename_mutations(df):
 
@@ -230,11 +251,10 @@ def register_jinja_functions(app):
             df['MutationType'] = df['MutationType'].apply(lambda code_name: mutation_to_label.get(code_name, code_name))
         return df
 
-    jinja_globals['datasets'] = {
+    jinja_globals['datasets'] = LazyMapping(lambda: {
         key: rename_mutations(value)
         for key, value in STORES['Datasets'].items()
-    }
-    print(STORES['Datasets'].keys())
+    })
 
     from ggplot import register_ggplot_functions
 
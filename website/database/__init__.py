@@ -183,3 +183,29 @@ def get_engine(bind_key, app=None) -> Engine:
         from flask import current_app
         app = current_app
     return db.get_engine(app, bind_key)
+
+
+def dispose_engines(app=None):
+    """Close connections of all the engines, e.g. before forking worker processes
+
+    (so that the workers open their own connections, rather than share these).
+    """
+    if not app:
+        from flask import current_app
+        app = current_app
+    for bind_key in [None, *(app.config.get('SQLALCHEMY_BINDS') or {})]:
+        get_engine(bind_key, app).dispose()
+
+
+def supports_window_functions(engine: Engine) -> bool:
+    """Whether the database behind the engine supports window functions, e.g. ROW_NUMBER() OVER (...)"""
+    dialect = engine.dialect
+    if dialect.server_version_info is None:
+        # the version is only known after connecting for the first time
+        engine.connect().close()
+    version = dialect.server_version_info
+    if dialect.name == 'sqlite':
+        return version >= (3, 25)
+    if dialect.name == 'mysql':
+        return version >= ((10, 2) if dialect._is_mariadb else (8, 0))
+    return True
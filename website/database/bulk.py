@@ -1,6 +1,8 @@
+from collections import defaultdict
+from typing import Iterable, Mapping, NamedTuple, Sequence
 from warnings import warn
 
-from sqlalchemy import func
+from sqlalchemy import func, and_, or_, not_, select, exists, Table, Column, MetaData, Index, tuple_
 from sqlalchemy.exc import OperationalError
 
 from database import db, get_engine
@@ -46,6 +48,175 @@ def bulk_orm_insert(model, keys, data):
         db.session.flush()
 
 
+class UpsertCounts(NamedTuple):
+    inserted: int
+    updated: int
+    unchanged: int
+
+
+def bulk_upsert(model, keys: Sequence[str], rows: Iterable[Mapping], chunk_size=10000) -> UpsertCounts:
+    """Insert new and update changed rows of the table of given model, in bulk.
+
+    The rows are staged in a temporary table first, so that the comparison
+    with the existing rows, the update and the insert are each performed
+    with a single statement.
+
+    Args:
+        keys: names of columns identifying the rows (these are not updated);
+            the keys should match at most one row of the table
+        rows: values for the columns (each row should have the same columns)
+
+    Returns:
+        Counts of the inserted, updated and unchanged rows.
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return UpsertCounts(0, 0, 0)
+
+    target = model.__table__
+    columns = list(first)
+    values = [column for column in columns if column not in keys]
+
+    staging = Table(
+        target.name + '_staging', MetaData(),
+        *[Column(column, target.c[column].type) for column in columns],
+        Index(target.name + '_staging_keys', *keys),
+        prefixes=['TEMPORARY']
+    )
+
+    # temporary tables are only visible to the connection which created them
+    connection = db.session.connection(mapper=model.__mapper__)
+    staging.create(bind=connection)
+
+    try:
+        for chunk in chunked_list([first, *rows], chunk_size):
+            connection.execute(staging.insert(), chunk)
+
+        same_keys = and_(*[target.c[key].isnot_distinct_from(staging.c[key]) for key in keys])
+        changed = or_(*[target.c[column].is_distinct_from(staging.c[column]) for column in values])
+
+        staged = connection.execute(select([func.count()]).select_from(staging)).scalar()
+        matched = connection.execute(
+            select([func.count()]).select_from(staging.join(target, same_keys))
+        ).scalar()
+        unchanged = connection.execute(
+            select([func.count()]).select_from(staging.join(target, and_(same_keys, not_(changed))))
+        ).scalar() if values else matched
+
+        if values and matched != unchanged:
+            if connection.dialect.name == 'mysql':
+                # MySQL does not allow to refer to a temporary table more than once in a query,
+                # but supports multiple-table UPDATE statements
+                update = (
+                    target.update()
+                    .values({target.c[column]: staging.c[column] for column in values})
+                    .where(same_keys)
+                )
+            else:
+                update = (
+                    target.update()
+                    .values({
+                        column: select([staging.c[column]]).where(same_keys).limit(1).as_scalar()
+                        for column in values
+                    })
+                    .where(exists().where(and_(same_keys, changed)))
+                )
+            connection.execute(update)
+
+        connection.execute(
+            target.insert().from_select(
+                columns,
+                select([staging.c[column] for column in columns])
+                .select_from(staging.outerjoin(target, same_keys))
+                .where(and_(*[column.is_(None) for column in target.primary_key]))
+            )
+        )
+    finally:
+        staging.drop(bind=connection)
+
+    return UpsertCounts(
+        inserted=staged - matched,
+        updated=matched - unchanged,
+        unchanged=unchanged
+    )
+
+
+def bulk_replace(model, keys: Sequence[str], rows: Iterable[Mapping], chunk_size=10000) -> UpsertCounts:
+    """Replace the rows of the table of given model which share the keys with the given rows, in bulk.
+
+    Unlike `bulk_upsert`, the keys may match many rows (e.g. many entries of
+    a mutation in a source which has no discriminator for them): the rows
+    with the same keys are compared as a group and, if any of these changed,
+    all of them are deleted and the given ones inserted.
+
+    Returns:
+        Counts of the inserted, updated (i.e. replacing) and unchanged given rows.
+    """
+    groups = defaultdict(list)
+    for row in rows:
+        groups[tuple(row[key] for key in keys)].append(row)
+
+    if not groups:
+        return UpsertCounts(0, 0, 0)
+
+    key_columns = [getattr(model, key) for key in keys]
+    table = model.__table__
+
+    def with_keys(chunk):
+        if len(keys) == 1:
+            return key_columns[0].in_([key for key, in chunk])
+        return tuple_(*key_columns).in_(chunk)
+
+    def python_type(column):
+        try:
+            return table.c[column].type.python_type
+        except NotImplementedError:
+            return None
+
+    def as_comparable(group_rows, types):
+        # the parsed values may need a conversion (e.g. floats given as strings)
+        return sorted(
+            repr(tuple(
+                value if value is None or types[column] is None else types[column](value)
+                for column, value in row.items()
+            ))
+            for row in group_rows
+        )
+
+    inserted = updated = unchanged = 0
+
+    for chunk in chunked_list(list(groups), chunk_size):
+        columns = list(groups[chunk[0]][0])
+        types = {column: python_type(column) for column in columns}
+        existing = defaultdict(list)
+        for entry in db.session.query(*[getattr(model, column) for column in columns]).filter(with_keys(chunk)):
+            row = dict(zip(columns, entry))
+            existing[tuple(row[key] for key in keys)].append(row)
+
+        to_replace = []
+        to_insert = []
+        for key in chunk:
+            group = groups[key]
+            if key not in existing:
+                inserted += len(group)
+            elif as_comparable(existing[key], types) == as_comparable(group, types):
+                unchanged += len(group)
+                continue
+            else:
+                updated += len(group)
+                to_replace.append(key)
+            to_insert.extend(group)
+
+        if to_replace:
+            model.query.filter(with_keys(to_replace)).delete(synchronize_session=False)
+        if to_insert:
+            db.session.bulk_insert_mappings(model, to_insert)
+        db.session.flush()
+
+    return UpsertCounts(inserted=inserted, updated=updated, unchanged=unchanged)
+
+
 def get_autoincrement(model):
     """Fetch autoincrement value from database.
 
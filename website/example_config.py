@@ -45,6 +45,20 @@ HDB_READONLY = False
 # counting everything in the database in order to prepare statistics might be
 # quite slow. It is helpful to turn stats generation off to speed up debugging.
 LOAD_STATS = True
+# report the time of importing each module and of the queries issued during the startup
+PROFILE_STARTUP = False
+# directory of the disk caches (e.g. of the compressed responses and of the
+# version of imported data); relative to the website directory if not absolute.
+# Instances (and test runs) with separate databases should use separate roots.
+CACHE_ROOT = '.'
+# how long (in seconds) the counts of rows and the positions of pages of the
+# browse tables are remembered; set to 0 to disable; imports invalidate them
+TABLE_CACHE_TTL = 600
+# stop counting rows of the browse tables after this many (None to count all)
+TABLE_COUNT_LIMIT = None
+# endpoints to request with `./manage.py warm_up` (e.g. after an import) so
+# that their compressed responses are cached before the first visitors come
+WARM_UP_PATHS = ['/protein/known_mutations/NM_005228', '/network/data/NM_005228']
 CONTACT_LIST = ['some_maintainer@domain.org', 'other_maintainer@domain.org']
 LOGS_PATH = 'logs/app.log'
 
@@ -192,6 +192,24 @@ def population_muts_affecting_ptm_sites(path='exported/population_mutations_affe
     return mutations_affecting_ptm_sites([ExomeSequencingMutation, The1000GenomesMutation], path=path)
 
 
+@file_exporter(default_path='exported/impacts_of_mutations_on_ptm_sites.tsv')
+def impacts_on_ptm_sites(f, sources=(MC3Mutation, PCAWGMutation, InheritedMutation)):
+    """Impact of mutations (of preferred isoforms) on the closest PTM site of each type."""
+    from analyses.ptm_impact import gather_ptm_impacts
+
+    header = ['source', 'site type', 'gene', 'refseq', 'mutation position', 'mutation alt', 'impact', 'value']
+
+    f.write('\t'.join(header) + '\n')
+    for source in sources:
+        for site_type in SiteType.query:
+            for impact in gather_ptm_impacts(source, site_type):
+                data = [
+                    source.name, site_type.name, impact.gene, impact.refseq,
+                    impact.position, impact.alt, impact.impact, impact.value
+                ]
+                f.write('\t'.join(map(str, data)) + '\n')
+
+
 @exporter
 def ptm_muts_of_gene(
     path_template='exported/{site_type}_muts_of_{gene}_-_{protein}.tsv', gene='EGFR',
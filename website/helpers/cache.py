@@ -4,26 +4,66 @@ from warnings import warn
 
 from diskcache import Cache as DiskCache
 
+app_directory = Path(__file__).absolute().parent.parent
+
 
 class Cache(DiskCache):
 
     caches = []
+    # where the caches with relative paths are kept, unless given `cache_root`
+    root = app_directory
 
     def __init__(self, directory, *args, cache_root=None, **kwargs):
-        if not cache_root:
-            cache_root = Path(__file__).absolute().parent.parent
         path = Path(directory)
+        # caches with relative paths and no explicit root follow `set_cache_root()`
+        self.relocatable = not cache_root and not path.is_absolute()
+        self.settings = (path, args, kwargs)
         if not path.is_absolute():
-            path = cache_root / path
+            path = (cache_root or self.root) / path
         super().__init__(str(path), *args, **kwargs)
         self.caches.append(self)
 
+    def relocate(self, root: Path):
+        path, args, kwargs = self.settings
+        self.close()
+        super().__init__(str(root / path), *args, **kwargs)
+
+
+def set_cache_root(root):
+    """Keep the caches given by relative paths in the `root` directory,
+    e.g. to separate the caches of tests (or of another instance) from
+    the caches of the deployed instance.
+
+    Relative `root` is resolved against the directory of the application;
+    the caches which were already created are re-opened in the new root.
+    """
+    root = app_directory / root
+    if root == Cache.root:
+        return
+    Cache.root = root
+    for cache in Cache.caches:
+        if cache.relocatable:
+            cache.relocate(root)
+
 
 def purge_all_caches():
     for cache in Cache.caches:
         cache.clear()
 
 
+# shared by all processes (e.g. the web workers and the import commands)
+data_versions = Cache('.data_versions')
+
+
+def imported_data_version() -> int:
+    """Number of imports (or removals) of data so far, to invalidate caches of other processes."""
+    return data_versions.get('imports', 0)
+
+
+def mark_data_imported():
+    data_versions.incr('imports')
+
+
 def cache_decorator(cache: Cache) -> Callable:
     """Create a decorator caching results of the function calls.
 
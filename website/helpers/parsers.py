@@ -1,8 +1,10 @@
 import os
+import signal
 from contextlib import contextmanager
+from functools import lru_cache
 from glob import glob
 import gzip
-from typing import TextIO
+from typing import TextIO, List, Optional
 
 from tqdm import tqdm
 import subprocess
@@ -32,18 +34,35 @@ def get_files(path, pattern):
 
 @contextmanager
 def fast_gzip_read(file_name, mode='r', processes=4, as_str=False):
+    """Decompress given file with `pigz` subprocess, yielding its output stream.
+
+    The subprocess is always cleaned up; if it fails (other than because
+    the reading was stopped early) a ParsingError is raised.
+    """
     if mode != 'r':
         raise ValueError('Only "r" mode is supported')
 
-    command = f'pigz -d -p {processes} -c {file_name}'
-
-    p = subprocess.Popen(
-        command.split(' '),
+    process = subprocess.Popen(
+        ['pigz', '-d', '-p', str(processes), '-c', file_name],
         stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
+        stderr=subprocess.PIPE,
         universal_newlines=as_str
     )
-    yield p.stdout
+    finished = False
+    try:
+        yield process.stdout
+        finished = True
+    finally:
+        if not finished:
+            process.kill()
+        process.stdout.close()
+        error = process.stderr.read()
+        process.stderr.close()
+        return_code = process.wait()
+
+    # closing the stream before reading it whole terminates pigz with SIGPIPE
+    if return_code not in {0, -signal.SIGPIPE}:
+        raise ParsingError(f'Decompression of {file_name} with pigz failed ({return_code}): {error}')
 
 
 def read_from_gz_files(directory, pattern, skip_header=True, after_batch=lambda: None):
@@ -79,6 +98,127 @@ def count_lines_tsv_gz(filename):
         return sum(1 for _ in f)
 
 
+def iterate_with_progress(f, every=10000):
+    """Iterate over lines of an opened file with a progress bar of bytes read.
+
+    The position is taken from the file descriptor, so for the compressed
+    files (e.g. opened with gzip) the progress refers to the compressed
+    bytes. The file is read only once, as no line counting is needed.
+    """
+    try:
+        descriptor = f.fileno()
+    except (AttributeError, OSError):
+        # not backed by a file on disk (e.g. StringIO)
+        yield from tqdm(f, unit=' lines')
+        return
+
+    def position():
+        return os.lseek(descriptor, 0, os.SEEK_CUR)
+
+    with tqdm(total=os.fstat(descriptor).st_size, initial=position(), unit='B', unit_scale=True) as progress:
+        for i, line in enumerate(f):
+            if i % every == 0:
+                progress.update(position() - progress.n)
+            yield line
+        progress.update(position() - progress.n)
+
+
+def check_header(f, file_header, sep='\t'):
+    header = f.readline()
+    if isinstance(header, bytes):
+        header = header.decode('utf-8')
+    header = header.rstrip().split(sep)
+    if header != file_header:
+        raise ParsingError(
+            'Given file header does not match to expected: '
+            'expected: %s, found: %s' % (file_header, header)
+        )
+
+
+class LineIndex:
+    """Byte offsets of every `step`-th line of an uncompressed file.
+
+    Allows to move to any line with a single seek and at most `step - 1`
+    lines read (rather than reading all the preceding lines).
+
+    The index can be saved to a sidecar file (the indexed file name with
+    `suffix` appended), together with the size and modification time of
+    the indexed file, so that it is built only once across the processes.
+    """
+
+    suffix = '.lines_index'
+
+    def __init__(self, offsets: List[int], lines_count: int, step: int):
+        self.offsets = offsets
+        self.lines_count = lines_count
+        self.step = step
+        self.persisted = False
+
+    @classmethod
+    def build(cls, filename, step=10000):
+        offsets = []
+        position = 0
+        lines_count = 0
+        with open(filename, 'rb') as f:
+            for line in f:
+                if lines_count % step == 0:
+                    offsets.append(position)
+                position += len(line)
+                lines_count += 1
+        return cls(offsets, lines_count, step)
+
+    def save(self, path, modified, size):
+        with open(path, 'w') as f:
+            f.write(f'{modified}\t{size}\t{self.step}\t{self.lines_count}\n')
+            f.write('\n'.join(map(str, self.offsets)))
+        self.persisted = True
+
+    @classmethod
+    def load(cls, path, modified, size, step) -> Optional['LineIndex']:
+        """Load the index from given path, unless it is stale or has a different step."""
+        with open(path) as f:
+            saved_modified, saved_size, saved_step, lines_count = map(int, f.readline().split('\t'))
+            if (saved_modified, saved_size, saved_step) != (modified, size, step):
+                return
+            index = cls([int(offset) for offset in f], lines_count, step)
+        index.persisted = True
+        return index
+
+    def seek(self, f, line_number):
+        """Move opened file `f` to the beginning of given (0-based) line."""
+        block = min(line_number // self.step, len(self.offsets) - 1)
+        if block < 0:
+            return
+        f.seek(self.offsets[block])
+        for _ in range(line_number - block * self.step):
+            f.readline()
+
+
+@lru_cache(maxsize=16)
+def _cached_line_index(filename, modified, size, step):
+    sidecar = filename + LineIndex.suffix
+    if os.path.exists(sidecar):
+        index = LineIndex.load(sidecar, modified, size, step)
+        if index:
+            return index
+    return LineIndex.build(filename, step)
+
+
+def line_index(filename, step=10000, persist=False) -> LineIndex:
+    """Get index of lines in an uncompressed file, rebuilt only if the file changed.
+
+    Args:
+        persist: whether to save the index to a sidecar file, for reuse by
+            other processes (an up-to-date sidecar file is always used)
+    """
+    stat = os.stat(filename)
+    filename = os.path.abspath(filename)
+    index = _cached_line_index(filename, stat.st_mtime_ns, stat.st_size, step)
+    if persist and not index.persisted:
+        index.save(filename + LineIndex.suffix, stat.st_mtime_ns, stat.st_size)
+    return index
+
+
 def iterate_tsv_gz_file(
         filename, file_header=None
 ):
@@ -86,25 +226,21 @@ def iterate_tsv_gz_file(
 
     It checks if the file header is the same as given (if provided).
 
-    Progress bar is embedded.
+    Progress bar is embedded; the progress is measured in bytes
+    of the compressed file consumed so far, so that the file is
+    decompressed only once (rather than to count the lines first).
     """
-    data_lines_count = count_lines_tsv_gz(filename)
-
-    with fast_gzip_read(filename) as f:
+    with gzip.open(filename, 'rb') as f:
         if file_header:
-            header = f.readline().decode('utf-8').rstrip().split('\t')
-            data_lines_count -= 1
-            if header != file_header:
-                raise ParsingError(
-                    'Given file header does not match to expected: '
-                    'expected: %s, found: %s' % (file_header, header)
-                )
-        for line in tqdm(f, total=data_lines_count, unit=' lines'):
+            check_header(f, file_header)
+        for line in iterate_with_progress(f):
             line = line.decode('utf-8').rstrip().split('\t')
             yield line
 
 
 def count_lines_tsv(filename, file_opener=open, mode='r'):
+    if file_opener is open and 'b' not in mode:
+        return line_index(filename).lines_count
     with file_opener(filename, mode=mode) as f:
         return count_lines(f)
 
@@ -113,31 +249,33 @@ def tsv_file_iterator(
     filename, file_header=None, file_opener=open, mode='r',
     skip=None, limit=None, sep='\t'
 ):
-    data_lines_count = count_lines_tsv(filename, file_opener=file_opener, mode=mode)
+    """Iterate over lines of tsv file, split into lists of values.
 
+    For uncompressed files (opened with the default `file_opener`) the
+    `skip`ped lines are not read: the file is moved to the first requested
+    line using the (cached) LineIndex.
+    """
     with file_opener(filename, mode=mode) as f:
+        header_lines = 0
         if file_header:
-            header = f.readline().rstrip().split(sep)
-            data_lines_count -= 1
-            if header != file_header:
-                raise ParsingError(
-                    'Given file header does not match to expected: '
-                    'expected: %s, found: %s' % (file_header, header)
-                )
+            check_header(f, file_header, sep=sep)
+            header_lines = 1
 
         if skip:
-            for _ in range(skip):
-                f.readline()
+            if file_opener is open and 'b' not in mode:
+                line_index(filename).seek(f, header_lines + skip)
+            else:
+                for _ in range(skip):
+                    f.readline()
 
         if limit:
-            total = min([data_lines_count, limit])
-            for line in tqdm(f, total=total, unit=' lines'):
+            for line in tqdm(f, total=limit, unit=' lines'):
                 yield line.rstrip().split(sep)
                 limit -= 1
                 if limit <= 0:
                     return
         else:
-            for line in tqdm(f, total=data_lines_count, unit=' lines'):
+            for line in iterate_with_progress(f):
                 yield line.rstrip().split(sep)
 
 
@@ -164,13 +302,11 @@ def parse_text_file(filename, parser, file_header=None, file_opener=open):
     Progress bar is embedded.
     """
     with file_opener(filename) as f:
-        data_lines_count = count_lines(f)
         if file_header:
             header = f.readline().rstrip()
-            data_lines_count -= 1
             if header != file_header:
                 raise ParsingError
-        for line in tqdm(f, total=data_lines_count, unit=' lines'):
+        for line in iterate_with_progress(f):
             line = line.rstrip()
             parser(line)
 
@@ -185,7 +321,7 @@ def parse_fasta_file(filename, on_sequence, on_header=lambda x: x, file_opener=o
     header = None
 
     with file_opener(filename, mode) as f:
-        for line in tqdm(f, total=count_lines(f), unit=' lines'):
+        for line in iterate_with_progress(f):
             line = line.rstrip()
             if line.startswith('>'):
                 header = on_header(line[1:])
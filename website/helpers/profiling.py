@@ -0,0 +1,113 @@
+import sys
+from collections import defaultdict
+from time import perf_counter
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class ModuleStats:
+
+    def __init__(self):
+        self.total = 0
+        self.own = 0
+        self.queries = 0
+        self.queries_time = 0
+
+
+class StartupProfiler:
+    """Measure the time of importing each module and of the queries issued by it.
+
+    Only the modules imported for the first time while the profiler is
+    active are measured. A query is attributed to the innermost module
+    being executed at the time (or to `outside` - if no module is being
+    imported - e.g. for queries issued by the application factory itself).
+
+    Usage:
+
+        profiler = StartupProfiler()
+        profiler.start()
+        app = create_app()
+        profiler.stop()
+        profiler.report()
+    """
+
+    outside = '(not importing)'
+
+    def __init__(self):
+        self.modules = defaultdict(ModuleStats)
+        self.stack = []
+        self.query_started = None
+        # sum of the own times of all the modules imported so far
+        self.imports_time = 0
+
+    # importing
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec:
+                break
+        else:
+            return None
+
+        loader = spec.loader
+        # built-in and frozen modules are loaded by classes (not instances)
+        if loader and not isinstance(loader, type) and hasattr(loader, 'exec_module'):
+            loader.exec_module = self.timed(fullname, loader.exec_module)
+        return spec
+
+    def timed(self, name, exec_module):
+
+        def timed_exec_module(module):
+            self.stack.append(name)
+            start = perf_counter()
+            imports_time = self.imports_time
+            try:
+                exec_module(module)
+            finally:
+                total = perf_counter() - start
+                self.stack.pop()
+                own = total - (self.imports_time - imports_time)
+                stats = self.modules[name]
+                stats.total += total
+                stats.own += own
+                self.imports_time += own
+
+        return timed_exec_module
+
+    # querying
+
+    def before_cursor_execute(self, *args, **kwargs):
+        self.query_started = perf_counter()
+
+    def after_cursor_execute(self, *args, **kwargs):
+        stats = self.modules[self.stack[-1] if self.stack else self.outside]
+        stats.queries += 1
+        stats.queries_time += perf_counter() - self.query_started
+
+    def start(self):
+        sys.meta_path.insert(0, self)
+        event.listen(Engine, 'before_cursor_execute', self.before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self.after_cursor_execute)
+
+    def stop(self):
+        sys.meta_path.remove(self)
+        event.remove(Engine, 'before_cursor_execute', self.before_cursor_execute)
+        event.remove(Engine, 'after_cursor_execute', self.after_cursor_execute)
+
+    def report(self, limit=30, file=None):
+        """Print the modules which took the longest to import (excluding sub-modules) or to query."""
+        by_own_time = sorted(self.modules.items(), key=lambda item: max(item[1].own, item[1].queries_time), reverse=True)
+        print(f'{"module":<50} {"own [s]":>9} {"total [s]":>9} {"queries":>8} {"queries [s]":>11}', file=file)
+        for name, stats in by_own_time[:limit]:
+            print(
+                f'{name:<50} {stats.own:9.3f} {stats.total:9.3f} {stats.queries:8} {stats.queries_time:11.3f}',
+                file=file
+            )
+        print(
+            f'Imported modules in {self.imports_time:.3f}s, '
+            f'{sum(stats.queries for stats in self.modules.values())} queries issued', file=file
+        )
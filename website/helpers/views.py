@@ -1,13 +1,18 @@
 from copy import copy
+from time import monotonic
+from weakref import WeakKeyDictionary
 
 from flask import jsonify
-from flask import request
-from sqlalchemy import and_
+from flask import request, current_app
+from sqlalchemy import and_, or_, func, event, inspect
 from sqlalchemy import asc
 from sqlalchemy import desc
 from sqlalchemy.exc import StatementError
 from sqlalchemy.ext.associationproxy import AssociationProxy
+from sqlalchemy.orm import Session
+from sqlalchemy.util import KeyedTuple
 from database import db, fast_count
+from helpers.cache import imported_data_version
 from helpers.filters.manager import joined_query
 
 ordering_functions = {
@@ -33,6 +38,129 @@ class ModelCounter:
         return self
 
 
+def count_rows(count_query, at_most=None) -> int:
+    """Count rows of the query, but no more than `at_most + 1` of them (if given)."""
+    if at_most is None:
+        return count_query.count()
+    if isinstance(count_query, ModelCounter):
+        count_query = count_query.query
+    return count_query.session.query(func.count()).select_from(
+        count_query.limit(at_most + 1).subquery()
+    ).scalar()
+
+
+def query_engine(query):
+    entity = query.column_descriptions[0]['entity']
+    return query.session.get_bind(mapper=inspect(entity).mapper if entity is not None else None)
+
+
+def query_key(query, engine) -> tuple:
+    """The SQL and parameters of the query - identifying results of the query (for given data)."""
+    compiled = query.statement.compile(bind=engine)
+    return compiled.string, repr(sorted(compiled.params.items()))
+
+
+class TableCache:
+    """Counts of rows and pagination cursors of the tables, kept per database engine.
+
+    The entries expire after `TABLE_CACHE_TTL` seconds, or earlier: once
+    data were imported (by any process, see `mark_data_imported`) or
+    rows of any table from the engine were flushed by this process.
+    """
+
+    max_entries = 10000
+
+    def __init__(self):
+        # engine -> key -> (expiry time, value)
+        self.entries = WeakKeyDictionary()
+        self.imports_version = None
+        event.listen(Session, 'after_flush', self.after_flush)
+
+    def after_flush(self, session, flush_context):
+        for instance in session.new | session.dirty | session.deleted:
+            self.entries.pop(session.get_bind(mapper=inspect(instance).mapper), None)
+
+    def of_engine(self, engine) -> dict:
+        version = imported_data_version()
+        if version != self.imports_version:
+            self.entries.clear()
+            self.imports_version = version
+        return self.entries.setdefault(engine, {})
+
+    def get(self, engine, key, default=None):
+        expires, value = self.of_engine(engine).get(key, (0, default))
+        return value if expires > monotonic() else default
+
+    def set(self, engine, key, value):
+        ttl = current_app.config.get('TABLE_CACHE_TTL', 600)
+        if not ttl:
+            return
+        entries = self.of_engine(engine)
+        if len(entries) >= self.max_entries:
+            entries.clear()
+        entries[key] = (monotonic() + ttl, value)
+
+
+table_cache = TableCache()
+
+
+def cached_count(count_query, engine, at_most=None) -> int:
+    counted = count_query.query if isinstance(count_query, ModelCounter) else count_query
+    key = ('count', at_most, *query_key(counted, engine))
+
+    count = table_cache.get(engine, key)
+    if count is None:
+        count = count_rows(count_query, at_most=at_most)
+        table_cache.set(engine, key, count)
+    return count
+
+
+def seek(sort_column, key_column, cursor, descending=False):
+    """Filter selecting the rows following the cursor (keyset pagination).
+
+    NULLs are assumed to be sorted as the lowest values (as MySQL and SQLite do).
+    """
+    value, key = cursor
+    if descending:
+        return or_(
+            sort_column < value,
+            sort_column.is_(None),
+            and_(sort_column == value, key_column < key)
+        )
+    return or_(
+        sort_column > value,
+        and_(sort_column == value, key_column > key)
+    )
+
+
+def keyset_page(query, sort_column, key_column, offset, limit, descending, engine) -> list:
+    """Select a page of the query ordered by (sort_column, key_column).
+
+    If the page preceding the requested one was served before, its last row
+    is used as a cursor to seek to the page; otherwise the offset is used.
+    """
+    page_key = ('cursor', *query_key(query, engine))
+
+    cursor = table_cache.get(engine, (*page_key, offset)) if offset else None
+    if cursor:
+        query = query.filter(seek(sort_column, key_column, cursor, descending))
+    else:
+        query = query.offset(offset)
+
+    descriptions = query.column_descriptions
+    single_entity = len(descriptions) == 1 and descriptions[0]['type'] is descriptions[0]['entity']
+
+    rows = query.add_columns(sort_column, key_column).limit(limit).all()
+
+    if rows and rows[-1][-2] is not None:
+        table_cache.set(engine, (*page_key, offset + len(rows)), tuple(rows[-1][-2:]))
+
+    return [
+        row[0] if single_entity else KeyedTuple(row[:-2], row.keys()[:-2])
+        for row in rows
+    ]
+
+
 class AjaxTableView:
     """View returning data in JSON format, compatible with Bootstrap-Table.
 
@@ -57,6 +185,8 @@ class AjaxTableView:
 
             return query, sorted_field
 
+        kwargs.setdefault('keyset', model.id)
+
         return AjaxTableView.from_query(
             # Workaround for FSA 2.3 which does something weird to Model.query
             # query=model.query,
@@ -71,7 +201,7 @@ class AjaxTableView:
         query, count_query=None,
         results_mapper=json_results_mapper, filters_class=None,
         search_filter=None, search_sort=None,
-        prepare_for_sorting=None, **kwargs
+        prepare_for_sorting=None, keyset=None, **kwargs
     ):
         """Create TableView from an sqlalchemy query object.
 
@@ -99,6 +229,16 @@ class AjaxTableView:
                 and boolean indication if the query was modified.
             prepare_for_sorting:
                 hook to modify query and sort key (sort column)
+            keyset:
+                unique column to break the ties of the sort column;
+                if given, pages following a served page are selected
+                with a seek condition on (sort column, keyset) instead
+                of an offset (keyset pagination). Any other pages
+                (e.g. when jumping to the last page) use the offset.
+
+        The counts and the positions of served pages (cursors) are cached,
+        see `TableCache`. If `TABLE_COUNT_LIMIT` is set in the config,
+        no more rows are counted, and the total is marked as a lower bound.
 
         Keyword Args:
             sort, search, order, offset and limit will be used
@@ -168,7 +308,15 @@ class AjaxTableView:
             if phrase and search_sort:
                 query, sorted_by_search = search_sort(query, phrase, sort_key, ordering_function)
 
-            if not sorted_by_search and sort_key:
+            # sorting by a column (rather than by a label of a column in a grouped query)
+            use_keyset = keyset is not None and not sorted_by_search and sort_key is not None and not isinstance(sort_key, str)
+
+            if use_keyset:
+                query = query.order_by(
+                    ordering_function(sort_key),
+                    ordering_function(keyset)
+                )
+            elif not sorted_by_search and sort_key:
                 query = query.order_by(
                     ordering_function(sort_key)
                 )
@@ -185,21 +333,41 @@ class AjaxTableView:
                 query = query.filter(filters_conjunction)
                 count_query = count_query.filter(filters_conjunction)
 
+            count_limit = current_app.config.get('TABLE_COUNT_LIMIT')
+
             try:
-                count = count_query.count()
-                query = query.limit(args['limit']).offset(args['offset'])
-                elements = query
-            except StatementError as e:
+                offset = int(args['offset'])
+                limit = int(args['limit'])
+
+                engine = query_engine(query)
+                count = cached_count(count_query, engine, at_most=count_limit)
+
+                if use_keyset:
+                    elements = keyset_page(
+                        query, sort_key, keyset, offset, limit,
+                        descending=args['order'] == 'desc', engine=engine
+                    )
+                else:
+                    elements = query.limit(limit).offset(offset)
+
+                rows = [
+                    results_mapper(element)
+                    for element in elements
+                ]
+            except (StatementError, ValueError) as e:
                 db.session.rollback()
                 print('Statement Error detected!', e)
                 return jsonify({'message': 'Query error'})
 
-            return jsonify({
+            response = {
                 'total': count,
-                'rows': [
-                    results_mapper(element)
-                    for element in elements
-                ]
-            })
+                'rows': rows
+            }
+
+            if count_limit is not None and count > count_limit:
+                response['total'] = count_limit
+                response['total_is_lower_bound'] = True
+
+            return jsonify(response)
 
         return ajax_table_view
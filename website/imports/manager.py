@@ -1,6 +1,7 @@
 from typing import Type, List
 
 from database import db
+from helpers.cache import mark_data_imported
 from imports import AbstractImporter
 
 
@@ -37,6 +38,7 @@ class ImportManager:
                 db.session.add_all(results)
             print('Committing changes...')
             db.session.commit()
+            mark_data_imported()
             print(f'Success: {importer.name} done!')
 
     def resolve_import_order(self):
@@ -2,6 +2,7 @@ from importlib import import_module
 from os.path import basename
 from typing import List, Mapping, Type
 
+from helpers.cache import mark_data_imported
 from helpers.parsers import get_files
 from imports.protein_data import get_proteins
 
@@ -76,6 +77,9 @@ class MutationImportManager:
             method = getattr(importer, action)
             method(path=path, **kwargs)
 
+        if action != 'export':
+            mark_data_imported()
+
         print(f'Mutations {action}ed')
 
     @property
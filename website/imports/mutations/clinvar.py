@@ -1,12 +1,17 @@
+import gzip
+import os
 import re
 from collections import defaultdict
-from typing import Mapping, Iterable, Dict, TextIO, Union, NamedTuple
+from typing import Mapping, Dict, Union, NamedTuple, BinaryIO, Iterator, Tuple, Set
 from xml.etree import ElementTree
 
+from sqlalchemy import and_, bindparam
 from sqlalchemy.orm.exc import NoResultFound
+from tqdm import tqdm
+
 from models import InheritedMutation, Disease
 from models import ClinicalData, or_
-from helpers.parsers import tsv_file_iterator
+from helpers.parsers import tsv_file_iterator, chunked_list
 from helpers.parsers import gzip_open_text
 from database.bulk import get_highest_id, bulk_orm_insert, restart_autoincrement
 from database import db
@@ -19,19 +24,93 @@ class MalformedRawError(Exception):
     pass
 
 
-def count_characters(file: TextIO):
-    return sum(
-        len(line)
-        for line in file
-    )
-
-
 class ReferenceData(NamedTuple):
     rcv_accession: ElementTree.Element
     variation_id: int
     sample: ElementTree.Element
 
 
+class AssociationDetails(NamedTuple):
+    sig_code: int
+    rev_status: str
+    origin: str
+    additional_significances: Set[str]
+
+
+def iterate_clinvar_sets(file: BinaryIO) -> Iterator[ElementTree.Element]:
+    """Iterate over ClinVarSet elements of ClinVar XML release, freeing the already processed ones.
+
+    If lxml is available, it is used to parse the file, only producing events for ClinVarSet tags.
+    """
+    try:
+        from lxml import etree
+    except ImportError:
+        etree = None
+
+    if etree:
+        for event, element in etree.iterparse(file, events=('end',), tag='ClinVarSet'):
+            yield element
+            element.clear()
+            # drop the references to the already processed siblings
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+    else:
+        tree = iter(ElementTree.iterparse(file, events=('start', 'end')))
+        event, root = next(tree)
+
+        for event, element in tree:
+            if event == 'end' and element.tag == 'ClinVarSet':
+                yield element
+                root.clear()
+
+
+def update_associations(details: Mapping[Tuple[int, int], AssociationDetails], chunk_size=10000):
+    """Update ClinicalData using chunked, bulk UPDATE statements.
+
+    Args:
+        details: association details keyed by (variation id, disease id)
+    """
+    table = ClinicalData.__table__
+    columns = ['sig_code', 'rev_status', 'origin']
+
+    def statement(columns):
+        return (
+            table.update()
+            .where(
+                and_(
+                    table.c.variation_id == bindparam('key_variation_id'),
+                    table.c.disease_id == bindparam('key_disease_id')
+                )
+            )
+            .values({
+                column: bindparam('new_' + column, type_=table.c[column].type)
+                for column in columns
+            })
+        )
+
+    # the additional significances are only set when some were provided
+    for update_columns, rows in [
+        (columns, [(key, data) for key, data in details.items() if not data.additional_significances]),
+        (columns + ['additional_significances'], [(key, data) for key, data in details.items() if data.additional_significances])
+    ]:
+        update = statement(update_columns)
+        for chunk in chunked_list(rows, chunk_size):
+            db.session.execute(
+                update,
+                [
+                    {
+                        'key_variation_id': variation_id,
+                        'key_disease_id': disease_id,
+                        **{
+                            'new_' + column: getattr(data, column)
+                            for column in update_columns
+                        }
+                    }
+                    for (variation_id, disease_id), data in chunk
+                ]
+            )
+
+
 class ClinVarImporter(MutationImporter):
 
     name = 'clinvar'
@@ -224,10 +303,12 @@ class ClinVarImporter(MutationImporter):
         return sig_code, [sig.strip() for sig in additional_significances]
 
     def import_disease_associations(self):
-        """Add disease association details to the already imported mutation-disease associations"""
-        from tqdm import tqdm
-        import gzip
+        """Add disease association details to the already imported mutation-disease associations.
 
+        The XML release is streamed once (with progress measured in bytes of the
+        file on disk); the details are collected in memory and then saved
+        with bulk updates of ClinicalData.
+        """
         ignored_traits = {
             'not specified',
             'not provided'
@@ -245,41 +326,30 @@ class ClinVarImporter(MutationImporter):
         skipped_diseases = set()
 
         print('Collecting identifiers of variants to consider...')
-        variants_of_interest = {
+        self.variants_of_interest = {
             variation_id
             for variation_id, in db.session.query(ClinicalData.variation_id)
         }
         print('Identifiers collection done.')
 
         # otherwise there is no point...
-        assert variants_of_interest
-
-        opener = gzip.open if self.xml_path.endswith('.gz') else open
+        assert self.variants_of_interest
 
-        with opener(self.xml_path) as clinvar_full_release:
-            total_size = count_characters(clinvar_full_release)
-
-        step = 0
-
-        self.variants_of_interest = {
-            variation_id
-            for variation_id, in db.session.query(ClinicalData.variation_id)
-        }
         diseases: Dict[str, Disease] = {
             disease.name.lower(): disease
             for disease in Disease.query.all()
         }
+        associations: Dict[Tuple[int, int], AssociationDetails] = {}
 
-        with opener(self.xml_path) as clinvar_full_release:
-            tree = iter(ElementTree.iterparse(clinvar_full_release, events=('start', 'end')))
-            event, root = next(tree)
+        with open(self.xml_path, 'rb') as raw_file:
+            clinvar_full_release = gzip.GzipFile(fileobj=raw_file) if self.xml_path.endswith('.gz') else raw_file
 
-            progress_bar = tqdm(total=1000)
-            last_progress = 0
+            progress_bar = tqdm(total=os.path.getsize(self.xml_path), unit='B', unit_scale=True)
 
-            for event, element in tree:
-                if event != 'end' or element.tag != 'ClinVarSet':
-                    continue
+            for step, element in enumerate(iterate_clinvar_sets(clinvar_full_release)):
+
+                if step % 550 == 0:
+                    progress_bar.update(raw_file.tell() - progress_bar.n)
 
                 reference = element.find('ReferenceClinVarAssertion')
 
@@ -345,54 +415,43 @@ class ClinVarImporter(MutationImporter):
 
                 sig_code, additional_significances = self.parse_significance(significance)
 
-                disease_associations: Iterable[ClinicalData] = (
-                    ClinicalData.query
-                    .filter(ClinicalData.disease_id == disease.id)
-                    .filter(ClinicalData.variation_id == reference_data.variation_id)
-                )
+                key = (reference_data.variation_id, disease.id)
 
-                association_values = {
-                    'sig_code': sig_code,
-                    'rev_status': review_status,
-                    'origin': origin
-                }
+                details = AssociationDetails(
+                    sig_code=sig_code,
+                    rev_status=review_status,
+                    # IMPORTANT: every "continue" up to this point means that the mutation
+                    # will be removed in remove_muts_without_origin(), because origin will not be set
+                    origin=origin,
+                    additional_significances=set(additional_significances)
+                )
 
-                for disease_association in disease_associations:
+                if key in associations:
+                    old_details = associations[key]
 
-                    for key, value in association_values.items():
-                        old_value = getattr(disease_association, key)
-                        if old_value and old_value != value:
+                    for field, value in details._asdict().items():
+                        old_value = getattr(old_details, field)
+                        if field != 'additional_significances' and old_value and old_value != value:
                             print(
-                                f'Warning: {key} was already set to {old_value}'
+                                f'Warning: {field} was already set to {old_value}'
                                 f' for {reference_data.variation_id}/{disease},'
                                 f' while the new value is {value}'
                                 f' (accession: {reference_data.rcv_accession})'
                             )
 
-                    disease_association.sig_code = sig_code
-                    disease_association.rev_status = review_status
-                    # IMPORTANT: every "continue" up to this point means that the mutation
-                    # will be removed in remove_muts_without_origin(), because origin will not be set
-                    disease_association.origin = origin
+                    if not additional_significances:
+                        details = details._replace(additional_significances=old_details.additional_significances)
 
-                    if additional_significances:
-                        disease_association.additional_significances = set(additional_significances)
+                associations[key] = details
 
-                element.clear()
-
-                step += 1
-
-                if step % 550 == 0:
-                    progress = int(clinvar_full_release.tell() / total_size * 1000)
-
-                    if progress != last_progress:
-                        progress_bar.update(progress - last_progress)
-                        last_progress = progress
-
-                    root.clear()
+            progress_bar.update(raw_file.tell() - progress_bar.n)
+            progress_bar.close()
 
         print(skipped_diseases)
         print(self.skipped_significances)
+
+        print(f'Updating {len(associations)} disease associations...')
+        update_associations(associations)
         db.session.commit()
 
     def remove_muts_without_origin(self):
@@ -534,13 +593,13 @@ class ClinVarImporter(MutationImporter):
     def parse(self, path):
         clinvar_mutations = []
         clinvar_data = []
-        duplicates = 0
+        mutations_positions = {}
         new_diseases = {}
 
         highest_disease_id = get_highest_id(Disease)
 
         def clinvar_parser(line):
-            nonlocal highest_disease_id, duplicates
+            nonlocal highest_disease_id
 
             try:
                 (
@@ -556,8 +615,6 @@ class ClinVarImporter(MutationImporter):
             if not at_least_one_significant_sub_entry:
                 return
 
-            values = list(clinvar_entry.values())
-
             # should correspond to insert keys!
             clinvar_mutation_values = [
                 {int(rs) for rs in (clinvar_entry['RS'] or '').split('|') if rs},
@@ -566,27 +623,16 @@ class ClinVarImporter(MutationImporter):
 
             for mutation_id in self.get_or_make_mutations(line):
 
-                # take care of duplicates
-                duplicated = self.look_after_duplicates(mutation_id, clinvar_mutations, values[:1])
-                if duplicated:
-                    duplicates += 1
-                    continue
-
-                # take care of nearly-duplicates
-                same_mutation_pointers = self.mutations_details_pointers_grouped_by_unique_mutations[mutation_id]
-                assert len(same_mutation_pointers) <= 1
-
-                if same_mutation_pointers:
-                    pointer = same_mutation_pointers[0]
-
+                # take care of nearly-duplicates: SNVs resulting in the same protein-level mutation
+                if mutation_id in mutations_positions:
                     self.merge_into_old_snv(
-                        old_values=clinvar_mutations[pointer],
+                        old_values=clinvar_mutations[mutations_positions[mutation_id]],
                         new_values=clinvar_mutation_values,
                         mutation_id=mutation_id
                     )
                 else:
                     # only add the protein-level mutation once
-                    self.protect_from_duplicates(mutation_id, clinvar_mutations)
+                    mutations_positions[mutation_id] = len(clinvar_mutations)
                     clinvar_mutations.append([mutation_id, *clinvar_mutation_values])
 
                 # then add the disease-mutation relations;
@@ -658,8 +704,6 @@ class ClinVarImporter(MutationImporter):
         for line in self.iterate_lines(path):
             clinvar_parser(line)
 
-        print(f'{duplicates} duplicates found')
-
         return clinvar_mutations, clinvar_data, new_diseases.values()
 
     def export_details_headers(self):
@@ -671,9 +715,7 @@ class ClinVarImporter(MutationImporter):
             for d in mutation.clin_data
         ]
 
-    def insert_details(self, details):
-        clinvar_mutations, clinvar_data, new_diseases = details
-
+    def insert_new_diseases(self, new_diseases):
         disease_columns = ('name', *self.disease_id_clinvar_to_db.values())
 
         bulk_orm_insert(
@@ -681,6 +723,11 @@ class ClinVarImporter(MutationImporter):
             disease_columns,
             [disease_data for pk, disease_data in new_diseases]
         )
+
+    def insert_details(self, details):
+        clinvar_mutations, clinvar_data, new_diseases = details
+
+        self.insert_new_diseases(new_diseases)
         self.insert_list(clinvar_mutations)
         bulk_orm_insert(
             ClinicalData,
@@ -688,6 +735,35 @@ class ClinVarImporter(MutationImporter):
             clinvar_data
         )
 
+    def update_details(self, details):
+        """Upsert the ClinVar mutations and replace their disease associations.
+
+        The details of the associations are (re)populated from the XML
+        release afterwards, in `import_disease_associations()`.
+        """
+        clinvar_mutations, clinvar_data, new_diseases = details
+
+        self.insert_new_diseases(new_diseases)
+        counts = super().update_details(clinvar_mutations)
+
+        # the associations refer to the (1-based) position of the mutation in the parsed
+        # list (which matches the id on fresh inserts); translate it to the actual ids
+        inherited_ids = dict(db.session.query(InheritedMutation.mutation_id, InheritedMutation.id))
+        ids_by_position = [inherited_ids[mutation[0]] for mutation in clinvar_mutations]
+
+        for chunk in chunked_list(ids_by_position):
+            ClinicalData.query.filter(ClinicalData.inherited_id.in_(chunk)).delete(synchronize_session=False)
+
+        bulk_orm_insert(
+            ClinicalData,
+            ('inherited_id', 'disease_id', 'variation_id'),
+            [
+                (ids_by_position[position - 1], disease_id, variation_id)
+                for position, disease_id, variation_id in clinvar_data
+            ]
+        )
+        return counts
+
     def restart_autoincrement(self, model):
         assert self.model == model
         for model in [self.model, ClinicalData, Disease]:
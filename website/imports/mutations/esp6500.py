@@ -16,6 +16,9 @@ class ESP6500Importer(MutationImporter):
         'V12', 'V13', 'V14', 'V15', 'V16', 'V17', 'V18', 'V19', 'V20', 'V21'
     ]
     insert_keys = ('mutation_id', 'maf_ea', 'maf_aa', 'maf_all')
+    # there is no discriminator for the (rare) different entries of the same
+    # mutation, so all entries of an updated mutation are replaced together
+    replace_details_on_update = True
 
     def iterate_lines(self, path):
         return tsv_file_iterator(path, self.header, file_opener=gzip_open_text)
@@ -56,13 +59,10 @@ class ESP6500Importer(MutationImporter):
                     maf_all
                 )
 
-                duplicated = self.look_after_duplicates(mutation_id, esp_mutations, values)
-                if duplicated:
+                if self.is_duplicate(mutation_id, values[1:]):
                     duplicates += 1
                     continue
 
-                self.protect_from_duplicates(mutation_id, esp_mutations)
-
                 esp_mutations.append(values)
 
         for line in self.iterate_lines(path):
@@ -1,107 +1,74 @@
+from typing import Dict, List, NamedTuple, Tuple
 from warnings import warn
 
-from models import MIMPMutation, SiteType
+from database import db
+from models import MIMPMutation, Site, SiteType
 from helpers.bioinf import decode_raw_mutation
-from helpers.parsers import tsv_file_iterator, count_lines_tsv
+from helpers.parsers import tsv_file_iterator, line_index
 
 from .mutation_importer import ChunkedMutationImporter
 
 
-class MIMPImporter(ChunkedMutationImporter):
-    """
-    As MIMP mutations are conditional on sites, these HAVE TO be imported after sites.
-    """
-    # load("all_mimp_annotations_p085.rsav")
-    # write.table(all_mimp_annotations, file="all_mimp_annotations.tsv",
-    # row.names=F, quote=F, sep='\t')
+class MIMPChunk(NamedTuple):
+    # (protein id, position, alt, position in motif, effect, pwm, pwm family, probability, site id)
+    predictions: List[tuple]
+    skipped: List[str]
+    mismatched_sequences: int
 
-    name = 'mimp'
-    model = MIMPMutation
-    default_path = 'data/mutations/all_mimp_annotations.tsv'
-    header = [
-        'gene', 'mut', 'psite_pos', 'mut_dist', 'wt', 'mt', 'score_wt',
-        'score_mt', 'log_ratio', 'pwm', 'pwm_fam', 'nseqs', 'prob', 'effect'
-    ]
-    insert_keys = (
-        'mutation_id',
-        'position_in_motif',
-        'effect',
-        'pwm',
-        'pwm_family',
-        'probability',
-        'site_id'
-    )
-    site_type = 'phosphorylation'
-    chunk_size = round(24227847 / 5)   # should be optimal for 8 GB of memory
-
-    def iterate_lines(self, path):
-        return tsv_file_iterator(path, self.header)
 
-    def iterate_chunk(self, path, chunk_start, chunk_size):
-        header = self.header if chunk_size == 0 else None
-        return tsv_file_iterator(path, header, skip=chunk_start, limit=chunk_size)
+class MIMPChunkReader(NamedTuple):
+    """Reads MIMP predictions from a chunk of the file using plain data only.
 
-    def count_lines(self, path) -> int:
-        return count_lines_tsv(path)
-
-    def parse_chunk(self, path, chunk_start, chunk_size):
-        mimps = []
-        site_type = SiteType.query.filter_by(name=self.site_type).one()
-        skipped_predictions = 0
+    Does not query the database, so that the chunks can be read in worker processes.
+    """
+    header: List[str]
+    # refseq -> (protein id, sequence)
+    proteins: Dict[str, Tuple[int, str]]
+    # (protein id, position) -> id of the site of the imported type
+    sites: Dict[Tuple[int, int], int]
+
+    def __call__(self, path, chunk_start, chunk_size) -> MIMPChunk:
+        predictions = []
+        skipped = []
         mismatched_sequences = 0
 
-        def parser(line):
-            nonlocal mimps, skipped_predictions, mismatched_sequences
+        for line in tsv_file_iterator(path, self.header, skip=chunk_start, limit=chunk_size):
 
             refseq = line[0]
             mut = line[1]
             psite_pos = line[2]
 
             try:
-                protein = self.proteins[refseq]
+                protein_id, sequence = self.proteins[refseq]
             except KeyError:
-                return
+                continue
 
             ref, pos, alt = decode_raw_mutation(mut)
 
             try:
-                assert ref == protein.sequence[pos - 1]
+                assert ref == sequence[pos - 1]
             except (AssertionError, IndexError):
                 mismatched_sequences += 1
-                return
+                continue
 
             assert line[13] in ('gain', 'loss')
 
-            # MIMP mutations are always hardcoded PTM mutations
-            mutation_id = self.get_or_make_mutation(pos, protein.id, alt, True)
-
             psite_pos = int(psite_pos)
 
-            affected_sites = [
-                site
-                for site in protein.sites
-                if site.position == psite_pos
-                and any(t == site_type for t in site.types)
-            ]
-
-            # as this is site-type specific and only one site object of given type should be placed at a position,
-            # we can should assume that the selection above will always produce less than two sites
-            assert len(affected_sites) <= 1
-
-            if not affected_sites:
-                warning = UserWarning(
+            try:
+                site_id = self.sites[protein_id, psite_pos]
+            except KeyError:
+                skipped.append(
                     f'Skipping {refseq}: {ref}{pos}{alt} (for site at position {psite_pos}): '
                     'MIMP site does not match to the database - given site not found.'
                 )
-                warn(warning)
-                skipped_predictions += 1
-                return
-
-            site_id = affected_sites[0].id
+                continue
 
-            mimps.append(
+            predictions.append(
                 (
-                    mutation_id,
+                    protein_id,
+                    pos,
+                    alt,
                     int(line[3]),
                     1 if line[13] == 'gain' else 0,
                     line[9],
@@ -111,14 +78,84 @@ class MIMPImporter(ChunkedMutationImporter):
                 )
             )
 
-        for line in self.iterate_chunk(path, chunk_start, chunk_size):
-            parser(line)
+        return MIMPChunk(predictions, skipped, mismatched_sequences)
+
+
+class MIMPImporter(ChunkedMutationImporter):
+    """
+    As MIMP mutations are conditional on sites, these HAVE TO be imported after sites.
+    """
+    # load("all_mimp_annotations_p085.rsav")
+    # write.table(all_mimp_annotations, file="all_mimp_annotations.tsv",
+    # row.names=F, quote=F, sep='\t')
+
+    name = 'mimp'
+    model = MIMPMutation
+    default_path = 'data/mutations/all_mimp_annotations.tsv'
+    header = [
+        'gene', 'mut', 'psite_pos', 'mut_dist', 'wt', 'mt', 'score_wt',
+        'score_mt', 'log_ratio', 'pwm', 'pwm_fam', 'nseqs', 'prob', 'effect'
+    ]
+    insert_keys = (
+        'mutation_id',
+        'position_in_motif',
+        'effect',
+        'pwm',
+        'pwm_family',
+        'probability',
+        'site_id'
+    )
+    # a mutation may affect many sites, each with predictions for many kinases
+    details_keys = ('mutation_id', 'site_id', 'pwm')
+    site_type = 'phosphorylation'
+    chunk_size = round(24227847 / 5)   # should be optimal for 8 GB of memory
+
+    def iterate_lines(self, path):
+        return tsv_file_iterator(path, self.header)
+
+    def count_lines(self, path) -> int:
+        # the index is saved next to the file, so that it is built only once
+        return line_index(path, persist=True).lines_count - 1
+
+    def chunk_reader(self):
+        site_type = SiteType.query.filter_by(name=self.site_type).one()
+
+        sites = {}
+        query = (
+            db.session.query(Site.protein_id, Site.position, Site.id)
+            .filter(Site.types.any(SiteType.id == site_type.id))
+        )
+        for protein_id, position, site_id in query:
+            # as this is site-type specific only one site object of given type should be placed at a position
+            assert (protein_id, position) not in sites
+            sites[protein_id, position] = site_id
+
+        return MIMPChunkReader(
+            header=self.header,
+            proteins={
+                refseq: (protein.id, protein.sequence)
+                for refseq, protein in self.proteins.items()
+            },
+            sites=sites
+        )
+
+    def parse_chunk(self, chunk_data: 'MIMPChunk'):
+        mimps = []
+
+        for message in chunk_data.skipped:
+            warn(UserWarning(message))
+
+        for protein_id, pos, alt, *details in chunk_data.predictions:
+            # MIMP mutations are always hardcoded PTM mutations
+            mutation_id = self.get_or_make_mutation(pos, protein_id, alt, True)
+            mimps.append((mutation_id, *details))
 
+        skipped_predictions = len(chunk_data.skipped)
         if skipped_predictions:
             ratio = skipped_predictions / (skipped_predictions + len(mimps))
             print(f'In this chunk skipped {skipped_predictions} MIMP predictions ({ratio * 100}%)')
 
-        print(f'Skipped {mismatched_sequences} mismatched sequences')
+        print(f'Skipped {chunk_data.mismatched_sequences} mismatched sequences')
 
         return mimps
 
@@ -2,14 +2,16 @@ import gc
 import gzip
 from abc import abstractmethod
 from collections import defaultdict
-from typing import List, Iterable
+from contextlib import nullcontext
+from multiprocessing import Pool
+from typing import List, Iterable, Callable, Optional, Any
 
 from sqlalchemy.orm import load_only
 from sqlalchemy.util import classproperty
 from werkzeug.utils import cached_property
 
 from database import db, create_key_model_dict
-from database.bulk import bulk_orm_insert, restart_autoincrement
+from database.bulk import bulk_orm_insert, bulk_upsert, bulk_replace, restart_autoincrement
 from database.manage import raw_delete_all, remove_model
 from helpers.bioinf import decode_mutation, is_sequence_broken
 from helpers.patterns import abstract_property
@@ -18,6 +20,7 @@ from models import Protein, Mutation
 from ...importer import BioImporter
 from .base_importer import BaseMutationsImporter
 from .exporter import MutationExporter
+from .helpers import DuplicatesFilter
 
 
 # rename to MutationSourceManager?
@@ -32,7 +35,7 @@ class MutationImporter(BioImporter, MutationExporter):
     model = None
 
     def __init__(self, proteins=None):
-        self.mutations_details_pointers_grouped_by_unique_mutations = defaultdict(list)
+        self.duplicates_filter = DuplicatesFilter()
         self._proteins = proteins
         self.broken_seq = defaultdict(list)
 
@@ -74,13 +77,14 @@ class MutationImporter(BioImporter, MutationExporter):
 
         If update is True, old mutations will be updated and new added.
         Essential difference when using update is that 'update' prevents
-        adding duplicates (i.e. checks if mutations already exists in the
-        database) but is very slow, whereas when 'update=False', the whole
-        process is very fast but not reliable for purpose of reimporting data
-        without removing old mutations in the first place.
+        adding duplicates (i.e. compares the details with those already in
+        the database, using a bulk upsert keyed on `details_keys`), whereas
+        when 'update=False', the details are simply inserted, which is not
+        reliable for purpose of reimporting data without removing old
+        mutations in the first place.
 
         Long story short: when importing mutations to clean/new database - use
-        update=False. For updates use update=True and expect long runtime."""
+        update=False. For updates (e.g. of a new release) use update=True."""
         print(f'Loading {self.model_name}:')
 
         path = self.choose_path(path)
@@ -113,6 +117,7 @@ class MutationImporter(BioImporter, MutationExporter):
     def _load(self, path, update, **kwargs):
 
         self.base_importer.prepare()
+        self.duplicates_filter.reset()
 
         gc.collect()
 
@@ -248,9 +253,9 @@ class MutationImporter(BioImporter, MutationExporter):
 
         print(skipped / total)
 
-    def update(self, path=None):
+    def update(self, path=None, **kwargs):
         """Insert new and update old mutations. Same as load(update=True)."""
-        self.load(path, update=True)
+        self.load(path, update=True, **kwargs)
 
     @abstractmethod
     def iterate_lines(self, path) -> Iterable[List[str]]:
@@ -272,15 +277,33 @@ class MutationImporter(BioImporter, MutationExporter):
         session (flushing is allowed, committing is highly not recommended).
         Use of db.session methods like 'bulk_insert_mappings' is recommended."""
 
-    # @abstractmethod
-    # TODO: make it abstract and add it to all importers, altogether with tests
+    # columns identifying the details of a mutation, for the updates (when a source
+    # has many details entries for a single mutation these include a discriminator,
+    # e.g. the cancer for cancer mutations)
+    details_keys = ('mutation_id',)
+    # if the source can have many entries for a single mutation which cannot be told apart
+    # (no discriminator), all the entries of the mutation are replaced on update instead
+    replace_details_on_update = False
+
+    def details_rows(self, data) -> Iterable[dict]:
+        """Convert the data returned by `parse()` into rows (dicts) of self.model table."""
+        if not self.insert_keys:
+            raise NotImplementedError
+        return (dict(zip(self.insert_keys, entry)) for entry in data)
+
     def update_details(self, data):
         """Similarly to insert_details, iterate over data which hold all
         information needed to create self.model instances but instead of
         performing bulk_inserts (and therefore being prone to creation
-        of duplicates) check if each mutation already is in the database and
-        if it exists - overwrite it with the new data."""
-        raise NotImplementedError
+        of duplicates) insert only the new details, and update the changed
+        ones (as identified by `details_keys`), using a bulk upsert."""
+        update = bulk_replace if self.replace_details_on_update else bulk_upsert
+        counts = update(self.model, self.details_keys, self.details_rows(data))
+        print(
+            f'{self.model_name}: {counts.inserted} inserted, '
+            f'{counts.updated} updated, {counts.unchanged} unchanged'
+        )
+        return counts
 
     def insert_list(self, data):
         if not self.insert_keys:
@@ -365,44 +388,37 @@ class MutationImporter(BioImporter, MutationExporter):
             data = with_mutation
         return dict(zip(self.insert_keys, data))
 
-    def look_after_duplicates(self, mutation_id, mutations_details, values):
+    def is_duplicate(self, mutation_id, values) -> bool:
         """To prevent inclusion of duplicate data use this function to check for duplicates
         before adding any data to mutations_details insertion list.
 
-        For example, assuming that clinvar_mutations is an insertion list use:
+        For example, assuming that esp_mutations is an insertion list use:
 
             values = get_data_from_line(line)
 
             for mutation_id in self.get_or_make_mutations(line):
 
-                duplicated = self.look_after_duplicates(mutation_id, clinvar_mutations, values)
-
                 # skip unwanted duplicate
-                if duplicated:
+                if self.is_duplicate(mutation_id, values):
                     continue
 
-                self.protect_from_duplicates(mutation_id, clinvar_mutations)
+                esp_mutations.append((mutation_id, *values))
 
-                clinvar_mutations.append((mutation_id, *values))
+        The values are remembered until the next load (or chunk).
         """
+        return self.duplicates_filter.is_duplicate(mutation_id, values)
+
+
+_chunk_reader = None
+
+
+def _set_chunk_reader(reader):
+    global _chunk_reader
+    _chunk_reader = reader
 
-        if mutation_id in self.mutations_details_pointers_grouped_by_unique_mutations:
-            pointers = self.mutations_details_pointers_grouped_by_unique_mutations[mutation_id]
-            for pointer in pointers:
-                # first value in mutations_details store is used to keep mutation_id
-                old_values = mutations_details[pointer][1:]
-                if tuple(values) == tuple(old_values):
-                    data = self.data_as_dict(mutations_details[pointer])
-                    print(
-                        'The row with: %s is a duplicate of another row '
-                        '(with respect to the considered values).' % data
-                    )
-                    return True
 
-    def protect_from_duplicates(self, mutation_id, mutations_details):
-        """Use in tandem with look_after_duplicates method"""
-        new_pointer = len(mutations_details)
-        self.mutations_details_pointers_grouped_by_unique_mutations[mutation_id].append(new_pointer)
+def _read_chunk(chunk):
+    return _chunk_reader(*chunk)
 
 
 class ChunkedMutationImporter(MutationImporter):
@@ -411,20 +427,34 @@ class ChunkedMutationImporter(MutationImporter):
     # (and the importer is able to handle chunk-by-chunk processing), what
     # should be the size of each chunk (in number of lines)
     chunk_size = None
-    parse_kwargs = ['chunk_start', 'chunk_size']
+    # how many worker processes should read the chunks in parallel; the ids
+    # of new mutations are always assigned (and inserted) in the main process
+    processes = None
+    parse_kwargs = ['chunk_data']
 
     @abstractmethod
     def count_lines(self, path) -> int:
         pass
 
     @abstractmethod
-    def parse_chunk(self, path, chunk_start, chunk_size):
-        pass
+    def chunk_reader(self) -> Callable[[str, Optional[int], Optional[int]], Any]:
+        """Return a function reading a chunk of given file: (path, chunk_start, chunk_size).
+
+        The function should not touch the database (use plain data prepared
+        in advance instead), so that the chunks can be read in worker processes.
+        """
+
+    @abstractmethod
+    def parse_chunk(self, chunk_data):
+        """Get or make mutations for the data read by the `chunk_reader`."""
+
+    def parse(self, path, chunk_data):
+        return self.parse_chunk(chunk_data)
 
-    def parse(self, path, chunk_start, chunk_size):
-        return self.parse_chunk(path, chunk_start, chunk_size)
+    def _load(self, path, update, chunk=None, processes=None, **kwargs):
+        if processes is None:
+            processes = self.processes
 
-    def _load(self, path, update, chunk=None, **kwargs):
         total = self.count_lines(path)
         chunks = (
             list(range(0, total, self.chunk_size))
@@ -434,6 +464,18 @@ class ChunkedMutationImporter(MutationImporter):
         if chunk is not None:
             print(f'Limiting imported chunks to {chunk+1}-th chunk out of {len(chunks)}')
             chunks = [chunks[chunk]]
-        for chunk_start in chunks:
-            print(f'Importing chunk from {chunk_start/total*100:.2f} to {(chunk_start + self.chunk_size)/total*100:.2f}:')
-            super()._load(path, update, chunk_start=chunk_start, chunk_size=self.chunk_size)
+
+        reader = self.chunk_reader()
+        tasks = [(path, chunk_start, self.chunk_size) for chunk_start in chunks]
+
+        # with fork, the reader (and its data) is shared with the workers without pickling
+        with Pool(processes, _set_chunk_reader, (reader,)) if processes and len(tasks) > 1 else nullcontext() as pool:
+            chunks_data = pool.imap(_read_chunk, tasks) if pool else (reader(*task) for task in tasks)
+
+            for chunk_start, chunk_data in zip(chunks, chunks_data):
+                if chunk_start is not None:
+                    print(
+                        f'Importing chunk from {chunk_start/total*100:.2f} '
+                        f'to {min(chunk_start + self.chunk_size, total)/total*100:.2f}:'
+                    )
+                super()._load(path, update, chunk_data=chunk_data)
@@ -35,3 +35,32 @@ def make_metadata_ordered_dict(keys, metadata, get_from=None):
             dict_to_fill[key] = value
 
     return dict_to_fill
+
+
+class DuplicatesFilter:
+    """Detects duplicated details of mutations (the same values for the same mutation).
+
+    Only (mutation id, hash of values) pairs are remembered, unless exact
+    verification is requested: then the values are kept for comparison,
+    so that a hash collision can never drop a row. The state is plain
+    data, so a filter can be reset (or created) for each chunk or worker.
+    """
+
+    def __init__(self, verify=False):
+        self.verify = verify
+        self.seen = set()
+        self.duplicates = 0
+
+    def is_duplicate(self, mutation_id, values) -> bool:
+        """Check if the values were already seen for given mutation, remembering them if not."""
+        values = tuple(values)
+        key = (mutation_id, values if self.verify else hash(values))
+        if key in self.seen:
+            self.duplicates += 1
+            return True
+        self.seen.add(key)
+        return False
+
+    def reset(self):
+        self.seen = set()
+        self.duplicates = 0
@@ -1,6 +1,7 @@
-from collections import defaultdict
+from collections import defaultdict, Counter
+from tempfile import SpooledTemporaryFile
 
-from sqlalchemy.orm.exc import NoResultFound
+from tqdm import tqdm
 
 from database import db
 from database import get_or_create
@@ -22,6 +23,12 @@ class TCGAImporter(MutationImporter):
         'GeneDetail.refGene', 'ExonicFunc.refGene', 'AAChange.refGene', 'V11'
     ]
     samples_to_skip = set()
+    # samples with more (distinct) mutations are skipped; None disables the detection
+    hypermutation_threshold = None
+    # lines awaiting the hypermutation cutoff are moved to disk above this size (in bytes)
+    buffer_size = 2 ** 28
+    # mutation_id does not map 1-1 to CancerMutation
+    details_keys = ('mutation_id', 'cancer_id')
 
     def __init__(self, *args, export_samples=False, **kwargs):
         super().__init__(*args, **kwargs)
@@ -61,11 +68,57 @@ class TCGAImporter(MutationImporter):
         line[10] = cancer_name
         return line
 
+    def iterate_without_hypermutated(self, path):
+        """Iterate over lines of the samples which are not hypermutated.
+
+        The mutations of each sample are counted in the same pass which
+        buffers the lines, so that the compressed file is read only once.
+        """
+        from stats import select_hypermutated
+
+        print(
+            'Analyzing data to find hypermutated samples '
+            f'(samples with > {self.hypermutation_threshold} mutations)'
+        )
+        samples_mutations = defaultdict(set)
+        total = 0
+
+        with SpooledTemporaryFile(max_size=self.buffer_size) as buffer:
+
+            for line in self.iterate_lines(path):
+                cancer_name, sample_name = self.decode_line(line)
+
+                if sample_name in self.samples_to_skip:
+                    continue
+
+                samples_mutations[sample_name].add((line[0], int(line[1]), int(line[2]), line[3], line[4]))
+                buffer.write(('\t'.join(line) + '\n').encode('utf-8'))
+                total += 1
+
+            hypermutated = select_hypermutated(
+                Counter({sample: len(mutations) for sample, mutations in samples_mutations.items()}),
+                total, threshold=self.hypermutation_threshold
+            )
+            del samples_mutations
+
+            self.samples_to_skip = self.samples_to_skip | set(hypermutated)
+            print(f'{len(hypermutated)} samples are hypermutated and will be skipped at import.')
+
+            buffer.seek(0)
+
+            for line in tqdm(buffer, total=total, unit=' lines'):
+                yield line.decode('utf-8').rstrip('\n').split('\t')
+
     def parse(self, path):
 
         mutations = defaultdict(lambda: [0, set()])
 
-        for line in self.iterate_lines(path):
+        if self.hypermutation_threshold is None:
+            lines = self.iterate_lines(path)
+        else:
+            lines = self.iterate_without_hypermutated(path)
+
+        for line in lines:
             cancer_name, sample_name = self.decode_line(line)
 
             if sample_name in self.samples_to_skip:
@@ -125,20 +178,8 @@ class TCGAImporter(MutationImporter):
             )
             db.session.flush()
 
-    def update_details(self, mutations):
-        """Unfortunately mutation_id does not maps 1-1 for CancerMutation, so
-        additional field for filter is required - hence use of cancer_id and
-        hence cancer_id will not be updated with this method."""
-        for mutation, data in mutations.items():
-            kwargs = self.create_init_kwargs(mutation, data)
-            try:
-                mut = self.model.query.filter_by(
-                    mutation_id=mutation[0],
-                    cancer_id=mutation[1]
-                ).one()
-            except NoResultFound:
-                mut = self.model(**kwargs)
-                db.session.add(mut)
-
-            for key, value in kwargs.items():
-                setattr(mut, key, value)
+    def details_rows(self, mutations):
+        return (
+            self.create_init_kwargs(mutation, data)
+            for mutation, data in mutations.items()
+        )
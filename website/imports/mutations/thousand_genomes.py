@@ -21,6 +21,9 @@ class The1000GenomesImporter(MutationImporter):
         'maf_eur',
         'maf_sas',
     )
+    # there is no discriminator for the (rare) different entries of the same
+    # mutation, so all entries of an updated mutation are replaced together
+    replace_details_on_update = True
 
     @staticmethod
     # TODO: there are some issues with this function
@@ -89,13 +92,10 @@ class The1000GenomesImporter(MutationImporter):
 
             for mutation_id in self.get_or_make_mutations(line):
 
-                duplicated = self.look_after_duplicates(mutation_id, thousand_genomes_mutations, values)
-                if duplicated:
+                if self.is_duplicate(mutation_id, values):
                     duplicates += 1
                     continue
 
-                self.protect_from_duplicates(mutation_id, thousand_genomes_mutations)
-
                 thousand_genomes_mutations.append(
                     (mutation_id, *values)
                 )
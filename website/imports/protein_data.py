@@ -1,4 +1,5 @@
 from collections import defaultdict, namedtuple
+from multiprocessing import cpu_count
 from pathlib import Path
 from typing import Callable, Type
 from warnings import warn
@@ -291,7 +292,8 @@ def select_preferred_isoforms():
 
 
 @simple_bio_importer(requires=[proteins_and_genes])
-def conservation(path='data/hg19.100way.phyloP100way.bw', ref_gene_path='data/refGene.txt.gz'):
+def conservation(path='data/hg19.100way.phyloP100way.bw', ref_gene_path='data/refGene.txt.gz', processes=cpu_count()):
+    """Load PhyloP scores; chromosomes are processed in parallel unless `processes` is set to None."""
     from helpers.bioinf import read_genes_data
     from analyses.conservation.scores import scores_for_proteins
 
@@ -307,7 +309,7 @@ def conservation(path='data/hg19.100way.phyloP100way.bw', ref_gene_path='data/re
 
     proteins = get_proteins()
 
-    phylo_p_tracks, phylo_details = scores_for_proteins(proteins.values(), genes_data, path)
+    phylo_p_tracks, phylo_details = scores_for_proteins(proteins.values(), genes_data, path, processes)
 
     del genes_data
 
@@ -4,6 +4,7 @@ from itertools import chain
 from typing import List, Set, Iterable
 from warnings import warn
 from collections import Counter
+from multiprocessing import cpu_count
 
 from numpy import nan
 from pandas import DataFrame, Series
@@ -64,6 +65,9 @@ class SiteImporter(BioImporter):
 
     # used for cross-isoform mapping
     sequence_offset = 7
+    # number of processes searching for the sites in isoforms, None to search in the main process
+    # (the processes are only started for imports with many genes, see SiteMapper)
+    mapping_processes = cpu_count()
 
     @property
     @abstractmethod
@@ -226,7 +230,7 @@ class SiteImporter(BioImporter):
         if sites.empty:
             return sites
 
-        mapper = SiteMapper(self.proteins, self.repr_site)
+        mapper = SiteMapper(self.proteins, self.repr_site, processes=self.mapping_processes)
 
         # sites loaded so far were explicitly defined in data files
         mapped_sites = mapper.map_sites_by_sequence(sites)
@@ -1,7 +1,8 @@
 import logging
 import re
 from collections import defaultdict
-from typing import List
+from multiprocessing import Pool
+from typing import List, Sequence, Dict, Tuple, Optional
 from warnings import warn
 
 from pandas import DataFrame
@@ -61,15 +62,99 @@ def find_all_regex(longer_string: str, sub_string: str):
     ]
 
 
+class SequenceIndex:
+    """Index of all k-mers of given sequences.
+
+    Allows to find all occurrences of many sub-strings (each at least k long)
+    with a dictionary lookup per sub-string, instead of a scan of every sequence.
+    """
+
+    def __init__(self, sequences: Sequence[str], k: int):
+        self.k = k
+        self.sequences = sequences
+        self.kmers = defaultdict(list)
+
+        for i, sequence in enumerate(sequences):
+            for position in range(len(sequence) - k + 1):
+                self.kmers[sequence[position:position + k]].append((i, position))
+
+    def find_all(self, sub_string: str) -> List[List[int]]:
+        """Returns positions of all overlapping matches in each of the sequences."""
+        matches = [[] for _ in self.sequences]
+
+        for i, position in self.kmers.get(sub_string[:self.k], []):
+            if self.sequences[i].startswith(sub_string, position):
+                matches[i].append(position)
+
+        return matches
+
+
+# building the index is only worth it if many sites are to be found in the same isoforms
+MIN_SITES_TO_INDEX = 100
+# length of indexed k-mers; shorter site sequences (e.g. truncated at a terminus) are matched with find_all
+KMER_LENGTH = 7
+# starting worker processes is only worth it for many groups of isoforms
+MIN_TASKS_FOR_POOL = 500
+
+
+def find_all_in_isoforms(task: Tuple[List[str], List[str]]) -> Dict[str, List[List[int]]]:
+    """Find all occurrences of each of the site sequences in each of the isoform sequences.
+
+    Sequences anchored at the N- or C-terminus or shorter than KMER_LENGTH are matched
+    with `find_all`, and so are small batches of sequences; otherwise a k-mer index
+    of the isoforms is built once and used to locate all the sites.
+
+    Returns:
+        site sequence -> list of (0-based) positions of matches in each isoform
+    """
+    isoform_sequences, site_sequences = task
+
+    not_indexable = {
+        sequence
+        for sequence in site_sequences
+        if sequence.startswith('^') or sequence.endswith('$') or len(sequence) < KMER_LENGTH
+    }
+    indexable = [sequence for sequence in site_sequences if sequence not in not_indexable]
+
+    if len(indexable) >= MIN_SITES_TO_INDEX:
+        index = SequenceIndex(isoform_sequences, k=KMER_LENGTH)
+        matches = {
+            sequence: index.find_all(sequence)
+            for sequence in indexable
+        }
+    else:
+        not_indexable.update(indexable)
+        matches = {}
+
+    for sequence in not_indexable:
+        matches[sequence] = [
+            find_all(isoform_sequence, sequence)
+            for isoform_sequence in isoform_sequences
+        ]
+
+    return matches
+
+
 class OneBasedPosition(int):
     pass
 
 
 class SiteMapper:
 
-    def __init__(self, proteins, repr_site):
+    def __init__(self, proteins, repr_site, processes: Optional[int] = None, min_tasks_for_pool=MIN_TASKS_FOR_POOL):
+        """
+        Args:
+            proteins: refseq -> protein mapping
+            repr_site: function returning a representation of a site to be used in messages
+            processes: number of worker processes to search for the sites in isoforms' sequences;
+                by default the search is performed in the main process
+            min_tasks_for_pool: the worker processes are only started if there are at least
+                that many groups of isoforms to search in
+        """
         self.proteins = proteins
         self.repr_site = repr_site
+        self.processes = processes
+        self.min_tasks_for_pool = min_tasks_for_pool
         self.genes = create_key_model_dict(Gene, 'name')
         self.has_gene_names = None
         self.already_warned = None
@@ -110,21 +195,29 @@ class SiteMapper:
         self.already_warned = set()
         self.has_gene_names = 'gene' in sites.columns
 
-        known_sites_by_refseq = defaultdict(list)
+        known_sites_by_position = defaultdict(list)
         for site in sites.itertuples(index=False):
-            known_sites_by_refseq[site.refseq].append(site)
+            known_sites_by_position[site.refseq, site.position].append(site)
 
-        for site in tqdm(sites.itertuples(index=False), total=len(sites)):
+        isoforms_to_map = [
+            self.choose_isoforms_to_map(site)
+            for site in sites.itertuples(index=False)
+        ]
+
+        occurrences = self.find_sites_in_isoforms(sites, isoforms_to_map)
+
+        for site, isoforms in tqdm(zip(sites.itertuples(index=False), isoforms_to_map), total=len(sites)):
 
             was_mapped = False
             protein = self.proteins.get(site.refseq, None)
             positions = {}
 
-            isoforms_to_map = self.choose_isoforms_to_map(site)
-
             # find matches
-            for isoform in isoforms_to_map:
-                positions[isoform] = self.map_site_to_isoform(site, isoform)
+            if isoforms:
+                site_occurrences = occurrences[isoforms][site.sequence]
+
+                for isoform, isoform_occurrences in zip(isoforms, site_occurrences):
+                    positions[isoform] = self.map_site_to_isoform(site, isoform, isoform_occurrences)
 
             if protein:
                 matches = positions[protein]
@@ -133,10 +226,6 @@ class SiteMapper:
             # create rows with sites
             for isoform, matched_positions in positions.items():
 
-                # to check if any other of the sites is already mapped here;
-                # note: it will not raise as it is a defaultdict
-                input_sites_of_this_isoform = known_sites_by_refseq[isoform.refseq]
-
                 for position in matched_positions:
 
                     # _replace() returns new namedtuple with replaced values;
@@ -155,9 +244,10 @@ class SiteMapper:
                         # it shall not be repeated (to avoid duplicates)
                         any(
                             # note: using equality comparison as site tuple can contain
-                            # non-hashable elements at this point
+                            # non-hashable elements at this point; only the sites known
+                            # to be at this very position of this isoform can be equal
                             existing_site == new_site
-                            for existing_site in input_sites_of_this_isoform
+                            for existing_site in known_sites_by_position.get((isoform.refseq, position), [])
                         )
                         # however, if we are in the isoform from which we are mapping
                         # so mapping onto itself, we should allow such matches
@@ -195,7 +285,41 @@ class SiteMapper:
 
         return DataFrame(mapped_sites)
 
-    def map_site_to_isoform(self, site, isoform: Protein) -> List[OneBasedPosition]:
+    def find_sites_in_isoforms(self, sites: DataFrame, isoforms_to_map: List[Tuple[Protein]]):
+        """Locate sequences of all sites in sequences of the isoforms they are to be mapped to.
+
+        Sites are grouped by the isoforms (typically - all isoforms of a gene), so that
+        each group can be searched at once, optionally in a pool of worker processes.
+
+        Returns:
+            isoforms -> site sequence -> list of (0-based) matches positions in each isoform
+        """
+        sequences_by_isoforms = defaultdict(set)
+
+        for site, isoforms in zip(sites.itertuples(index=False), isoforms_to_map):
+            if isoforms:
+                sequences_by_isoforms[isoforms].add(site.sequence)
+
+        groups = list(sequences_by_isoforms)
+        tasks = [
+            (
+                # asterisks (*) representing stop codon are removed for the time of mapping
+                # so expression like 'SOMECTERMINALSEQUENCE$' can be easily matched
+                [isoform.sequence.rstrip('*') for isoform in isoforms],
+                list(sequences_by_isoforms[isoforms])
+            )
+            for isoforms in groups
+        ]
+
+        if self.processes and len(tasks) >= self.min_tasks_for_pool:
+            with Pool(self.processes) as pool:
+                results = list(tqdm(pool.imap(find_all_in_isoforms, tasks, chunksize=64), total=len(tasks)))
+        else:
+            results = [find_all_in_isoforms(task) for task in tqdm(tasks)]
+
+        return dict(zip(groups, results))
+
+    def map_site_to_isoform(self, site, isoform: Protein, occurrences: List[int] = None) -> List[OneBasedPosition]:
         """Finds all occurrences of a site (by exact sequence match)
         in provided sequence of an alternative isoform.
 
@@ -204,13 +328,20 @@ class SiteMapper:
         the one of the original site. This is based on premise that most of
         alternative isoform should not differ so much.
 
+        Args:
+            occurrences: 0-based positions of site sequence in the isoform,
+                if already known (see `find_sites_in_isoforms`)
+
         Returned positions are 1-based
         """
-        matches = [
-            m + 1 + site.left_sequence_offset
+        if occurrences is None:
             # asterisks (*) representing stop codon are removed for the time of mapping
             # so expression like 'SOMECTERMINALSEQUENCE$' can be easily matched
-            for m in find_all(isoform.sequence.rstrip('*'), site.sequence)
+            occurrences = find_all(isoform.sequence.rstrip('*'), site.sequence)
+
+        matches = [
+            m + 1 + site.left_sequence_offset
+            for m in occurrences
         ]
 
         if len(matches) > 1:
@@ -235,7 +366,8 @@ class SiteMapper:
 
         return matches
 
-    def choose_isoforms_to_map(self, site):
+    def choose_isoforms_to_map(self, site) -> Tuple[Protein]:
+        """Returns isoforms (sorted by refseq) to which the site should be mapped."""
         protein = None
 
         if site.refseq not in self.proteins:
@@ -253,16 +385,17 @@ class SiteMapper:
                         f'(first encountered for {self.repr_site(site)}).'
                     )
                     self.already_warned.add(site.refseq)
-                return []
+                return ()
         else:
             protein = self.proteins[site.refseq]
             gene = protein.gene
 
         if gene and gene.isoforms:
-            return {self.proteins[isoform.refseq] for isoform in gene.isoforms}
+            isoforms = {self.proteins[isoform.refseq] for isoform in gene.isoforms}
+            return tuple(sorted(isoforms, key=lambda isoform: isoform.refseq))
         elif protein:
-            return {protein}
-        return []
+            return (protein,)
+        return ()
 
     def compare_matches_with_expectations(self, original_isoform_matches, site):
 
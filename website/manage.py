@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 import argparse
 from contextlib import contextmanager
+from multiprocessing import cpu_count
 from typing import Mapping, Text
 
 from flask import current_app
@@ -47,8 +48,23 @@ def calc_statistics(args, app=None):
         for store_name in args.groups:
             store_class = stores_map[store_name]
             store = store_class()
-            store.calc_all(limit_to=args.limit_to)
-        db.session.commit()
+            store.calc_all(limit_to=args.limit_to, processes=args.processes, resume=args.resume)
+
+
+def precompute_motifs(args, app=None):
+    if not app:
+        app = create_app(config_override=CONFIG)
+    with app.app_context():
+        from analyses.motifs import precompute_affected_motifs
+        precompute_affected_motifs(processes=args.processes, full=args.full)
+
+
+def warm_up(args, app=None):
+    if not app:
+        # the views are needed to serve the responses
+        app = create_app(config_override={**CONFIG, 'LOAD_VIEWS': True})
+    from views._commons import warm_up_responses
+    warm_up_responses(app, args.paths or app.config.get('WARM_UP_PATHS', []))
 
 
 def automigrate(args, app=None):
@@ -365,6 +381,17 @@ class Mutations(CommandTarget):
             help='Limit import to n-th chunk, starts with 0. By default None.'
         )
 
+    @load.argument
+    def processes(self):
+        return argument_parameters(
+            '-p',
+            '--processes',
+            type=int,
+            default=None,
+            help='Number of worker processes reading the chunks of chunked imports (i.e. MIMP) in parallel.'
+                 ' By default the chunks are read in the main process.'
+        )
+
     @load.argument
     def disable_constraints(self):
         return argument_parameters(
@@ -516,6 +543,62 @@ def create_parser():
         default=None
     )
 
+    calc_stats.add_argument(
+        '-p',
+        '--processes',
+        type=int,
+        default=None,
+        help='number of worker processes to calculate the counters in'
+    )
+
+    calc_stats.add_argument(
+        '-r',
+        '--resume',
+        action='store_true',
+        help='skip the counters completed by the previous (failed or interrupted) run'
+    )
+
+    motifs_parser = new_subparser(
+        subparsers,
+        'precompute_motifs',
+        precompute_motifs,
+        help=(
+            'precompute motifs affected by mutations; only mutations and sites'
+            ' added since the last run are processed, unless --full is given'
+        )
+    )
+
+    motifs_parser.add_argument(
+        '-p',
+        '--processes',
+        type=int,
+        default=cpu_count(),
+        help='number of worker processes; use 0 to process all proteins in the main process'
+    )
+
+    motifs_parser.add_argument(
+        '--full',
+        action='store_true',
+        help='recompute motifs of all mutations (e.g. after the motifs were changed)'
+    )
+
+    warm_up_parser = new_subparser(
+        subparsers,
+        'warm_up',
+        warm_up,
+        help=(
+            'request the most used endpoints (e.g. after an import),'
+            ' so that their compressed responses are cached'
+        )
+    )
+
+    warm_up_parser.add_argument(
+        'paths',
+        type=str,
+        nargs='*',
+        help='paths to request; by default WARM_UP_PATHS from the config'
+    )
+
     shell_parser = new_subparser(
         subparsers,
         'shell',
@@ -1,5 +1,6 @@
 from abc import ABCMeta, abstractmethod
-from collections import UserList, OrderedDict
+from bisect import bisect_left, bisect_right
+from collections import UserList, OrderedDict, defaultdict
 from functools import lru_cache
 from typing import Type, Iterable, Mapping, List, Dict, TYPE_CHECKING
 
@@ -788,11 +789,20 @@ class MutatedMotifs:
         )
 
     def affected_motifs(self, sites: Iterable[Site] = None):
-        if self.were_affected_motifs_precomputed:
-            return self.precomputed_affected_motifs
+        """Return (motif, position of mutation in the motif) pairs for motifs broken by this mutation.
 
+        If the affected motifs were precomputed, only these are considered
+        (and there is nothing to evaluate for the vast majority of mutations).
+        """
         from analyses.motifs import mutate_sequence
-        from analyses.motifs import has_motif
+        from analyses.motifs import matcher_for_patterns
+
+        if self.were_affected_motifs_precomputed:
+            candidate_motifs = self.precomputed_affected_motifs
+            if not candidate_motifs:
+                return []
+        else:
+            candidate_motifs = None
 
         affected_motifs = []
 
@@ -800,16 +810,35 @@ class MutatedMotifs:
             sites = self.affected_sites
 
         for site in sites:
+            mutated_sequence = None
+
             for site_type in site.types:
 
-                for motif in site_type.motifs:
+                motifs = [
+                    motif
+                    for motif in site_type.motifs
+                    if candidate_motifs is None or motif in candidate_motifs
+                ]
+                if not motifs:
+                    continue
 
-                    if site.has_motif(motif.pattern):
-                        # todo: make it a method of mutation? "self.mutate_sequence()" ?
+                patterns = frozenset(motif.pattern for motif in motifs)
 
-                        mutated_sequence = mutate_sequence(site, self, offset=7)
-                        if not has_motif(mutated_sequence, motif.pattern):
-                            affected_motifs.append((motif, self.position - site.position + 7))
+                # equivalent to site.has_motif(motif.pattern) for every motif
+                motifs_at_site = matcher_for_patterns(patterns, anchored=True)(site.sequence)
+
+                if not motifs_at_site:
+                    continue
+
+                if mutated_sequence is None:
+                    # todo: make it a method of mutation? "self.mutate_sequence()" ?
+                    mutated_sequence = mutate_sequence(site, self, offset=7)
+
+                motifs_at_mutated_site = matcher_for_patterns(patterns)(mutated_sequence)
+
+                for motif in motifs:
+                    if motif.pattern in motifs_at_site and motif.pattern not in motifs_at_mutated_site:
+                        affected_motifs.append((motif, self.position - site.position + 7))
 
         return affected_motifs
 
@@ -1062,6 +1091,60 @@ class Mutation(BioModel, MutatedMotifs):
         else:
             return sites
 
+    @staticmethod
+    def find_closest_sites_in_bulk(positions: Iterable, distance=7, proteins_per_query=500) -> List[List[Site]]:
+        """Equivalent of `find_closest_sites` for many mutations at once.
+
+        Args:
+            positions: (protein id, position) pairs of the mutations
+
+        Returns:
+            closest sites for each of the pairs (in the same order)
+
+        The sites spanning the positions of each protein are fetched
+        with a single query (per `proteins_per_query` proteins) and
+        the closest ones are found by bisection.
+        """
+        positions = list(positions)
+
+        spans = {}
+        for protein_id, pos in positions:
+            start, end = spans.get(protein_id, (pos, pos))
+            spans[protein_id] = min(start, pos), max(end, pos)
+
+        sites_by_protein = defaultdict(list)
+        proteins = list(spans)
+
+        for i in range(0, len(proteins), proteins_per_query):
+            sites = Site.query.filter(or_(*[
+                and_(
+                    Site.protein_id == protein_id,
+                    Site.position.between(spans[protein_id][0] - distance, spans[protein_id][1] + distance)
+                )
+                for protein_id in proteins[i:i + proteins_per_query]
+            ])).order_by(Site.position)
+            for site in sites:
+                sites_by_protein[site.protein_id].append(site)
+
+        sites_positions = {
+            protein_id: [site.position for site in sites]
+            for protein_id, sites in sites_by_protein.items()
+        }
+
+        closest_sites = []
+        for protein_id, pos in positions:
+            sites = sites_by_protein.get(protein_id, [])
+            sites_pos = sites_positions.get(protein_id, [])
+            nearby = sorted(
+                sites[bisect_left(sites_pos, pos - distance):bisect_right(sites_pos, pos + distance)],
+                key=lambda site: abs(site.position - pos)
+            )[:2]
+            if len(nearby) == 2 and abs(nearby[0].position - pos) != abs(nearby[1].position - pos):
+                nearby = nearby[:1]
+            closest_sites.append(nearby)
+
+        return closest_sites
+
     @hybrid_method
     def is_close_to_some_site(self, left, right, sites=None):
         """Check if the mutation lies close to any of sites.
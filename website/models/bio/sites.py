@@ -187,6 +187,9 @@ class Site(BioModel):
     psp_mass_spec_literature_evidence = db.Column(db.Integer)
     psp_low_throughput_literature_evidence = db.Column(db.Integer)
 
+    # were motifs affected by mutations around this site precomputed (see MutatedMotifs)?
+    were_nearby_motifs_precomputed = db.Column(db.Boolean, default=False)
+
     @property
     def types_names(self):
         return {site_type.name for site_type in self.types}
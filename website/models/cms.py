@@ -57,6 +57,22 @@ class VennDiagram(CMSModel):
     value = db.Column(db.PickleType)
 
 
+class CountCalculation(CMSModel):
+    """Status and timing of the last calculation of a counter from given store"""
+    store = db.Column(db.String(64))
+    name = db.Column(db.String(254))
+    # one of: pending, completed, failed
+    status = db.Column(db.String(16))
+    # in seconds
+    duration = db.Column(db.Float)
+    finished_on = db.Column(db.DateTime)
+    error = db.Column(db.Text())
+
+    __table_args__ = (
+        db.UniqueConstraint('store', 'name'),
+    )
+
+
 class BadWord(CMSModel):
     """Model for words which should be filtered out"""
 
@@ -544,3 +560,13 @@ class TextEntry(CMSModel):
 
     name = db.Column(db.String(256), nullable=False, unique=True, index=True)
     content = db.Column(db.Text())
+
+
+class ContentVersion(CMSModel):
+    """Counter of changes of the CMS content (settings, menus, pages, text and help entries).
+
+    Incremented by the CMS write paths so that all processes know
+    to reload their cached copies of the content.
+    """
+
+    value = db.Column(db.Integer, nullable=False, default=0)
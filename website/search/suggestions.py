@@ -0,0 +1,176 @@
+from bisect import bisect_left
+from collections import defaultdict
+from heapq import nsmallest
+from threading import Lock
+from time import monotonic
+from typing import List, Sequence
+from weakref import WeakKeyDictionary
+
+from Levenshtein import distance
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+
+from database import db
+from models import Pathway, Cancer, Disease
+
+
+class TextIndex:
+    """Index of texts for case-insensitive substring search.
+
+    Trigrams of the texts are indexed, so that only the texts containing
+    the least common trigram of a phrase need to be checked; shorter
+    phrases are looked up in all the texts.
+    """
+
+    def __init__(self, texts: Sequence[str]):
+        self.texts = [(text or '').lower() for text in texts]
+        trigrams = defaultdict(list)
+        for i, text in enumerate(self.texts):
+            for trigram in {text[start:start + 3] for start in range(len(text) - 2)}:
+                trigrams[trigram].append(i)
+        self.trigrams = {trigram: tuple(positions) for trigram, positions in trigrams.items()}
+
+    def search(self, phrase: str) -> List[int]:
+        """Positions of the texts containing the phrase."""
+        phrase = phrase.lower()
+        if len(phrase) < 3:
+            candidates = range(len(self.texts))
+        else:
+            candidates = min(
+                (self.trigrams.get(phrase[start:start + 3], ()) for start in range(len(phrase) - 2)),
+                key=len
+            )
+        return [i for i in candidates if phrase in self.texts[i]]
+
+
+class PrefixIndex:
+    """Index of keys for case-insensitive prefix search."""
+
+    def __init__(self, keys: Sequence):
+        self.keys = sorted(
+            (str(key).lower(), i)
+            for i, key in enumerate(keys)
+            if key is not None
+        )
+
+    def search(self, prefix: str) -> List[int]:
+        """Positions of the keys starting with the prefix, shortest keys first."""
+        prefix = prefix.lower()
+        matching = []
+        for key, i in self.keys[bisect_left(self.keys, (prefix, -1)):]:
+            if not key.startswith(prefix):
+                break
+            matching.append((len(key), key, i))
+        return [i for length, key, i in sorted(matching)]
+
+
+class SuggestionIndex:
+    """Rows of a small, rarely changing model kept in memory, indexed for the search suggestions.
+
+    Replaces queries like `column.ilike('%' + phrase + '%')` (which cannot
+    use database indexes) followed by sorting by edit distance.
+
+    The index is built on the first use for each database engine, and
+    rebuilt after the rows of the model change: immediately if the changes
+    were flushed in this process, otherwise (e.g. after an import run in
+    another process) once `refresh_interval` seconds have passed.
+
+    Args:
+        model: the model to index
+        columns: names of the columns to keep (available as attributes of the returned rows)
+        text: name of the column to index for substring search
+        prefixes: names of the columns to index for prefix search
+    """
+
+    refresh_interval = 60
+
+    def __init__(self, model, columns: Sequence[str], text: str, prefixes: Sequence[str] = ()):
+        self.model = model
+        self.columns = columns
+        self.text = text
+        self.prefixes = prefixes
+        # engine -> built index
+        self.built = WeakKeyDictionary()
+        self.lock = Lock()
+        event.listen(Session, 'after_flush', self.after_flush)
+
+    def after_flush(self, session, flush_context):
+        changed = session.new | session.dirty | session.deleted
+        if any(isinstance(instance, self.model) for instance in changed):
+            self.built.pop(session.get_bind(mapper=inspect(self.model)), None)
+
+    def signature(self):
+        model = self.model
+        return tuple(db.session.query(func.count(model.id), func.max(model.id)).one())
+
+    def get(self) -> 'BuiltSuggestionIndex':
+        engine = db.session.get_bind(mapper=inspect(self.model))
+        index = self.built.get(engine)
+
+        if index and monotonic() - index.checked > self.refresh_interval:
+            if self.signature() != index.signature:
+                index = None
+            else:
+                index.checked = monotonic()
+
+        if not index:
+            with self.lock:
+                index = BuiltSuggestionIndex(self)
+                self.built[engine] = index
+
+        return index
+
+    def search(self, phrase: str, count: int, or_prefix_of: str = None) -> List:
+        """Rows with the text containing the phrase, ranked by edit distance to the phrase.
+
+        Args:
+            or_prefix_of: name of a column; rows with value of this column
+                starting with the phrase are included too
+        """
+        index = self.get()
+        positions = index.text.search(phrase)
+        if or_prefix_of:
+            positions = set(positions)
+            positions.update(index.prefixes[or_prefix_of].search(phrase))
+
+        phrase = phrase.lower()
+        texts = index.text.texts
+        phrase_length = len(phrase)
+
+        # negated Levenshtein ratio (as in levenshtein_ratio SQL function), then position
+        ranked = nsmallest(count, [
+            (distance(texts[i], phrase) / (max(len(texts[i]), phrase_length) or 1) - 1, i)
+            for i in positions
+        ])
+        return [index.rows[i] for score, i in ranked]
+
+    def search_prefix(self, column: str, prefix: str, count: int) -> List:
+        """Rows with given column starting with the prefix, shortest (closest) first."""
+        index = self.get()
+        return [index.rows[i] for i in index.prefixes[column].search(prefix)[:count]]
+
+
+class BuiltSuggestionIndex:
+
+    def __init__(self, index: SuggestionIndex):
+        model = index.model
+        self.signature = index.signature()
+        self.checked = monotonic()
+        self.rows = (
+            db.session.query(*[getattr(model, column) for column in index.columns])
+            .order_by(model.id)
+            .all()
+        )
+        self.text = TextIndex([getattr(row, index.text) for row in self.rows])
+        self.prefixes = {
+            column: PrefixIndex([getattr(row, column) for row in self.rows])
+            for column in index.prefixes
+        }
+
+
+pathways_index = SuggestionIndex(
+    Pathway, ['id', 'description', 'gene_ontology', 'reactome'],
+    text='description', prefixes=['gene_ontology', 'reactome']
+)
+cancers_index = SuggestionIndex(Cancer, ['id', 'code', 'name'], text='name', prefixes=['code'])
+diseases_index = SuggestionIndex(Disease, ['id', 'name'], text='name')
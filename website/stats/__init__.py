@@ -1,27 +1,40 @@
 from collections import defaultdict, Counter
+from functools import partial
 
 from flask import current_app
 
 from .plots import Plots, Datasets
 from .stats import Statistics
+from .store import LazyMapping
 from .venn import VennDiagrams
 
 
 def hypermutated_samples(path, sample_column: int, threshold=900):
     from helpers.parsers import iterate_tsv_gz_file
 
-    samples_cnt = Counter()
-    muts = defaultdict(set)
+    samples_mutations = defaultdict(set)
     total = 0
 
     for line in iterate_tsv_gz_file(path):
         total += 1
-        muts[','.join([line[0], '%x' % int(line[1]), '%x' % int(line[2]), line[3], line[4]])].add(line[sample_column])
+        samples_mutations[line[sample_column]].add((line[0], int(line[1]), int(line[2]), line[3], line[4]))
 
-    for samples in muts.values():
-        for sample in samples:
-            samples_cnt[sample] += 1
+    return select_hypermutated(
+        Counter({sample: len(mutations) for sample, mutations in samples_mutations.items()}),
+        total, threshold=threshold
+    )
 
+
+def select_hypermutated(samples_cnt: Counter, total: int, threshold=900):
+    """Select samples with more than `threshold` (distinct) mutations.
+
+    Args:
+        samples_cnt: number of distinct mutations in each of the samples
+        total: number of all analysed mutations (lines), for the report
+
+    Returns:
+        A dictionary of hypermutated samples: mutations count mappings.
+    """
     hypermutated = {}
     for sample, count in samples_cnt.most_common():
         if count > threshold:
@@ -29,7 +42,7 @@ def hypermutated_samples(path, sample_column: int, threshold=900):
         else:
             break
 
-    percent = sum(hypermutated.values()) / total * 100
+    percent = sum(hypermutated.values()) / total * 100 if total else 0
     print(f'There are {len(hypermutated)} hypermutated samples.')
     print(f'Hypermutated samples represent {percent} percent of analysed mutations.')
 
@@ -39,12 +52,28 @@ def hypermutated_samples(path, sample_column: int, threshold=900):
 store_classes = [Statistics, VennDiagrams, Plots, Datasets]
 
 
-if current_app.config['LOAD_STATS']:
-    print('Loading statistics')
-    STORES = {
-        counter.__name__: counter().get_all()
-        for counter in store_classes
-    }
-else:
-    print('Skipping loading statistics')
-    STORES = defaultdict(dict)
+def load_store(store_class):
+    if not current_app.config['LOAD_STATS']:
+        return {}
+    print(f'Loading statistics: {store_class.__name__}')
+    return store_class().get_all()
+
+
+# the stored values of each of the stores are loaded on the first access
+# (and loaded again after new values are calculated)
+STORES = {
+    store_class.__name__: LazyMapping(partial(load_store, store_class), version=store_class.version)
+    for store_class in store_classes
+}
+
+
+def get_stored_value(store_name, name):
+    """Get stored value of a single counter, without loading the whole store.
+
+    Raises:
+        KeyError: if there is no such value (or loading statistics is disabled)
+    """
+    if not current_app.config['LOAD_STATS']:
+        raise KeyError(name)
+    store_class = {store_class.__name__: store_class for store_class in store_classes}[store_name]
+    return store_class.get(name)
@@ -12,7 +12,7 @@ def most_mutated_sites(
     sources, site_type: SiteType = AnySiteType, intersection=False,
     stacked=False, limit=20, filters=None
 ):
-    from analyses.enrichment import most_mutated_sites
+    from analyses.enrichment import most_mutated_sites, most_mutated_sites_by_track
 
     most_mutated = partial(most_mutated_sites, site_type=site_type, limit=limit, mutation_filter=filters)
 
@@ -43,13 +43,15 @@ def most_mutated_sites(
     site_track_count = defaultdict(dict)
     track_names = []
 
-    for sources, intersection, exclusive in tracks:
+    # all tracks at once
+    tracks_sites = most_mutated_sites_by_track(tracks, site_type=site_type, limit=limit, mutation_filter=filters)
+
+    for (sources, intersection, exclusive), sites in zip(tracks, tracks_sites):
 
-        query = most_mutated(sources, intersection=intersection, exclusive=exclusive)
         track_name = ' and '.join([source.name for source in sources])
         track_names.append(track_name)
 
-        for site, count in query:
+        for site, count in sites:
             site_track_count[site][track_name] = count
 
     # take top X sites:
@@ -2,12 +2,10 @@ from collections import defaultdict
 from typing import List
 from warnings import warn
 
-from tqdm import tqdm
-
 from analyses.motifs import MotifsCounter, NoKnownMotifs
+from analyses.ptm_impact import gather_ptm_impacts, impact_types
 from helpers.plots import pie_chart
 from models import MutationSource, SiteType, Site, Protein, Mutation, Gene, InheritedMutation, MC3Mutation
-from database import db
 
 from ..store import cases
 from .common import site_types
@@ -39,83 +37,55 @@ def gather_ptm_muts_impacts(
         warn(f'This site type has no motifs defined: {error}')
         motifs_counter = None
 
-    sites = (
-        Site.query.filter(SiteType.fuzzy_filter(site_type, join=True))
-        .join(Protein).filter(Protein.is_preferred_isoform)
-    )
-
-    def fuzzy_site_filter(sites):
-        return [
-            site for site in sites
-            # matches 'O-glycosylation' for site_type 'glycosylation'
-            if any(site_type.name in type_name for type_name in site.types_names)
-        ]
-
     mutations_by_impact_by_gene = {
         # order matters
-        'direct': defaultdict(int),
-        'motif-changing': defaultdict(int),
-        'proximal': defaultdict(int),
-        'distal': defaultdict(int)
+        impact: defaultdict(int)
+        for impact in impact_types
     }
 
-    mutations = (
-        Mutation.query
-        .filter(Mutation.in_sources(source))
-        .join(Protein)
-        .join(Gene, Gene.preferred_isoform_id == Protein.id)
-    )
-    if muts_filter is not None:
-        mutations = mutations.filter(muts_filter)
-
     all_breaking_muts = set()
 
     if motifs_counter:
-        motifs_data = motifs_counter.gather_muts_and_sites(mutations, sites, occurrences_in=[source])
-
-        for motif_name, breaking_muts in motifs_data.muts_breaking_sites_motif.items():
-            all_breaking_muts.update(breaking_muts)
-
-    mutations = mutations.filter(Mutation.affected_sites.any(SiteType.fuzzy_filter(site_type, join=True)))
-    if limit_to_genes is not None:
-        proteins_ids = (
-            db.session.query(Protein.id)
-            .select_from(Gene)
-            .join(Gene.preferred_isoform)
-            .filter(Gene.name.in_(limit_to_genes))
-            .all()
+        sites = (
+            Site.query.filter(SiteType.fuzzy_filter(site_type, join=True))
+            .join(Protein).filter(Protein.is_preferred_isoform)
         )
-        mutations = mutations.filter(
-            Protein.id.in_(proteins_ids)
+        mutations = (
+            Mutation.query
+            .filter(Mutation.in_sources(source))
+            .join(Protein)
+            .join(Gene, Gene.preferred_isoform_id == Protein.id)
         )
+        if muts_filter is not None:
+            mutations = mutations.filter(muts_filter)
+
+        motifs_data = motifs_counter.gather_muts_and_sites(mutations, sites)
+
+        for motif_name, breaking_muts in motifs_data.muts_breaking_sites_motif.items():
+            all_breaking_muts.update(mutation.id for mutation in breaking_muts)
 
-    mutations = mutations.with_entities(Gene.name, Mutation)
+    impacts = gather_ptm_impacts(
+        source, site_type, muts_filter=muts_filter, limit_to_genes=limit_to_genes,
+        occurrences=occurrences, motif_changing=all_breaking_muts
+    )
 
     if limit_to_muts is not False:
         muts = {
-            Mutation.query.filter_by(
-                position=mut.position,
-                alt=mut.mut_residue,
-                protein=Protein.query.filter_by(refseq=mut.isoform).one()
-            ).one(): int(mut.count)
+            (mut.isoform, int(mut.position), mut.mut_residue): int(mut.count)
             for mut in limit_to_muts.itertuples(index=False)
         }
 
-    for gene_name, mutation in tqdm(mutations, total=mutations.count()):
+    for mutation in impacts:
 
         if limit_to_muts is not False:
-            if mutation not in muts:
+            key = (mutation.refseq, mutation.position, mutation.alt)
+            if key not in muts:
                 continue
-            value = muts[mutation]
+            value = muts[key]
         else:
-            value = mutation.sources_map[source.name].get_value() if occurrences else 1
-
-        impact = mutation.impact_on_ptm(fuzzy_site_filter)
-        if impact != 'direct' and mutation in all_breaking_muts:
-            mutations_by_impact_by_gene['motif-changing'][gene_name] += value
-            continue
-        assert impact != 'none'
-        mutations_by_impact_by_gene[impact][gene_name] += value
+            value = mutation.value
+
+        mutations_by_impact_by_gene[mutation.impact][mutation.gene] += value
 
     return mutations_by_impact_by_gene
 
@@ -1,5 +1,5 @@
 from .objects import Counter, CasesDecorator
-from .store import CountStore
+from .store import CountStore, LazyMapping, StoredValues
 
 counter = Counter
 cases = CasesDecorator
@@ -1,20 +1,66 @@
 import re
+from collections import defaultdict
+from collections.abc import Mapping
+from contextlib import nullcontext
+from datetime import datetime
 from functools import partial
+from multiprocessing import Pool
+from time import perf_counter
+from traceback import format_exc
+from typing import Any, Callable, Optional, Tuple
 from warnings import warn
+from weakref import WeakKeyDictionary
 
+from sqlalchemy import inspect, type_coerce
+from sqlalchemy.types import TypeDecorator
 from tqdm import tqdm
 
-from database import get_or_create, db
-from models import Count
+from database import get_or_create, db, dispose_engines
+from models import Count, CountCalculation
 
 from .objects import StoreObject, Counter, CaseGenerator
 
 
+class CountersFailed(Exception):
+    """Calculation of some of the counters failed; their names are given as the argument."""
+    pass
+
+
+def calculate_counter(store: 'CountStore', name: str) -> Tuple[str, Any, float, Optional[str]]:
+    """Calculate value of a single counter, returning: name, value, duration and error (if any)."""
+    start = perf_counter()
+    try:
+        value = store.counters[name](store)
+        error = None
+    except Exception:
+        value = None
+        error = format_exc()
+        db.session.rollback()
+    return name, value, perf_counter() - start, error
+
+
+# store class -> store instance, in the worker processes
+_worker_stores = {}
+
+
+def _calculate_in_worker(task):
+    store_class, name = task
+    if store_class not in _worker_stores:
+        _worker_stores[store_class] = store_class()
+    return calculate_counter(_worker_stores[store_class], name)
+
+
 class CountStore:
 
     storage_model = Count
     default = 0
 
+    # version of the values stored in each storage model, increased whenever
+    # new values are calculated (so that the cached values are not used)
+    versions = defaultdict(int)
+    # database engine -> store class -> (version, values)
+    cached_values = WeakKeyDictionary()
+
     def register(self, stored_object, name=None):
         if not name:
             name = stored_object.name
@@ -59,13 +105,20 @@ class CountStore:
             if isinstance(value, CaseGenerator)
         }
 
-    def calc_all(self, limit_to=None):
+    def calc_all(self, limit_to=None, processes=None, resume=False):
         """Calculate all counts and save calculated values into database.
 
-        Already existing values will be updated.
+        Already existing values will be updated. Each value is committed as soon
+        as it is calculated; the status and the duration of the calculation of
+        each counter are recorded (as CountCalculation), so that a failed or
+        interrupted run can be resumed. A failure of a counter does not stop
+        the calculation of the others; CountersFailed is raised at the end.
 
         Args:
             limit_to: regular expression for limiting which counters should be executed
+            processes: number of worker processes to calculate the counters in;
+                by default the counters are calculated in this process
+            resume: skip the counters completed by the previous run
         """
 
         counters = {
@@ -74,30 +127,208 @@ class CountStore:
             if not limit_to or re.match(limit_to, name)
         }
 
-        for name, counter in tqdm(counters.items(), total=len(counters)):
+        store_name = type(self).__name__
+        calculations = {
+            calculation.name: calculation
+            for calculation in CountCalculation.query.filter_by(store=store_name)
+        }
+
+        if resume:
+            completed = {
+                name
+                for name, calculation in calculations.items()
+                if calculation.status == 'completed'
+            }
+            print(f'Resuming: skipping {len(completed & counters.keys())} completed counters')
+            counters = {name: counter for name, counter in counters.items() if name not in completed}
+
+        for name in counters:
+            if name not in calculations:
+                calculations[name] = CountCalculation(store=store_name, name=name)
+                db.session.add(calculations[name])
+            calculations[name].status = 'pending'
+        db.session.commit()
+
+        if processes:
+            # workers will open their own connections
+            dispose_engines()
+            pool = Pool(processes)
+            results = pool.imap_unordered(_calculate_in_worker, [(type(self), name) for name in counters])
+        else:
+            pool = nullcontext()
+            results = (calculate_counter(self, name) for name in counters)
 
-            count, new = get_or_create(self.storage_model, name=name)
+        failed = []
 
-            value = counter(self)
-            count.value = value
+        with pool:
+            for name, value, duration, error in tqdm(results, total=len(counters)):
+                calculation = calculations[name]
+                calculation.duration = duration
+                calculation.finished_on = datetime.utcnow()
+                calculation.error = error
 
-            print(name, value)
+                if error:
+                    calculation.status = 'failed'
+                    failed.append(name)
+                    print(f'{name} failed after {duration:.2f}s:\n{error}')
+                else:
+                    calculation.status = 'completed'
+                    count, new = get_or_create(self.storage_model, name=name)
+                    count.value = value
 
-            if new:
-                db.session.add(count)
+                    print(name, value, f'({duration:.2f}s)')
 
-    def get_all(self):
+                    if new:
+                        db.session.add(count)
 
+                db.session.commit()
+
+        CountStore.versions[self.storage_model] += 1
+
+        slowest = sorted(
+            (calculation for name, calculation in calculations.items() if name in counters),
+            key=lambda calculation: calculation.duration or 0,
+            reverse=True
+        )
+        print('The slowest counters:')
+        for calculation in slowest[:10]:
+            print(f'{calculation.name}: {calculation.duration or 0:.2f}s ({calculation.status})')
+
+        if failed:
+            raise CountersFailed(failed)
+
+    def get_all(self) -> 'StoredValues':
+        """Get stored values of all the counters, fetched with a single query.
+
+        The values are deserialized on the first access to each of them;
+        they are cached until new values are calculated (in this process).
+        """
         model = self.storage_model
+        cache = self.cache()
+        version = self.version()
 
-        counts = {
-            counter_name: db.session.query(model.value).filter(model.name == counter_name).scalar()
-            for counter_name in self.counters.keys()
-        }
+        cached_version, values = cache.get(type(self), (None, None))
+        if cached_version == version:
+            return values
 
-        counts = {
-            name: value if value is not None else self.default
-            for name, value in counts.items()
-        }
+        raw_values = dict.fromkeys(self.counters.keys())
+
+        for name, value in db.session.query(model.name, self.raw_value()):
+            if name in raw_values:
+                raw_values[name] = value
+
+        values = StoredValues(raw_values, self.default, self.deserializer())
+        cache[type(self)] = (version, values)
+        return values
+
+    @classmethod
+    def get(cls, name):
+        """Get stored value of a single counter, without fetching the other ones.
+
+        Raises:
+            KeyError: if there is no stored value for the counter
+        """
+        model = cls.storage_model
+        cache = cls.cache()
+        version = cls.version()
+
+        cached_version, values = cache.get(cls, (None, None))
+        if cached_version == version:
+            return values[name]
+
+        cached_version, looked_up = cache.get((cls, 'lookups'), (None, None))
+        if cached_version != version:
+            looked_up = StoredValues({}, cls.default, cls.deserializer())
+            cache[(cls, 'lookups')] = (version, looked_up)
+
+        if name not in looked_up.raw_values:
+            row = db.session.query(cls.raw_value()).filter(model.name == name).first()
+            if not row:
+                raise KeyError(name)
+            looked_up.raw_values[name] = row[0]
+
+        return looked_up[name]
+
+    @classmethod
+    def version(cls):
+        return CountStore.versions[cls.storage_model]
+
+    @classmethod
+    def cache(cls) -> dict:
+        bind = db.session.get_bind(mapper=inspect(cls.storage_model))
+        return CountStore.cached_values.setdefault(bind, {})
+
+    @classmethod
+    def raw_value(cls):
+        """The value column, to be fetched without deserialization."""
+        column = cls.storage_model.value
+        if isinstance(column.type, TypeDecorator):
+            return type_coerce(column, column.type.impl)
+        return column
+
+    @classmethod
+    def deserializer(cls) -> Callable:
+        column_type = cls.storage_model.value.type
+        if isinstance(column_type, TypeDecorator):
+            bind = db.session.get_bind(mapper=inspect(cls.storage_model))
+            processor = column_type.result_processor(bind.dialect, None)
+            if processor:
+                return processor
+        return lambda value: value
+
+
+class StoredValues(Mapping):
+    """Stored values of counters, each deserialized on the first access."""
+
+    def __init__(self, raw_values: dict, default, deserialize: Callable):
+        self.raw_values = raw_values
+        self.default = default
+        self.deserialize = deserialize
+        self.values = {}
+
+    def __getitem__(self, name):
+        if name not in self.values:
+            raw_value = self.raw_values[name]
+            self.values[name] = self.default if raw_value is None else self.deserialize(raw_value)
+        return self.values[name]
+
+    def __iter__(self):
+        return iter(self.raw_values)
+
+    def __len__(self):
+        return len(self.raw_values)
+
+
+class LazyMapping(Mapping):
+    """Read-only mapping with items provided by `load` function on the first access.
+
+    Use `refresh()` to have the items loaded again on the next access;
+    if `version` function is given, the items are also loaded again
+    whenever the version changes.
+    """
+
+    def __init__(self, load: Callable[[], Mapping], version: Callable = None):
+        self.load = load
+        self.version = version
+        self.items_cache = None
+        self.loaded_version = None
+
+    @property
+    def loaded(self):
+        version = self.version() if self.version else None
+        if self.items_cache is None or version != self.loaded_version:
+            self.items_cache = self.load()
+            self.loaded_version = version
+        return self.items_cache
+
+    def refresh(self):
+        self.items_cache = None
+
+    def __getitem__(self, key):
+        return self.loaded[key]
+
+    def __iter__(self):
+        return iter(self.loaded)
 
-        return counts
+    def __len__(self):
+        return len(self.loaded)
@@ -1,10 +1,15 @@
 from functools import partial
 from itertools import combinations
+from typing import Callable, Hashable, Iterable, Mapping
 
+import numpy as np
+from sqlalchemy import case, func, literal
+from sqlalchemy.sql import ClauseElement
+
+from database import db
 from models import VennDiagram, Site, Protein, SiteType, SiteSource, Mutation, confirmed_mutation_sources
 
 from .store import CountStore, counter
-from .table import count_mutated_sites
 
 
 def all_combinations(items, min_length=1):
@@ -42,6 +47,105 @@ def venn_diagram(cases=None, model=None, name=None):
     return decorator
 
 
+class MembershipScan:
+    """Membership of all entities of a model in many sets, gathered with a single query.
+
+    Each of the conditions is assigned a bit of a membership mask; the database
+    returns the number of entities for each of the distinct masks, from which
+    the size of any intersection of the sets is derived with NumPy.
+
+    Args:
+        model: the entities to scan
+        conditions: a function returning a mapping: key -> SQL condition
+            (called on the first use, so that the sets reflect current data)
+    """
+
+    def __init__(self, model, conditions: Callable[[], Mapping[Hashable, ClauseElement]]):
+        self.model = model
+        self.conditions = conditions
+        self.bits = None
+        self.masks = None
+        self.counts = None
+
+    def scan(self):
+        conditions = self.conditions()
+        assert len(conditions) < 63
+
+        self.bits = {key: 1 << i for i, key in enumerate(conditions)}
+
+        mask = sum(
+            (
+                case([(condition, self.bits[key])], else_=0)
+                for key, condition in conditions.items()
+            ),
+            literal(0)
+        )
+        masks = db.session.query(mask.label('mask')).select_from(self.model).subquery()
+        histogram = db.session.query(masks.c.mask, func.count()).group_by(masks.c.mask).all()
+
+        self.masks = np.array([mask for mask, count in histogram], dtype=np.int64)
+        self.counts = np.array([count for mask, count in histogram], dtype=np.int64)
+
+    def size(self, keys: Iterable[Hashable]) -> int:
+        """Count entities meeting all the conditions of given keys"""
+        if self.masks is None:
+            self.scan()
+
+        required = 0
+        for key in keys:
+            required |= self.bits[key]
+
+        return int(self.counts[(self.masks & required) == required].sum())
+
+
+def is_mutated_in(source) -> ClauseElement:
+    """Whether a site has a mutation from given source within +/- 7 residues"""
+    return (
+        db.session.query(Mutation.id)
+        .filter(Mutation.protein_id == Site.protein_id)
+        .filter(Mutation.position.between(Site.position - 7, Site.position + 7))
+        .filter(Mutation.in_sources(source))
+        .exists()
+    )
+
+
+def sites_scan() -> MembershipScan:
+    return MembershipScan(
+        Site,
+        lambda: {
+            'primary': Site.protein.has(Protein.is_preferred_isoform),
+            **{
+                ('type', site_type.id): Site.types.any(SiteType.id == site_type.id)
+                for site_type in SiteType.query
+            },
+            **{
+                ('source', source.id): Site.sources.any(SiteSource.id == source.id)
+                for source in SiteSource.query
+            },
+            **{
+                ('mutated', name): is_mutated_in(source)
+                for name, source in confirmed_mutation_sources().items()
+            }
+        }
+    )
+
+
+def mutations_scan() -> MembershipScan:
+    return MembershipScan(
+        Mutation,
+        lambda: {
+            **{
+                ('type', site_type.id): Mutation.affected_sites.any(Site.types.any(SiteType.id == site_type.id))
+                for site_type in SiteType.query
+            },
+            **{
+                ('source', source.name): Mutation.in_sources(source)
+                for source in confirmed_mutation_sources().values()
+            }
+        }
+    )
+
+
 def sites_by_type(combination, only_primary=True):
     query = Site.query
 
@@ -90,47 +194,57 @@ def sites_by_source(combination, site_type=None, only_primary=False):
 
 
 class VennDiagrams(CountStore):
+    """Venn diagrams of sites and mutations.
+
+    Diagrams of sites (and of mutations) are derived from a single,
+    shared MembershipScan, rather than queried combination by combination.
+    """
 
     storage_model = VennDiagram
 
     def __init__(self):
 
+        sites = sites_scan()
+        mutations = mutations_scan()
+
+        def count_sites(combination, kind='source', keys=()):
+            return sites.size([*keys, *[(kind, case.id) for case in combination]])
+
+        def count_mutations(combination, keys=()):
+            return mutations.size([*keys, *[('source', source.name) for source in combination]])
+
         # generate venn diagrams of mutated sites percentage
-        for name, mutations_source in confirmed_mutation_sources().items():
+        for name in confirmed_mutation_sources():
 
-            count_mutated = partial(count_mutated_sites, model=mutations_source)
-            sites_mutated = venn_diagram(model=SiteType, name=f'sites_mutated_{name}')(count_mutated)
+            sites_mutated = venn_diagram(
+                model=SiteType,
+                name=f'sites_mutated_{name}'
+            )(partial(count_sites, kind='type', keys=[('mutated', name)]))
 
             self.register(sites_mutated)
 
         for site_type in SiteType.query:
 
-            count_mutations_affecting_ptms = partial(
-                mutation_by_source, site_type=site_type
-            )
             ptm_mutations_by_mutation_source = venn_diagram(
                 cases=confirmed_mutation_sources().values(),
                 name=f'{site_type.name}_mutations_by_source'
-            )(count_mutations_affecting_ptms)
+            )(partial(count_mutations, keys=[('type', site_type.id)]))
 
             self.register(ptm_mutations_by_mutation_source)
 
-            count_sites = partial(
-                sites_by_source,
-                site_type=site_type
-            )
             ptm_sites_by_source = venn_diagram(
                 model=SiteSource,
                 name=f'{site_type.name}_sites_by_source'
-            )(count_sites)
-            self.register(ptm_sites_by_source)
+            )(partial(count_sites, keys=[('type', site_type.id)]))
 
-    venn_sites_by_type = venn_diagram(model=SiteType)(sites_by_type)
-
-    @venn_diagram(model=SiteSource)
-    def sites_by_source(combination, only_primary=False):
-        return sites_by_source(combination, only_primary=only_primary)
+            self.register(ptm_sites_by_source)
 
-    @venn_diagram(cases=confirmed_mutation_sources().values())
-    def mutation_by_source(combination):
-        return mutation_by_source(combination)
+        self.register(
+            venn_diagram(model=SiteType, name='sites_by_type')(partial(count_sites, kind='type', keys=['primary']))
+        )
+        self.register(
+            venn_diagram(model=SiteSource, name='sites_by_source')(count_sites)
+        )
+        self.register(
+            venn_diagram(cases=confirmed_mutation_sources().values(), name='mutation_by_source')(count_mutations)
+        )
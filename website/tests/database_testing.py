@@ -25,6 +25,11 @@ def test_hash_set_path(prefix):
     return directory.name
 
 
+# keep the caches of tests apart from the caches of the deployed instance
+test_cache_root = TemporaryDirectory(prefix='caches_')
+temporary_directories.append(test_cache_root)
+
+
 class DatabaseTest(TestCase):
 
     TESTING = True
@@ -43,6 +48,7 @@ class DatabaseTest(TestCase):
     USE_LEVENSTHEIN_MYSQL_UDF = False
     CONTACT_LIST = ['dummy.maintainer@domain.org']
     SCHEDULER_ENABLED = True
+    CACHE_ROOT = test_cache_root.name
 
     SECRET_KEY = 'test_key'
     PREFERRED_URL_SCHEME = 'http'
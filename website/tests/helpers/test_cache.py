@@ -1,5 +1,8 @@
+from pathlib import Path
+
 from helpers.cache import cache_decorator
 from helpers.cache import Cache
+from helpers.cache import set_cache_root
 
 
 def test_cache(tmpdir):
@@ -70,3 +73,35 @@ def test_cache(tmpdir):
     assert calc() == 25
     assert calc(a=1) == 5
     assert calc(a=2) == 1
+
+
+def test_set_cache_root(tmpdir):
+    previous_root = Cache.root
+    previous_caches = len(Cache.caches)
+    first_root, second_root = Path(tmpdir) / 'first', Path(tmpdir) / 'second'
+
+    try:
+        set_cache_root(first_root)
+        relative = Cache('relative')
+        absolute = Cache(Path(tmpdir) / 'absolute')
+        assert Path(relative.directory) == first_root / 'relative'
+        relative['key'] = 'value'
+
+        set_cache_root(second_root)
+
+        # the caches with relative paths are re-opened in the new root
+        assert Path(relative.directory) == second_root / 'relative'
+        assert 'key' not in relative
+
+        # the caches with absolute paths stay where these were
+        assert Path(absolute.directory) == Path(tmpdir) / 'absolute'
+
+        # the caches created later go to the new root too
+        assert Path(Cache('later').directory) == second_root / 'later'
+
+        set_cache_root(first_root)
+        assert relative['key'] == 'value'
+    finally:
+        # do not re-open the caches of this test in the application directory
+        del Cache.caches[previous_caches:]
+        set_cache_root(previous_root)
@@ -68,3 +68,63 @@ def test_tsv_file_iterator(tmpdir):
     assert ['4'] == test(skip=3)
     assert ['3', '4'] == test(skip=2, limit=2)
     assert ['3'] == test(skip=2, limit=1)
+
+
+def test_line_index(tmpdir):
+    temp_file = tmpdir.join('lines.tsv')
+    temp_file.write(''.join(f'{i}\tvalue ąę {i}\n' for i in range(25)))
+    file_name = str(temp_file)
+
+    index = parsers.LineIndex.build(file_name, step=4)
+    assert index.lines_count == 25
+    assert len(index.offsets) == 7
+
+    with open(file_name) as f:
+        for line_number in [0, 3, 4, 5, 17, 24]:
+            index.seek(f, line_number)
+            assert f.readline().split('\t')[0] == str(line_number)
+
+    assert parsers.count_lines_tsv(file_name) == 25
+
+    lines = list(parsers.tsv_file_iterator(file_name, skip=21, limit=3))
+    assert [line[0] for line in lines] == ['21', '22', '23']
+
+
+def test_iterate_tsv_gz_file(tmpdir):
+    import gzip
+
+    file_name = str(tmpdir.join('lines.tsv.gz'))
+    with gzip.open(file_name, 'wt') as f:
+        f.write('a\tb\n1\t2\n3\t4\n')
+
+    assert list(parsers.iterate_tsv_gz_file(file_name, file_header=['a', 'b'])) == [['1', '2'], ['3', '4']]
+
+    with pytest.raises(parsers.ParsingError):
+        list(parsers.iterate_tsv_gz_file(file_name, file_header=['a', 'c']))
+
+
+def test_fast_gzip_read_failure(tmpdir):
+    with pytest.raises(parsers.ParsingError):
+        with parsers.fast_gzip_read(str(tmpdir.join('missing.gz'))) as f:
+            f.read()
+
+
+def test_persisted_line_index(tmpdir):
+    import os
+
+    temp_file = tmpdir.join('lines.tsv')
+    temp_file.write(''.join(f'{i}\n' for i in range(10)))
+    file_name = str(temp_file)
+    stat = os.stat(file_name)
+
+    index = parsers.line_index(file_name, step=3, persist=True)
+    sidecar = file_name + parsers.LineIndex.suffix
+    assert os.path.exists(sidecar)
+
+    loaded = parsers.LineIndex.load(sidecar, stat.st_mtime_ns, stat.st_size, 3)
+    assert loaded.offsets == index.offsets
+    assert loaded.lines_count == 10
+
+    # stale (or differently spaced) index is not used
+    assert parsers.LineIndex.load(sidecar, stat.st_mtime_ns, stat.st_size + 1, 3) is None
+    assert parsers.LineIndex.load(sidecar, stat.st_mtime_ns, stat.st_size, 4) is None
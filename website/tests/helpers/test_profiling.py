@@ -0,0 +1,45 @@
+import sys
+from io import StringIO
+
+from sqlalchemy import create_engine
+
+from helpers.profiling import StartupProfiler
+
+
+def test_startup_profiler(tmpdir, monkeypatch):
+
+    tmpdir.join('profiled_module.py').write(
+        'from profiled_engine import engine\n'
+        'import profiled_submodule\n'
+        'engine.execute("SELECT 1")\n'
+    )
+    tmpdir.join('profiled_submodule.py').write('x = 1\n')
+    monkeypatch.syspath_prepend(str(tmpdir))
+
+    support = type(sys)('profiled_engine')
+    support.engine = create_engine('sqlite://')
+    monkeypatch.setitem(sys.modules, 'profiled_engine', support)
+
+    profiler = StartupProfiler()
+    profiler.start()
+    try:
+        import profiled_module  # noqa: F401
+        support.engine.execute('SELECT 2')
+    finally:
+        profiler.stop()
+        sys.modules.pop('profiled_module', None)
+        sys.modules.pop('profiled_submodule', None)
+
+    assert profiler not in sys.meta_path
+
+    module = profiler.modules['profiled_module']
+    submodule = profiler.modules['profiled_submodule']
+    assert module.queries == 1
+    assert submodule.queries == 0
+    assert profiler.modules[StartupProfiler.outside].queries == 1
+    # the time of sub-modules is not included in the own time
+    assert module.total >= module.own + submodule.own
+
+    report = StringIO()
+    profiler.report(file=report)
+    assert 'profiled_module' in report.getvalue()
@@ -1,5 +1,6 @@
 import gzip
 from abc import ABCMeta
+from contextlib import contextmanager
 from tempfile import NamedTemporaryFile
 from textwrap import dedent
 import pytest
@@ -40,6 +41,24 @@ def make_named_gz_file(data=None, **kwargs):
     )
 
 
+@contextmanager
+def count_queries():
+    """Collect statements of the queries executed in the context, yielding a list of them."""
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, 'before_cursor_execute', before_cursor_execute)
+
+
 use_fixture = pytest.fixture(autouse=True)
 
 
@@ -0,0 +1,151 @@
+from random import choice, randint, seed
+from time import perf_counter
+
+import pytest
+from Levenshtein import distance
+
+from database import db, levenshtein_sorted, get_engine
+from database_testing import DatabaseTest
+from models import Pathway, Cancer, Disease
+from miscellaneous import count_queries
+from search.suggestions import TextIndex, PrefixIndex, pathways_index, cancers_index, diseases_index
+
+
+def test_text_index():
+    index = TextIndex(['Cell cycle', 'cell death', None, 'Apoptosis'])
+
+    assert index.search('CELL') == [0, 1]
+    assert index.search('ll d') == [1]
+    assert index.search('po') == [3]
+    assert index.search('necrosis') == []
+
+
+def test_prefix_index():
+    index = PrefixIndex([33, 3, 334, None, 4])
+
+    # shortest first
+    assert index.search('3') == [1, 0, 2]
+    assert index.search('33') == [0, 2]
+    assert index.search('5') == []
+
+    codes = PrefixIndex(['BRCA', 'BLCA', 'LUAD'])
+    assert codes.search('b') == [1, 0]
+
+
+class TestSuggestionIndex(DatabaseTest):
+
+    def test_search(self):
+        db.session.add_all([
+            Pathway(description='cell differentiation', gene_ontology=330),
+            Pathway(description='cell cycle', gene_ontology=33),
+            Pathway(description='Apoptotic cell clearance', reactome=1234)
+        ])
+        db.session.add_all([
+            Cancer(code='BRCA', name='Breast invasive carcinoma'),
+            Cancer(code='LUAD', name='Lung adenocarcinoma')
+        ])
+        db.session.commit()
+
+        # the closest (by edit distance) first
+        assert [row.description for row in pathways_index.search('cell cycle', 5)] == [
+            'cell cycle'
+        ]
+        assert [row.description for row in pathways_index.search('cell', 2)] == [
+            'cell cycle', 'cell differentiation'
+        ]
+        assert [row.gene_ontology for row in pathways_index.search_prefix('gene_ontology', '33', 5)] == [33, 330]
+        assert [row.reactome for row in pathways_index.search_prefix('reactome', '12', 5)] == [1234]
+
+        assert [row.code for row in cancers_index.search('lu', 5, or_prefix_of='code')] == ['LUAD']
+        assert [row.code for row in cancers_index.search('carcinoma', 5, or_prefix_of='code')] == ['LUAD', 'BRCA']
+
+        # no queries once built
+        with count_queries() as queries:
+            pathways_index.search('cell', 2)
+        assert not queries
+
+        # changes flushed in this process are visible at once
+        db.session.add(Pathway(description='cell cell'))
+        db.session.commit()
+        assert [row.description for row in pathways_index.search('cell', 1)] == ['cell cell']
+
+        # other changes (e.g. imports) - after the refresh interval
+        assert not diseases_index.search('cystic', 1)
+        db.session.execute(Disease.__table__.insert().values(name='Cystic fibrosis'))
+        assert not diseases_index.search('cystic', 1)
+        diseases_index.refresh_interval = 0
+        try:
+            assert [row.name for row in diseases_index.search('cystic', 1)] == ['Cystic fibrosis']
+        finally:
+            del diseases_index.refresh_interval
+
+    @pytest.mark.serial
+    def test_benchmark(self):
+        """Compare the index with the ILIKE queries which it replaced (run with: -m serial -s)."""
+        seed(0)
+        words = ['cell', 'cycle', 'signaling', 'pathway', 'regulation', 'of', 'negative', 'positive', 'protein', 'kinase']
+
+        db.session.add_all([
+            Pathway(description=' '.join(choice(words) for _ in range(randint(2, 6))), gene_ontology=i)
+            for i in range(5000)
+        ])
+        db.session.add_all([
+            Disease(name=' '.join(choice(words) for _ in range(randint(1, 4))) + f' {i}')
+            for i in range(5000)
+        ])
+        db.session.commit()
+
+        phrases = ['cell', 'cel', 'kinase reg', 'signaling pathway', 'of', 'xyz', 'positive regulation']
+
+        def sql_pathways(phrase):
+            query = Pathway.query.filter(Pathway.description.like('%' + phrase + '%'))
+            return levenshtein_sorted(query, Pathway.description, phrase).limit(3).all()
+
+        def sql_diseases(phrase):
+            query = Disease.query.filter(Disease.name.ilike('%' + phrase + '%'))
+            return levenshtein_sorted(query, Disease.name, phrase).limit(3).all()
+
+        # build the indexes
+        pathways_index.search('', 1)
+        diseases_index.search('', 1)
+
+        def with_levenshtein(search):
+            def ranked_search(phrase):
+                self.app.config['SQL_LEVENSTHEIN'] = True
+                try:
+                    return search(phrase)
+                finally:
+                    self.app.config['SQL_LEVENSTHEIN'] = False
+            return ranked_search
+
+        # the MySQL UDF, approximated with a Python function
+        get_engine('bio').raw_connection().connection.create_function(
+            'levenshtein_ratio', 2,
+            lambda a, b: 1 - distance(a, b) / (max(len(a), len(b)) or 1)
+        )
+
+        timings = {}
+        for name, search in [
+            ('SQL: pathways', sql_pathways),
+            ('SQL: diseases', sql_diseases),
+            ('SQL with Levenshtein ordering: pathways', with_levenshtein(sql_pathways)),
+            ('SQL with Levenshtein ordering: diseases', with_levenshtein(sql_diseases)),
+            ('index: pathways', lambda phrase: pathways_index.search(phrase, 3)),
+            ('index: diseases', lambda phrase: diseases_index.search(phrase, 3))
+        ]:
+            start = perf_counter()
+            for _ in range(20):
+                for phrase in phrases:
+                    search(phrase)
+            timings[name] = (perf_counter() - start) / (20 * len(phrases))
+
+        for name, timing in timings.items():
+            print(f'{name}: {timing * 1000:.3f} ms per phrase')
+
+        # the same rows match
+        for phrase in phrases:
+            assert {
+                pathway.id for pathway in Pathway.query.filter(Pathway.description.like('%' + phrase + '%'))
+            } == {
+                pathways_index.get().rows[i].id for i in pathways_index.get().text.search(phrase)
+            }
@@ -1,7 +1,10 @@
-from analyses.enrichment import most_mutated_sites
+from random import seed, randint, choice, sample
+
+from analyses.enrichment import most_mutated_sites, most_mutated_sites_by_track
 from database import db
-from models import Mutation, Site, Protein, InheritedMutation, MC3Mutation, ClinicalData, Gene, SiteType
+from models import Mutation, Site, Protein, InheritedMutation, MC3Mutation, ClinicalData, Gene, SiteType, Cancer
 from database_testing import DatabaseTest
+from miscellaneous import count_queries
 
 
 class MutationTest(DatabaseTest):
@@ -67,3 +70,78 @@ class MutationTest(DatabaseTest):
 
         glyco_sites_with_mc3 = most_mutated_sites([MC3Mutation], site_type=glycosylation).all()
         assert glyco_sites_with_mc3 == [(sites['U'], 3)]
+
+    def test_most_mutated_sites_by_track(self):
+        seed(0)
+        glycosylation = SiteType(name='glycosylation')
+        phosphorylation = SiteType(name='phosphorylation')
+        cancers = [Cancer(code=f'C{i}', name=f'Cancer {i}') for i in range(3)]
+
+        for i in range(6):
+            gene = Gene(name=f'Gene {i}')
+            preferred = Protein(refseq=f'NM_{i}', sequence='A' * 100, gene=gene)
+            gene.preferred_isoform = preferred
+            other = Protein(refseq=f'NM_{i}_other', sequence='A' * 100, gene=gene)
+
+            for protein in [preferred, other]:
+                db.session.add_all([
+                    Site(position=position, residue='A', protein=protein, types={choice([glycosylation, phosphorylation])})
+                    for position in sample(range(1, 101), 10)
+                ])
+                for position in sample(range(1, 101), 40):
+                    mutation = Mutation(position=position, alt='X', protein=protein)
+                    in_mc3, in_clinvar = choice([(True, False), (False, True), (True, True)])
+                    if in_mc3:
+                        db.session.add_all([
+                            MC3Mutation(mutation=mutation, cancer=cancer, count=randint(1, 3))
+                            for cancer in sample(cancers, randint(1, 3))
+                        ])
+                    if in_clinvar:
+                        db.session.add(InheritedMutation(
+                            mutation=mutation, clin_data=[
+                                ClinicalData(sig_code=choice([2, 3, 4, 5]))
+                                for _ in range(randint(1, 3))
+                            ]
+                        ))
+        db.session.commit()
+
+        sources = [MC3Mutation, InheritedMutation]
+        tracks = [
+            (sources[:1], False, sources[1:]),
+            (sources, True, False),
+            (sources[1:], False, sources[:1]),
+        ]
+
+        pathogenic = InheritedMutation.significance_set_filter('pathogenic')
+
+        for site_type in [None, glycosylation]:
+            for mutation_filter in [None, pathogenic]:
+                expected = [
+                    most_mutated_sites(
+                        sources, site_type=site_type, limit=10, intersection=intersection, exclusive=exclusive,
+                        # the ClinVar filter does not apply to "MC3 only" track
+                        mutation_filter=mutation_filter if InheritedMutation in sources else None
+                    ).all()
+                    for sources, intersection, exclusive in tracks
+                ]
+                assert all(expected)
+
+                for use_window_functions in [True, False]:
+                    with count_queries() as queries:
+                        result = most_mutated_sites_by_track(
+                            tracks, site_type=site_type, limit=10, mutation_filter=mutation_filter,
+                            use_window_functions=use_window_functions
+                        )
+                    assert result == expected
+                    assert len(queries) == (1 if use_window_functions else 2)
+
+        # the filter narrows down the ClinVar tracks only
+        unfiltered = most_mutated_sites_by_track(tracks, limit=10)
+        filtered = most_mutated_sites_by_track(tracks, limit=10, mutation_filter=pathogenic)
+        assert filtered[0] == unfiltered[0]
+        assert filtered[2] != unfiltered[2]
+
+        from stats.plots.most_mutated_sites import most_mutated_sites as stacked_sites
+        stacked = stacked_sites(sources, stacked=True, limit=10)
+        assert set(stacked) == {'MC3', 'MC3 and ClinVar', 'ClinVar'}
+        assert all(len(labels) == len(counts) == 10 for labels, counts in stacked.values())
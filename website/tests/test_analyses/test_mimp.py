@@ -1,7 +1,8 @@
+from random import Random
 from tempfile import TemporaryDirectory
 
 from analyses.mimp import (
-    gather_negative_sites, sample_random_negative_sequences, NegativeSite,
+    gather_negative_sites, sample_random_negative_sequences, NegativeSite, Proteome,
     calculate_background_frequency,
     train_model,
 )
@@ -25,26 +26,52 @@ class MIMPTest(DatabaseTest):
         negative_sites = gather_negative_sites(residues={'X'}, exclude={s})
 
         # zero-based
-        assert negative_sites == {
-            NegativeSite(p, 0),
-            NegativeSite(p, 24)
+        assert set(negative_sites) == {
+            NegativeSite(p.id, 0),
+            NegativeSite(p.id, 24)
         }
 
     def test_sample_negatives(self):
 
         p = Protein(refseq='NM_007', sequence='X---------X------------YXY--------')
+        g = Gene(isoforms=[p], preferred_isoform=p)
+        db.session.add(g)
 
-        negative_sites = {
-            NegativeSite(p, 0),
-            NegativeSite(p, 24)
+        negative_sites = gather_negative_sites(residues={'X'}, exclude=set())
+        assert set(negative_sites) == {
+            NegativeSite(p.id, 0),
+            NegativeSite(p.id, 10),
+            NegativeSite(p.id, 24)
         }
 
+        sequences = sample_random_negative_sequences(negative_sites, n=3)
+        assert sorted(sequences) == ['-------X-------', '-------X-------', '------YXY------']
+
+        negative_sites = gather_negative_sites(residues={'X'}, exclude={Site(position=11, protein=p)})
+
         sequences = sample_random_negative_sequences(negative_sites, n=2)
         assert set(sequences) == {'-------X-------', '------YXY------'}
 
         sequences = sample_random_negative_sequences(negative_sites, n=1)
         assert sequences == ['------YXY------'] or sequences == ['-------X-------']
 
+        # seeded generators give reproducible samples
+        assert all(
+            sample_random_negative_sequences(negative_sites, n=1, generator=Random(seed))
+            == sample_random_negative_sequences(negative_sites, n=1, generator=Random(seed))
+            for seed in range(10)
+        )
+
+    def test_proteome(self):
+
+        proteome = Proteome({1: 'MAB*', 3: 'MCDE', 2: 'M'}, flank=2)
+
+        positions = proteome.global_positions([(1, 0), (1, 2), (1, 3), (2, 0), (3, 3), (4, 0)])
+        assert proteome.sites_at(positions) == [
+            NegativeSite(1, 0), NegativeSite(1, 2), NegativeSite(2, 0), NegativeSite(3, 3)
+        ]
+        assert proteome.windows(positions) == ['--MAB', 'MAB--', '--M--', 'CDE--']
+
     def test_background_frequency(self):
 
         for i, sequence in enumerate(['ABBBC', 'ADDEE']):
@@ -1,10 +1,17 @@
+import re
+from random import seed, choice, sample, randint
+
 from analyses.motifs import (
     mutate_sequence,
     select_sites_with_motifs,
     MotifsCounter,
+    MotifsMatcher,
+    find_affected_motifs,
+    store_affected_motifs,
+    precompute_affected_motifs,
 )
 from database import db
-from models import Mutation, Protein, Site, SiteType
+from models import Mutation, Protein, Site, SiteType, SiteMotif, Gene, MC3Mutation, InheritedMutation, ClinicalData, Cancer, or_
 from database_testing import DatabaseTest
 
 
@@ -79,3 +86,154 @@ class MotifAnalysisTest(DatabaseTest):
 
         assert data.sites_with_broken_motif['canonical'] == {canonical_sites[0], canonical_sites[1]}
         assert data.sites_with_motif['canonical'] == set(canonical_sites)
+
+    def test_counting_by_genes(self):
+        seed(0)
+        motifs_db = {
+            'xation': {'canonical': '.{6}[^X]X[^X].{6}', 'non-canonical': 'XXY'}
+        }
+        xation = SiteType(name='xation')
+        other = SiteType(name='other')
+        cancer = Cancer(code='C', name='Cancer')
+
+        genes = []
+        for i in range(8):
+            gene = Gene(name=f'Gene {i}')
+            genes.append(gene)
+            if i == 7:
+                # no preferred isoform
+                continue
+            for j in range(2):
+                sequence = ''.join(choice('XY___') for _ in range(60))
+                protein = Protein(refseq=f'NM_{i}_{j}', sequence=sequence, gene=gene)
+                if j == 0:
+                    gene.preferred_isoform = protein
+                for position in sample(range(1, 61), 6):
+                    Site(protein=protein, position=position, types={choice([xation, xation, other])})
+                for position in sample(range(1, 61), 20):
+                    mutation = Mutation(protein=protein, position=position, alt=choice('XYo'))
+                    in_mc3, in_clinvar = choice([(True, False), (False, True), (True, True)])
+                    if in_mc3:
+                        MC3Mutation(mutation=mutation, cancer=cancer, count=randint(1, 3))
+                    if in_clinvar:
+                        InheritedMutation(mutation=mutation, clin_data=[ClinicalData() for _ in range(randint(1, 2))])
+                db.session.add(protein)
+        db.session.add_all(genes)
+        db.session.commit()
+
+        sources = [MC3Mutation, InheritedMutation]
+        mutations = Mutation.query.filter(or_(*[Mutation.in_sources(source) for source in sources]))
+        sites = Site.query.filter(Site.types.contains(xation))
+
+        for mode in ['broken_motif', 'change_of_motif']:
+            counter = MotifsCounter(xation, mode=mode, motifs_db=motifs_db)
+
+            for kwargs in [{}, {'occurrences_in': sources}, {'intersection': sources, 'occurrences_in': sources[:1]}]:
+                expected = {
+                    gene.name: counter.count_muts_and_sites(
+                        mutations.filter(Mutation.protein == gene.preferred_isoform),
+                        sites.filter(Site.protein == gene.preferred_isoform),
+                        show_progress=False, **kwargs
+                    )
+                    for gene in genes
+                }
+                assert any(counts.muts_breaking_sites_motif for counts in expected.values())
+
+                counts = counter.count_muts_and_sites_by_genes(mutations, genes, proteins_per_batch=3, **kwargs)
+                assert counts == expected
+
+    def test_matcher(self):
+
+        motifs = {'canonical': '.{6}[^X]X[^X].{6}', 'non-canonical': 'XXY', 'alternative': 'Z|XY$'}
+
+        sequences = ['______aXa______', '_XXY', 'XXY__', '______XXa______', 'Z_XY', '']
+
+        matcher = MotifsMatcher(motifs)
+        anchored_matcher = MotifsMatcher(motifs, anchored=True)
+
+        for sequence in sequences:
+            assert matcher(sequence) == {name for name, motif in motifs.items() if re.search(motif, sequence)}
+            assert anchored_matcher(sequence) == {name for name, motif in motifs.items() if re.match(motif, sequence)}
+
+        found = matcher.match_all(sequences + sequences)
+        assert found == {sequence: matcher(sequence) for sequence in sequences}
+
+        parallel_matcher = MotifsMatcher(motifs, processes=2)
+        assert parallel_matcher.match_all(sequences) == found
+
+    def test_affected_motifs(self):
+
+        xation = SiteType(name='xation')
+        canonical = SiteMotif(name='canonical', pattern='.{7}X[^X].{6}', site_type=xation)
+
+        p = Protein(refseq='NM_007', id=1, sequence='_X_X_______X________XXY')
+
+        Site(protein=p, position=2, types={xation})
+
+        breaking = Mutation(protein=p, position=3, alt='X')
+        non_breaking = Mutation(protein=p, position=1, alt='o')
+
+        db.session.add_all([p, canonical, breaking, non_breaking])
+        db.session.commit()
+
+        assert breaking.affected_motifs() == [(canonical, 8)]
+        assert non_breaking.affected_motifs() == []
+
+        affected = find_affected_motifs([breaking, non_breaking])
+
+        assert affected == {breaking: {canonical}, non_breaking: set()}
+
+        store_affected_motifs(affected)
+        db.session.commit()
+
+        assert breaking.were_affected_motifs_precomputed
+        assert non_breaking.were_affected_motifs_precomputed
+        assert breaking.precomputed_affected_motifs == {canonical}
+
+        assert breaking.affected_motifs() == [(canonical, 8)]
+        assert non_breaking.affected_motifs() == []
+
+    def test_precompute_affected_motifs(self):
+
+        xation = SiteType(name='xation')
+        canonical = SiteMotif(name='canonical', pattern='.{7}X[^X].{6}', site_type=xation)
+
+        p = Protein(refseq='NM_007', id=1, sequence='_X_X_______X________XXY')
+
+        Site(protein=p, position=2, types={xation})
+
+        breaking = Mutation(protein=p, position=3, alt='X')
+        non_breaking = Mutation(protein=p, position=1, alt='o')
+        far_away = Mutation(protein=p, position=23, alt='X')
+
+        db.session.add_all([p, canonical, breaking, non_breaking, far_away])
+        db.session.commit()
+
+        assert precompute_affected_motifs() == 3
+
+        assert all(m.were_affected_motifs_precomputed for m in [breaking, non_breaking, far_away])
+        assert breaking.precomputed_affected_motifs == {canonical}
+        assert breaking.affected_motifs() == [(canonical, 8)]
+        assert non_breaking.affected_motifs() == far_away.affected_motifs() == []
+
+        # nothing has changed since the last run
+        assert precompute_affected_motifs() == 0
+
+        # a new site is added close to a mutation which was precomputed before
+        Site(protein=p, position=22, types={xation})
+        db.session.commit()
+
+        assert precompute_affected_motifs(processes=2) == 3
+        assert far_away.precomputed_affected_motifs == {canonical}
+        assert far_away.affected_motifs() == [(canonical, 8)]
+
+        # newly added mutations are processed too
+        new = Mutation(protein=p, position=16, alt='X')
+        db.session.add(new)
+        db.session.commit()
+
+        assert precompute_affected_motifs() == 1
+        assert new.were_affected_motifs_precomputed
+        assert new.precomputed_affected_motifs == set()
+
+        assert precompute_affected_motifs(full=True) == 4
@@ -1,7 +1,8 @@
 import pytest
 
+from database import db
 from database_testing import DatabaseTest
-from models import MC3Mutation
+from models import MC3Mutation, InheritedMutation, ClinicalData, MIMPMutation, Mutation, Gene, Cancer, Site
 
 from .test_run_active_driver import load_cancer_data
 
@@ -20,3 +21,53 @@ class PTMMutationsAnalysisTest(DatabaseTest):
 
         assert muts_by_impact_by_gene['direct']['TP53'] == 21
         assert muts_by_impact_by_gene['direct']['ENDOG'] == 0
+
+    def test_gather_ptm_impacts(self):
+
+        from analyses.ptm_impact import gather_ptm_impacts
+
+        phosphorylation = load_cancer_data()
+
+        tp53 = Gene.query.filter_by(name='TP53').one().preferred_isoform
+        mutations = {mutation.position: mutation for mutation in tp53.mutations}
+
+        # occurrences in other cancer
+        db.session.add(MC3Mutation(mutation=mutations[3], cancer=Cancer(name='Cancer 2', code='CA2'), count=4))
+        # distal (to the site at 6) but predicted to rewire the network
+        mimp_site = Site.query.filter_by(protein=tp53, position=6).one()
+        db.session.add(MIMPMutation(mutation=mutations[1], site=mimp_site, effect='loss'))
+        db.session.add_all([
+            InheritedMutation(mutation=mutations[1], clin_data=[ClinicalData(), ClinicalData()]),
+            InheritedMutation(mutation=mutations[9], clin_data=[ClinicalData()])
+        ])
+        db.session.commit()
+
+        def site_filter(sites):
+            return [site for site in sites if phosphorylation in site.types]
+
+        for source in [MC3Mutation, InheritedMutation]:
+            expected = {
+                mutation.id: (mutation.impact_on_ptm(site_filter), mutation.sources_map[source.name].get_value())
+                for mutation in Mutation.query.filter(Mutation.in_sources(source))
+                if mutation.impact_on_ptm(site_filter) != 'none'
+            }
+            impacts = gather_ptm_impacts(source, phosphorylation)
+            assert {impact.mutation_id: (impact.impact, impact.value) for impact in impacts} == expected
+
+        impacts = {impact.mutation_id: impact for impact in gather_ptm_impacts(InheritedMutation, phosphorylation)}
+        assert impacts[mutations[1].id].impact == 'network-rewiring'
+        assert impacts[mutations[1].id].value == 2
+        assert impacts[mutations[9].id].impact == 'direct'
+        assert impacts[mutations[9].id].gene == 'TP53'
+
+        # motif-changing mutations (as found by MotifsCounter) take precedence over all but direct
+        impacts = gather_ptm_impacts(
+            InheritedMutation, phosphorylation, occurrences=False,
+            motif_changing={mutations[1].id, mutations[9].id}
+        )
+        assert {impact.mutation_id: (impact.impact, impact.value) for impact in impacts} == {
+            mutations[1].id: ('motif-changing', 1),
+            mutations[9].id: ('direct', 1)
+        }
+
+        assert not gather_ptm_impacts(MC3Mutation, phosphorylation, limit_to_genes=['ENDOG'])
@@ -121,3 +121,81 @@ class TestTypes(DatabaseTest):
     def test_migrate(self):
         for bind in self.SQLALCHEMY_BINDS.keys():
             basic_auto_migrate_relational_db(self.app, bind)
+
+
+class TestBulk(DatabaseTest):
+
+    def test_bulk_upsert(self):
+        from database.bulk import bulk_upsert, UpsertCounts
+        from models import MC3Mutation, InheritedMutation
+
+        db.session.add_all([
+            MC3Mutation(mutation_id=1, cancer_id=1, count=1, samples='a'),
+            MC3Mutation(mutation_id=1, cancer_id=2, count=2, samples='b,c'),
+            MC3Mutation(mutation_id=2, cancer_id=1, count=1, samples='d')
+        ])
+        db.session.commit()
+
+        counts = bulk_upsert(MC3Mutation, ('mutation_id', 'cancer_id'), [
+            # unchanged
+            {'mutation_id': 1, 'cancer_id': 1, 'count': 1, 'samples': 'a'},
+            # updated
+            {'mutation_id': 1, 'cancer_id': 2, 'count': 3, 'samples': 'b,c,e'},
+            # new
+            {'mutation_id': 2, 'cancer_id': 2, 'count': 1, 'samples': 'f'}
+        ])
+        db.session.commit()
+
+        assert counts == UpsertCounts(inserted=1, updated=1, unchanged=1)
+
+        rows = {
+            (m.mutation_id, m.cancer_id): (m.count, m.samples)
+            for m in MC3Mutation.query
+        }
+        assert rows == {
+            (1, 1): (1, 'a'),
+            (1, 2): (3, 'b,c,e'),
+            (2, 1): (1, 'd'),
+            (2, 2): (1, 'f')
+        }
+
+        # values of custom types (and NULLs) are compared correctly
+        db.session.add(InheritedMutation(mutation_id=1, db_snp_ids={1, 2}))
+        db.session.commit()
+
+        counts = bulk_upsert(InheritedMutation, ('mutation_id',), [
+            {'mutation_id': 1, 'db_snp_ids': {1, 2}, 'combined_significances': None},
+            {'mutation_id': 2, 'db_snp_ids': {3}, 'combined_significances': {'Benign'}}
+        ])
+        assert counts == UpsertCounts(inserted=1, updated=0, unchanged=1)
+        assert InheritedMutation.query.filter_by(mutation_id=2).one().db_snp_ids == {3}
+
+    def test_bulk_replace(self):
+        from database.bulk import bulk_replace, UpsertCounts
+        from models import ExomeSequencingMutation
+
+        db.session.add_all([
+            # two entries of the same mutation (no discriminator)
+            ExomeSequencingMutation(mutation_id=1, maf_all=0.1, maf_ea=0.1, maf_aa=0.1),
+            ExomeSequencingMutation(mutation_id=1, maf_all=0.2, maf_ea=0.2, maf_aa=0.2),
+            ExomeSequencingMutation(mutation_id=2, maf_all=0.3, maf_ea=0.3, maf_aa=0.3)
+        ])
+        db.session.commit()
+
+        def row(mutation_id, maf):
+            return {'mutation_id': mutation_id, 'maf_ea': maf, 'maf_aa': maf, 'maf_all': maf}
+
+        counts = bulk_replace(ExomeSequencingMutation, ('mutation_id',), [
+            # unchanged (in a different order)
+            row(1, 0.2), row(1, 0.1),
+            # updated (given as a string, as parsed)
+            row(2, '0.4'),
+            # new
+            row(3, 0.5)
+        ])
+        db.session.commit()
+
+        assert counts == UpsertCounts(inserted=1, updated=1, unchanged=2)
+        assert sorted(
+            (esp.mutation_id, esp.maf_all) for esp in ExomeSequencingMutation.query
+        ) == [(1, 0.1), (1, 0.2), (2, 0.4), (3, 0.5)]
@@ -10,7 +10,7 @@ from database import db, create_key_model_dict
 from database_testing import DatabaseTest
 from imports.protein_data import precompute_ptm_mutations
 from imports.sites.site_importer import SiteImporter
-from imports.sites.site_mapper import find_all, find_all_regex
+from imports.sites.site_mapper import find_all, find_all_regex, find_all_in_isoforms, MIN_SITES_TO_INDEX, KMER_LENGTH
 from imports.sites.site_mapper import SiteMapper
 from models import Protein, Gene, Mutation, MC3Mutation, MIMPMutation, Site
 
@@ -61,6 +61,26 @@ def create_importer(*args, offset=7, **kwargs):
     return MinimalSiteImporter(*args, **kwargs)
 
 
+def test_find_all_in_isoforms():
+
+    isoforms = ['Lorem ipsum dololor L', 'ipsum dololor L', 'Lorem ipsum']
+    queries = ['L', 'o', 'olo', '^L', '^Lorem', 'L$', ' L$', 'not matching']
+
+    matches = find_all_in_isoforms((isoforms, queries))
+
+    for query in queries:
+        assert matches[query] == [find_all(isoform, query) for isoform in isoforms]
+
+    # enough queries to use the k-mer index; queries shorter than k-mers are still matched
+    queries = [isoforms[0][i:i + KMER_LENGTH + 1] for i in range(len(isoforms[0]) - KMER_LENGTH)]
+    queries += [f'not matching {i}' for i in range(MIN_SITES_TO_INDEX)] + ['^Lo', 'L$', 'L', 'olo']
+
+    matches = find_all_in_isoforms((isoforms, queries))
+
+    for query in queries:
+        assert matches[query] == [find_all(isoform, query) for isoform in isoforms]
+
+
 def group_by_isoform(sites: DataFrame):
     return {site.refseq: site for site in sites.itertuples(index=False)}
 
@@ -329,3 +349,39 @@ class TestImport(DatabaseTest):
         result = mapper.map_sites_by_sequence(sites)
 
         assert len(result) == 2
+
+    def test_mapping_in_worker_processes(self):
+
+        gene_a = Gene(name='A', isoforms=[
+            Protein(refseq='NM_01', sequence='AAAAAAAAAXAA'),
+            Protein(refseq='NM_02', sequence='AAAXAA'),
+        ])
+        db.session.add(gene_a)
+        db.session.commit()
+
+        sites = DataFrame([
+            {
+                'name': 'first site',
+                'gene': 'A',
+                'refseq': 'NM_01',
+                'position': 10,
+                'sequence': 'AXA',
+                'residue': 'X',
+                'left_sequence_offset': 1
+            }
+        ]).set_index('name')
+
+        mapper = SiteMapper(
+            create_key_model_dict(Protein, 'refseq'),
+            lambda s: f'{s.position}{s.residue}',
+            processes=2,
+            min_tasks_for_pool=1
+        )
+
+        with warns(UserWarning, match='some are quite far away'):
+            mapped_sites = mapper.map_sites_by_sequence(sites)
+
+        sites_by_isoform = group_by_isoform(mapped_sites)
+
+        assert sites_by_isoform['NM_01'].position == 10
+        assert sites_by_isoform['NM_02'].position == 4
@@ -128,6 +128,24 @@ class TestExport(DatabaseTest):
                 'SOMEGENE\tNM_0001\t1\tE\tCAN\t1\tA\n'
             ]
 
+    def test_impacts_on_ptm_sites(self):
+
+        filename = make_named_temp_file()
+
+        with self.app.app_context():
+            test_models = create_test_models()
+            db.session.add_all(test_models.values())
+
+            namespace = Namespace(exporters=['impacts_on_ptm_sites'], paths=[filename])
+            ProteinRelated().export(namespace)
+
+        with open(filename) as f:
+            assert f.readlines() == [
+                'source\tsite type\tgene\trefseq\tmutation position\tmutation alt\timpact\tvalue\n',
+                'MC3\tglycosylation\tSOMEGENE\tNM_0001\t1\tE\tdirect\t2\n',
+                'ClinVar\tglycosylation\tSOMEGENE\tNM_0001\t1\tE\tdirect\t2\n'
+            ]
+
     def test_sites_export(self):
 
         filename = make_named_temp_file()
@@ -194,6 +194,30 @@ class TestImport(DatabaseTest):
         assert sample == 'TCGA-02-0003-01A-01D-1490-08'
         assert count == 3
 
+    def test_hypermutated_skipped_at_import(self):
+        from imports.mutations.mc3 import MC3Importer
+
+        muts_filename = make_named_gz_file(with_hypermutated_samples)
+        proteins = create_proteins({
+            'NM_052959': 'MSLAHTAAEYMLSDALLPDRRGPRLKGLRLELPLDRIVKFVAVGSPLLLMSLAFAQEFSSGSPISCFSPSNFSIRQAAYVDSSCWDSLLHHKQDGPGQDKMKSLWPHKALPYSLLALALLMYLPVLLWQYAAVPALSSDLLFIISELDKSYNRSIRLVQHMLKIRQKSSDPYVFSRALYMSPPDSLPPLQWRRLLAASMERGGR',
+            'NM_007365': 'M' + 'A' * 195 + 'G' + 'A' * 10
+        })
+
+        with self.app.app_context():
+            importer = MC3Importer(proteins)
+            importer.hypermutation_threshold = 2
+            # force the buffer to spill to disk
+            importer.buffer_size = 10
+            importer.base_importer.prepare()
+
+            mutations = importer.parse(muts_filename)
+
+            # only the mutation of the sample which is not hypermutated is kept
+            assert len(mutations) == 1
+            (mutation_id, cancer_id), (count, samples) = mutations.popitem()
+            assert samples == {'TCGA-04-1349-01A-01W-0492-08'}
+            assert importer.samples_to_skip == {'TCGA-02-0003-01A-01D-1490-08'}
+
     def test_clinvar_disease_names(self):
         beutify = ClinVarImporter._beautify_disease_name
         assert beutify('B_Lymphoblastic_Leukemia/Lymphoma_with_t(v%3B11q23.3)%3B_KMT2A_Rearranged') == 'B Lymphoblastic Leukemia/Lymphoma with t(v;11q23.3); KMT2A Rearranged'
@@ -340,6 +364,35 @@ class TestImport(DatabaseTest):
             # Diseases with no mutations should get removed:
             assert Disease.query.filter_by(name='Hepatocellular carcinoma').count() == 0
 
+    def test_clinvar_update(self):
+        from models import ClinicalData
+
+        muts_filename = make_named_gz_file(clinvar_mutations)
+        proteins = create_proteins({**tp53, **lama4, **msh2})
+
+        with self.app.app_context():
+            source_name = 'clinvar'
+            kwargs = dict(clinvar_xml_path='tests/test_imports/clinvar_subset.xml', skip_removal=True)
+
+            muts_import_manager.perform('load', proteins, [source_name], {source_name: muts_filename}, **kwargs)
+
+            def snapshot():
+                mutation_ids = {m.id: m.mutation_id for m in InheritedMutation.query}
+                return (
+                    {(m.mutation_id, frozenset(m.db_snp_ids)) for m in InheritedMutation.query},
+                    sorted(
+                        (mutation_ids[a.inherited_id], a.disease_id, a.variation_id, a.sig_code, a.origin)
+                        for a in ClinicalData.query
+                    )
+                )
+
+            loaded = snapshot()
+
+            # re-importing the same release does not duplicate anything
+            muts_import_manager.perform('update', proteins, [source_name], {source_name: muts_filename}, **kwargs)
+
+            assert snapshot() == loaded
+
     def test_clinvar_edge_cases(self):
         """Same as above, but without the removal of filtered out mutations to simplify testing or edge cases"""
         muts_filename = make_named_gz_file(clinvar_mutations)
@@ -434,6 +487,31 @@ class TestImport(DatabaseTest):
         mutations = ExomeSequencingMutation.query.all()
         assert len(mutations) == 2
 
+    def test_esp_update(self):
+
+        muts_filename = make_named_gz_file(esp_mutations)
+        updated_filename = make_named_gz_file(esp_mutations.replace('MAF=0.0116,0.0681,0.0308', 'MAF=0.0216,0.0781,0.0408'))
+        proteins = create_proteins(tp53)
+
+        def maf_by_mutation():
+            return {esp.mutation_id: esp.maf_all for esp in ExomeSequencingMutation.query}
+
+        with self.app.app_context():
+            muts_import_manager.perform('load', proteins, ['esp6500'], {'esp6500': muts_filename})
+            loaded = maf_by_mutation()
+
+            # re-importing the same release changes nothing
+            muts_import_manager.perform('update', proteins, ['esp6500'], {'esp6500': muts_filename})
+            assert ExomeSequencingMutation.query.count() == 2
+            assert maf_by_mutation() == loaded
+
+            # a changed frequency replaces the old one, rather than being added next to it
+            muts_import_manager.perform('update', proteins, ['esp6500'], {'esp6500': updated_filename})
+            assert ExomeSequencingMutation.query.count() == 2
+            assert sorted(maf_by_mutation().values()) == sorted(
+                [0.0408, *(maf for maf in loaded.values() if maf != 0.0308)]
+            )
+
     def test_mimp_import(self):
 
         from imports.mutations.mimp import MIMPImporter
@@ -469,6 +547,40 @@ class TestImport(DatabaseTest):
         # MIMP mutations are always affecting some PTM site (by definition)
         assert all(mimp.mutation.is_ptm for mimp in mutations)
 
+    def test_mimp_import_in_parallel(self):
+        from os.path import exists
+        from imports.mutations.mimp import MIMPImporter
+        from helpers.parsers import LineIndex
+
+        muts_filename = make_named_temp_file(data=mimp_mutations)
+        proteins = create_proteins(tp53)
+        phosphorylation = SiteType(name='phosphorylation')
+
+        sites = [
+            Site(protein=proteins['NM_000546'], position=site_pos, types={phosphorylation})
+            for site_pos in [20, 215, 315, 106]
+        ]
+        db.session.add(phosphorylation)
+        db.session.add_all(sites)
+        db.session.commit()
+
+        with self.app.app_context():
+            importer = MIMPImporter(proteins)
+            importer.chunk_size = 2
+
+            with pytest.warns(UserWarning, match='Skipping NM_000546: D57K'):
+                importer.load(path=muts_filename, processes=2)
+
+        # the index of lines was saved for the subsequent imports
+        assert exists(muts_filename + LineIndex.suffix)
+
+        mutations = MIMPMutation.query.all()
+        assert len(mutations) == 4
+        assert {(mimp.mutation.position, mimp.mutation.alt) for mimp in mutations} == {
+            (17, 'R'), (213, 'F'), (316, 'R'), (104, 'R')
+        }
+        assert {mimp.site.position for mimp in mutations} == {20, 215, 315, 106}
+
     def test_thousand_genomes_import(self):
 
         muts_filename = make_named_gz_file(thousand_genomes_mutations)
@@ -519,11 +631,10 @@ class TestImport(DatabaseTest):
         mutation_details = []
 
         def add_if_not_duplicate(mutation_id, details):
-            is_duplicated = importer.look_after_duplicates(mutation_id, mutation_details, details)
+            is_duplicated = importer.is_duplicate(mutation_id, details)
             if not is_duplicated:
                 details_with_id = [mutation_id]
                 details_with_id.extend(details)
-                importer.protect_from_duplicates(mutation_id, mutation_details)
                 mutation_details.append(details_with_id)
             return is_duplicated
 
@@ -540,6 +651,23 @@ class TestImport(DatabaseTest):
         duplicated = add_if_not_duplicate(2, ['motif_gain', 22])
         assert not duplicated
 
+        assert len(mutation_details) == 3
+        assert importer.duplicates_filter.duplicates == 1
+
+        # the details are remembered only until the next load (or chunk)
+        importer.duplicates_filter.reset()
+        assert not add_if_not_duplicate(2, ['motif_lost', 11])
+
+    def test_duplicates_filter_verify(self):
+        from imports.mutations.mutation_importer.helpers import DuplicatesFilter
+
+        duplicates_filter = DuplicatesFilter(verify=True)
+        assert not duplicates_filter.is_duplicate(1, ['motif_lost', 11])
+        assert duplicates_filter.is_duplicate(1, ('motif_lost', 11))
+        assert not duplicates_filter.is_duplicate(1, ['motif_lost', 12])
+        # exact values are kept for comparison
+        assert (1, ('motif_lost', 11)) in duplicates_filter.seen
+
 
 tss_cancer_map_text = """\
 A1	Breast invasive carcinoma
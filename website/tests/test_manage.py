@@ -143,6 +143,16 @@ class ManageTest(DatabaseTest):
         from test_imports.test_export import TestExport
         TestExport.test_network_export(self, do_export)
 
+    def test_warm_up(self):
+        from models import Protein
+        db.session.add(Protein(refseq='NM_0001', gene=Gene(name='SOMEGENE'), sequence='MA'))
+        db.session.commit()
+
+        manage.warm_up(Namespace(paths=['/protein/known_mutations/NM_0001', '/protein/known_mutations/NM_0002']), app=self.app)
+        msg, error = self.capsys.readouterr()
+        assert '/protein/known_mutations/NM_0001: 200 OK' in msg
+        assert '/protein/known_mutations/NM_0002: 404 NOT FOUND' in msg
+
     def test_root_user(self):
         from imports import cms
         email = 'root-email@gmail.com'
@@ -1,5 +1,6 @@
 from database import db
 from .model_testing import ModelTest
+from miscellaneous import count_queries
 from models import Mutation
 from models import Protein
 from models import Site
@@ -102,6 +103,15 @@ class MutationTest(ModelTest):
             sites_found = mutation.find_closest_sites()
             assert len(sites_found) == expected_sites_cnt
 
+        # all at once, with a single query
+        with count_queries() as queries:
+            sites_found = Mutation.find_closest_sites_in_bulk(
+                (mutation.protein_id, mutation.position)
+                for mutation in mutations
+            )
+        assert len(queries) == 1
+        assert sites_found == [mutation.find_closest_sites() for mutation in mutations]
+
         # ==test_get_affected_ptm_sites==
 
         expected_affected_sites = dict(zip(mutations, [0, 1, 3, 1]))
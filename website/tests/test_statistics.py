@@ -1,3 +1,5 @@
+from functools import partial
+
 from pandas import DataFrame
 from pytest import raises
 
@@ -7,8 +9,9 @@ from database import db
 import models
 from models import (
     Protein, Site, Mutation, MIMPMutation, InheritedMutation, MC3Mutation, The1000GenomesMutation,
-    SiteType, ClinicalData, ExomeSequencingMutation,
+    SiteType, ClinicalData, ExomeSequencingMutation, confirmed_mutation_sources,
 )
+from miscellaneous import count_queries
 from test_models.test_mutation import create_mutations_with_impact_on_site_at_pos_1
 
 
@@ -118,6 +121,182 @@ class StatisticsTest(DatabaseTest):
 
         assert statistics['sites'] == sum(site_counts.values())
 
+    def test_venn_diagrams(self):
+        from random import choice, random, seed
+        from models import Gene, SiteSource
+        from stats.venn import VennDiagrams, all_combinations, mutation_by_source, sites_by_source, sites_by_type
+
+        seed(0)
+
+        site_types = [SiteType(name=name) for name in ['phosphorylation', 'methylation', 'ubiquitination']]
+        site_sources = [SiteSource(name=name) for name in ['PhosphoSitePlus', 'UniProt', 'HPRD']]
+        mutation_sources = [MC3Mutation, InheritedMutation, ExomeSequencingMutation]
+
+        for i in range(4):
+            protein = Protein(refseq=f'NM_{i}', sequence='X' * 60)
+            if random() > 0.3:
+                Gene(name=f'G{i}', isoforms=[protein], preferred_isoform=protein)
+            for position in range(5, 60, 10):
+                types = {site_type for site_type in site_types if random() > 0.5}
+                sources = {source for source in site_sources if random() > 0.5}
+                Site(protein=protein, position=position, types=types, sources=sources)
+            for position in range(1, 60, 4):
+                mutation = Mutation(protein=protein, position=position, alt=choice('ACDE'))
+                for source in mutation_sources:
+                    if random() > 0.5:
+                        source(mutation=mutation)
+            db.session.add(protein)
+        db.session.commit()
+
+        venn = VennDiagrams()
+        venn.calc_all()
+        diagrams = venn.get_all()
+
+        def sizes(cases, combination_counter):
+            return [
+                {'sets': [case.name for case in combination], 'size': combination_counter(combination)}
+                for combination in all_combinations(cases)
+            ]
+
+        confirmed = confirmed_mutation_sources().values()
+        # diagrams of models list the sets in the same order as the query does
+        site_types = SiteType.query.all()
+        site_sources = SiteSource.query.all()
+
+        assert diagrams['sites_by_type'] == sizes(site_types, sites_by_type)
+        assert diagrams['sites_by_source'] == sizes(site_sources, sites_by_source)
+        assert diagrams['mutation_by_source'] == sizes(confirmed, mutation_by_source)
+
+        for site_type in site_types:
+            assert diagrams[f'{site_type.name}_sites_by_source'] == sizes(
+                site_sources, partial(sites_by_source, site_type=site_type)
+            )
+            assert diagrams[f'{site_type.name}_mutations_by_source'] == sizes(
+                confirmed, partial(mutation_by_source, site_type=site_type)
+            )
+
+        def mutated_sites(site_types_combination, source):
+            return sum(
+                1
+                for site in Site.query
+                if set(site_types_combination) <= site.types and any(
+                    abs(mutation.position - site.position) < 8 and source.name in mutation.sources_map
+                    for mutation in site.protein.mutations
+                )
+            )
+
+        for name, source in confirmed_mutation_sources().items():
+            assert diagrams[f'sites_mutated_{name}'] == sizes(site_types, partial(mutated_sites, source=source))
+
+    def test_stored_values(self):
+        from stats.store import CountStore, StoredValues, counter
+        from models import Plot
+
+        plots = {'first': [1, 2], 'second': {'a': 3}}
+
+        class Store(CountStore):
+            storage_model = Plot
+
+            @counter
+            def first(self):
+                return plots['first']
+
+            @counter
+            def second(self):
+                return plots['second']
+
+            @counter
+            def not_calculated(self):
+                pass
+
+        store = Store()
+        store.calc_all(limit_to='first|second')
+        db.session.commit()
+
+        with count_queries() as queries:
+            values = store.get_all()
+        assert len(queries) == 1
+        assert isinstance(values, StoredValues)
+        # nothing is deserialized until accessed
+        assert not values.values
+        assert values['second'] == {'a': 3}
+        assert list(values.values) == ['second']
+        assert values['not_calculated'] == Store.default
+        assert set(values) == {'first', 'second', 'not_calculated'}
+
+        # cached until new values are calculated
+        with count_queries() as queries:
+            assert store.get_all() is values
+            assert Store.get('first') == [1, 2]
+        assert not queries
+
+        plots['first'] = [3]
+        store = Store()
+        store.calc_all(limit_to='first')
+        db.session.commit()
+
+        # single values are fetched one by one
+        with count_queries() as queries:
+            assert Store.get('first') == [3]
+            assert Store.get('first') == [3]
+        assert len(queries) == 1
+        with raises(KeyError):
+            Store.get('not_calculated')
+
+        assert store.get_all()['first'] == [3]
+
+    def test_resumable_calculation(self):
+        from stats.store import CountStore, counter
+        from stats.store.store import CountersFailed
+        from models import Count, CountCalculation
+
+        calls = []
+        broken = True
+
+        class Store(CountStore):
+
+            @counter
+            def first(self):
+                calls.append('first')
+                return 1
+
+            @counter
+            def second(self):
+                calls.append('second')
+                if broken:
+                    raise ValueError('Counter failed')
+                return 2
+
+        with raises(CountersFailed, match='second'):
+            Store().calc_all()
+
+        # the result of the other counter was committed
+        db.session.rollback()
+        assert Count.query.filter_by(name='first').one().value == 1
+        assert not Count.query.filter_by(name='second').all()
+
+        calculations = {
+            calculation.name: calculation
+            for calculation in CountCalculation.query.filter_by(store='Store')
+        }
+        assert calculations['first'].status == 'completed'
+        assert calculations['first'].duration >= 0
+        assert calculations['second'].status == 'failed'
+        assert 'Counter failed' in calculations['second'].error
+
+        # only the failed counter is calculated again when resuming
+        calls.clear()
+        broken = False
+        Store().calc_all(resume=True)
+        assert calls == ['second']
+        assert Count.query.filter_by(name='second').one().value == 2
+        assert CountCalculation.query.filter_by(store='Store', name='second').one().status == 'completed'
+
+        # unless a new run is started
+        calls.clear()
+        Store().calc_all(limit_to='first')
+        assert calls == ['first']
+
     def test_interactions(self):
 
         from models import Protein, Site, Kinase, KinaseGroup
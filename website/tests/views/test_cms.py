@@ -5,11 +5,14 @@ from bs4 import BeautifulSoup
 
 from app import mail
 from view_testing import ViewTest
-from models import Page, User, HelpEntry, Setting
+from sqlalchemy import func
+
+from models import Page, User, HelpEntry, Setting, ContentVersion
 from models import Menu
 from models import CustomMenuEntry
 from models import PageMenuEntry
 from database import db
+from miscellaneous import count_queries
 
 
 def find_links(html, **attrs):
@@ -299,6 +302,56 @@ class TestCMS(ViewTest):
 
         self.logout()
 
+    def test_content_cache(self):
+        menu = Menu(name='Top menu')
+        menu.entries = [CustomMenuEntry(title='Publications', address='/publications/')]
+        page = Page(title='About', address='about', content='About the website')
+        db.session.add_all([
+            menu, page,
+            Setting(name='website_name', value='My website'),
+            Setting(name='footer_text', value='Authors 2000')
+        ])
+        db.session.commit()
+        db.session.add(Setting(name='top_menu', value=str(menu.id)))
+        db.session.commit()
+
+        def render_page():
+            response = self.client.get('/about/')
+            assert response.status_code == 200
+            return response.data.decode()
+
+        html = render_page()
+        assert all(text in html for text in ['My website', 'Publications', 'Authors 2000', 'About the website'])
+
+        # rendered from the cache, only the version of the content is checked
+        with count_queries() as queries:
+            assert render_page() == html
+        cms_queries = [
+            query for query in queries
+            if re.search(r'FROM (setting|menu|menuentry|page|textentry|helpentry)\b', query)
+        ]
+        assert not cms_queries
+        assert sum('contentversion' in query for query in queries) == 1
+
+        # changes made by other processes are reloaded once the version changes
+        db.session.execute(Setting.__table__.update().values(value='Authors 2001').where(Setting.name == 'footer_text'))
+        assert 'Authors 2001' not in render_page()
+        db.session.execute(ContentVersion.__table__.insert().values(value=1))
+        assert 'Authors 2001' in render_page()
+
+        # the admin write paths increment the version
+        self.login_as_admin()
+        self.client.post('/settings/set/footer_text', data={'value': 'Authors 2002'})
+        self.client.post(
+            '/menu/%s/add_custom_menu_entry/' % menu.id,
+            data={'title': 'Downloads', 'url': '/download/'}
+        )
+        self.logout()
+        assert db.session.query(func.sum(ContentVersion.value)).scalar() == 3
+
+        html = render_page()
+        assert 'Authors 2002' in html and 'Downloads' in html
+
     def save_setting(self):
         assert self.is_only_for_admins('/settings/save/', method='post')
 
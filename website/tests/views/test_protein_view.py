@@ -1,7 +1,13 @@
+import gzip
+import json
+from pathlib import Path
+
 from view_testing import ViewTest, relative_location
-from models import Protein, SiteType
+from models import Protein, SiteType, Gene
 from models import Site
 from database import db
+from helpers.cache import mark_data_imported
+from miscellaneous import count_queries
 from test_sequence import test_protein_data, create_test_mutations
 
 
@@ -15,6 +21,65 @@ class TestProteinView(ViewTest):
 
         assert response.status_code == 200
 
+    def test_browse_data(self):
+        genes = [Gene(name=name) for name in ['TP53', 'BRCA1', 'EGFR', 'KRAS']]
+        db.session.add_all([
+            Protein(refseq=f'NM_{i:04d}', gene=genes[i % len(genes)], sequence='MA')
+            for i in range(10)
+        ])
+        db.session.commit()
+
+        def browse(offset, order='asc', limit=3):
+            response = self.client.get(
+                f'/protein/browse_data/?sort=gene_name&order={order}&offset={offset}&limit={limit}'
+            )
+            assert response.status_code == 200
+            return response.json
+
+        for order in ['asc', 'desc']:
+            # one query for the whole table, paginated by offset
+            expected = [row['refseq'] for row in browse(0, order, limit=10)['rows']]
+            assert len(expected) == 10
+
+            served = []
+            for offset in range(0, 10, 3):
+                with count_queries() as queries:
+                    page = browse(offset, order)
+                served.extend(row['refseq'] for row in page['rows'])
+                assert page['total'] == 10
+                # the count is cached
+                assert not any('count(' in query.lower() for query in queries)
+                # following pages seek to the cursor left by the previous ones
+                seeks = any('protein.id >' in query or 'protein.id <' in query for query in queries)
+                assert seeks == bool(offset)
+
+            assert served == expected
+
+            # jumping to a page not preceded by a served one falls back to the offset
+            with count_queries() as queries:
+                assert [row['refseq'] for row in browse(5, order)['rows']] == expected[5:8]
+            assert not any('protein.id >' in query or 'protein.id <' in query for query in queries)
+
+        # changes made in this process invalidate the cached counts at once
+        db.session.add(Protein(refseq='NM_0010', gene=genes[0], sequence='MA'))
+        db.session.commit()
+        assert browse(0)['total'] == 11
+
+        # and the imports - in any process
+        db.session.execute(Protein.__table__.insert().values(refseq='NM_0011', gene_id=genes[0].id, sequence='MA'))
+        assert browse(0)['total'] == 11
+        mark_data_imported()
+        assert browse(0)['total'] == 12
+
+        self.app.config['TABLE_COUNT_LIMIT'] = 5
+        try:
+            data = browse(0)
+        finally:
+            del self.app.config['TABLE_COUNT_LIMIT']
+        assert data['total'] == 5
+        assert data['total_is_lower_bound']
+        assert 'total_is_lower_bound' not in browse(0)
+
     def test_redirect(self):
 
         p = Protein(**test_protein_data())
@@ -80,8 +145,43 @@ class TestProteinView(ViewTest):
 
         p = Protein(**test_protein_data())
         p.mutations = create_test_mutations()
+        p.sites = [Site(position=2, residue='A')]
         db.session.add(p)
 
-        response = self.client.get('/protein/known_mutations/NM_000123')
+        with count_queries() as queries:
+            response = self.client.get('/protein/known_mutations/NM_000123')
         muts = response.json
         assert len(muts) == 4
+        assert all(mut['closest_sites'] == ['2 A'] for mut in muts)
+
+        # the closest sites of all the mutations are looked up at once
+        assert sum('site.position BETWEEN' in query for query in queries) == 1
+
+        # compressed once, by the hash of the content
+        compressed = self.client.get('/protein/known_mutations/NM_000123', headers={'Accept-Encoding': 'gzip'})
+        assert compressed.headers['Content-Encoding'] == 'gzip'
+        assert json.loads(gzip.decompress(compressed.data)) == muts
+        assert compressed.headers['ETag'] != response.headers['ETag']
+
+        # in the caches of the tests, not of the deployed instance
+        from views._commons import compressed_responses
+        assert Path(compressed_responses.directory).parent == Path(self.app.config['CACHE_ROOT'])
+        assert len(compressed_responses)
+
+        # revalidation of unchanged data
+        for previous, encoding in [(response, ''), (compressed, 'gzip')]:
+            not_modified = self.client.get(
+                '/protein/known_mutations/NM_000123',
+                headers={'If-None-Match': previous.headers['ETag'], 'Accept-Encoding': encoding}
+            )
+            assert not_modified.status_code == 304
+            assert not not_modified.data
+
+        # but not of the changed data
+        p.mutations[0].alt = 'W'
+        db.session.commit()
+        changed = self.client.get(
+            '/protein/known_mutations/NM_000123',
+            headers={'If-None-Match': response.headers['ETag']}
+        )
+        assert changed.status_code == 200
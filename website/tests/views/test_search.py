@@ -5,7 +5,7 @@ from time import sleep
 from celery import Celery
 
 from view_testing import ViewTest, relative_location
-from miscellaneous import mock_proteins_and_genes
+from miscellaneous import mock_proteins_and_genes, count_queries
 
 from database import db
 from models import Gene, Pathway, GeneList, MC3Mutation, Disease, InheritedMutation, ClinicalData, SiteType
@@ -373,6 +373,43 @@ class TestSearchView(ViewTest):
 
         assert all(r == result for r in results) and result
 
+    def test_run_with_budgets(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from time import perf_counter
+        from views.search import run_with_budgets
+
+        def slow():
+            sleep(1)
+            return 'slow'
+
+        def fast():
+            return 'fast'
+
+        tasks = {'slow': (slow, 0.1), 'fast': (fast, 0.5)}
+
+        with ThreadPoolExecutor(2) as executor:
+            start = perf_counter()
+            results = run_with_budgets(tasks, executor)
+            # not waiting for the slow task
+            assert perf_counter() - start < 0.9
+
+        assert results == {'fast': 'fast'}
+
+        # without an executor all the tasks are run
+        assert run_with_budgets(tasks) == {'slow': 'slow', 'fast': 'fast'}
+
+    def test_gene_list_name(self):
+        from views.search import gene_list_name
+
+        assert gene_list_name(MC3Mutation.name) is None
+
+        db.session.add(GeneList(name='TCGA', mutation_source_name=MC3Mutation.name))
+        assert gene_list_name(MC3Mutation.name) == 'TCGA'
+
+        with count_queries() as queries:
+            assert gene_list_name(MC3Mutation.name) == 'TCGA'
+        assert not queries
+
     def test_save_search(self):
         self.login('user@domain.org', 'password', create=True)
 
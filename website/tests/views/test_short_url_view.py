@@ -1,8 +1,23 @@
+from random import choice, randint, seed
+from string import ascii_lowercase
+from time import perf_counter
+
+import pytest
+from Levenshtein import distance
+
 from view_testing import ViewTest
 from database import db
+from models import BadWord
 import json
 
 
+def random_words(count, alphabet=ascii_lowercase[:8]):
+    return [
+        ''.join(choice(alphabet) for _ in range(randint(3, 10)))
+        for _ in range(count)
+    ]
+
+
 class TestShortUrl(ViewTest):
 
     def test_get_and_visit(self):
@@ -34,3 +49,56 @@ class TestShortUrl(ViewTest):
 
         for word in should_fail:
             assert short_url.is_word_obscene(word)
+
+    def test_deletions_index(self):
+        from views.short_url import DeletionsIndex
+        seed(0)
+        words = random_words(500)
+
+        for max_distance in range(3):
+            index = DeletionsIndex(words, max_distance)
+            for word in random_words(300):
+                assert index.has_word_within(word) == any(
+                    distance(word, other) <= max_distance for other in words
+                )
+
+        assert not DeletionsIndex([], 2).has_word_within('word')
+
+    def test_profanities_reload(self):
+        from views import short_url
+        short_url.list_of_profanities = None
+
+        assert not short_url.is_word_obscene('some_bad_word')
+
+        db.session.add(BadWord(word='some_bad_word'))
+        db.session.commit()
+
+        assert short_url.is_word_obscene('some_bad_word')
+
+    @pytest.mark.serial
+    def test_benchmark(self):
+        """Compare the index with the linear scan which it replaced (run with: -m serial -s)."""
+        from views import short_url
+        seed(0)
+        profanities = random_words(10000, alphabet=ascii_lowercase)
+        short_url.list_of_profanities = profanities
+        # shorthands are long enough to be checked with the edit distance
+        words = random_words(200, alphabet=ascii_lowercase + '0123456789') + profanities[:20]
+
+        def linear_scan(word):
+            return any(distance(word, profanity) < 3 for profanity in profanities)
+
+        start = perf_counter()
+        short_url.get_profanities_index()
+        print(f'building the index: {(perf_counter() - start) * 1000:.1f} ms')
+
+        timings = {}
+        results = {}
+        for name, check in [('linear scan', linear_scan), ('index', short_url.get_profanities_index().similar.has_word_within)]:
+            start = perf_counter()
+            results[name] = [check(word) for word in words]
+            timings[name] = (perf_counter() - start) / len(words)
+            print(f'{name}: {timings[name] * 1000:.3f} ms per word')
+
+        assert results['index'] == results['linear scan']
+        assert timings['index'] < timings['linear scan']
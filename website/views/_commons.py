@@ -1,9 +1,12 @@
 import gzip
 from collections import defaultdict
-from typing import Dict, Set
+from hashlib import sha256
+from time import time
+from typing import Dict, Set, Iterable
 
 from flask import request, Response
 
+from helpers.cache import Cache
 from models import Gene
 from models.bio.drug import Drug, DrugTarget
 
@@ -45,10 +48,49 @@ def drugs_interacting_with_kinases(filter_manager, kinases) -> Dict[Gene, Set[Dr
     return targets_by_kinase
 
 
+# content hash -> (time when the content was first served, gzipped content)
+compressed_responses = Cache('.compressed_responses', size_limit=2 ** 30)
+
+
 def compress(response: Response, level=7) -> Response:
+    """Gzip the response (if accepted by the client) and make it conditional.
+
+    The compressed bodies are cached by the hash of the content, so that
+    identical payloads are compressed only once. The hash is sent as the
+    ETag and the time of the first response with this content - as the
+    Last-Modified date, so that the revalidation requests of clients
+    which have an up-to-date copy are answered with 304 Not Modified.
+    """
+    if response.status_code != 200 or 'Content-Encoding' in response.headers:
+        return response
+
+    data = response.get_data()
+    digest = sha256(data).hexdigest()
+    key = (digest, level)
+
+    cached = compressed_responses.get(key)
+    if cached is None:
+        cached = time(), gzip.compress(data, level)
+        compressed_responses.set(key, cached)
+    first_served, compressed = cached
+
+    response.vary.add('Accept-Encoding')
+
     if 'gzip' in request.headers.get('Accept-Encoding', '').lower():
-        data = response.data
-        response.data = gzip.compress(data, level)
-        response.headers['Content-length'] = len(data)
+        response.set_data(compressed)
         response.headers['Content-Encoding'] = 'gzip'
-    return response
+        # the ETag has to differ between encodings of the same content
+        digest += '-gzip'
+
+    response.set_etag(digest)
+    response.last_modified = first_served
+
+    return response.make_conditional(request)
+
+
+def warm_up_responses(app, paths: Iterable[str]):
+    """Request given paths so that the compressed responses are cached (e.g. after an import)."""
+    with app.test_client() as client:
+        for path in paths:
+            response = client.get(path, headers={'Accept-Encoding': 'gzip'})
+            print(f'{path}: {response.status}')
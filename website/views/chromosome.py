@@ -3,7 +3,7 @@ from flask_classful import FlaskView
 from flask import jsonify
 
 from database import bdb
-from models import source_manager
+from models import source_manager, Mutation
 from helpers.filters.manager import FilterManager
 from .filters import common_filters
 from ._commons import represent_mutation
@@ -23,8 +23,14 @@ def represent_mutations(mutations, filter_manager):
     data_filter = filter_manager.apply
 
     response = []
+    mutations = list(mutations)
 
-    for mutation in mutations:
+    closest_sites_of_mutations = Mutation.find_closest_sites_in_bulk(
+        (mutation.protein_id, mutation.position)
+        for mutation in mutations
+    )
+
+    for mutation, closest_sites in zip(mutations, closest_sites_of_mutations):
 
         needle = represent_mutation(
             mutation,
@@ -60,9 +66,6 @@ def represent_mutations(mutations, filter_manager):
         if mimp:
             metadata['MIMP'] = mimp.to_json()
 
-        closest_sites = mutation.find_closest_sites(
-            site_filter=data_filter
-        )
         needle['closest_sites'] = [
             '%s %s' % (site.position, site.residue)
             for site in closest_sites
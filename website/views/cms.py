@@ -2,9 +2,12 @@ import re
 from os import path
 from functools import wraps
 from pathlib import Path
+from typing import Callable, List, NamedTuple
+from weakref import WeakKeyDictionary
 
 from bs4 import BeautifulSoup
 from flask import current_app, jsonify
+from flask import g, has_app_context
 from flask import escape
 from flask import flash
 from flask import render_template as template
@@ -34,13 +37,17 @@ from models import PageMenuEntry
 from models import CustomMenuEntry
 from models import Setting
 from models import User
+from models import ContentVersion
 from database import db
 from database import get_or_create
 from app import recaptcha, limiter
+from helpers.cache import imported_data_version
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.orm.exc import MultipleResultsFound
 from sqlalchemy.exc import IntegrityError, OperationalError
-from stats import STORES
+from stats import STORES, get_stored_value
 from exceptions import ValidationError
 
 
@@ -97,11 +104,10 @@ def render_help_entry(entry_id, entry_class=''):
 
 
 def plot_factory(plot_name, macro_name, store_name):
-    store = STORES[store_name]
 
     def plot(name, *args, **kwargs):
         try:
-            data = store[name]
+            data = get_stored_value(store_name, name)
         except KeyError:
             return f'<- failed to load {name} {plot_name} ->'
         macro = get_jinja_macro('plots.html', macro_name)
@@ -111,6 +117,13 @@ def plot_factory(plot_name, macro_name, store_name):
     return plot
 
 
+def plot_data(name):
+    try:
+        return get_stored_value('Plots', name)
+    except KeyError:
+        return f'{{"error": "failed to load plot data: {name}"}}'
+
+
 def dependency(name):
     return current_app.dependency_manager.get_dependency(name)
 
@@ -122,7 +135,7 @@ USER_ACCESSIBLE_VARIABLES = {
     'bar_plot': plot_factory('BarPlot', 'bar_plot', 'Plots'),
     'pie_chart': plot_factory('PieChart', 'pie_chart', 'Plots'),
     'static_plot': plot_factory('StaticPlot', 'static_plot', 'Plots'),
-    'plot_data': lambda name: STORES['Plots'].get(name, f'{{"error": "failed to load plot data: {name}"}}'),
+    'plot_data': plot_data,
     'contact_form': create_contact_form,
     'dependency': dependency,
     'help': render_help_entry,
@@ -218,6 +231,126 @@ def get_system_setting(name):
     return Setting.query.filter_by(name=name).first()
 
 
+class CachedMenuEntry(NamedTuple):
+    title: str
+    url: str
+    position: float
+    children: List['CachedMenuEntry']
+
+    @classmethod
+    def from_entry(cls, entry: MenuEntry):
+        return cls(entry.title, entry.url, entry.position, [cls.from_entry(child) for child in entry.children])
+
+
+class CachedMenu(NamedTuple):
+    name: str
+    top_level_entries: List[CachedMenuEntry]
+
+
+class CachedPage(NamedTuple):
+    title: str
+    address: str
+    content: str
+
+
+class ContentCache:
+    """Content of the CMS needed to render the pages: settings, menus, pages, text and help entries.
+
+    The content is cached per process (for each database engine) as long
+    as the version stored in the database (`ContentVersion`) and the version
+    of imported data are the same; these are checked once per request,
+    after which the content is taken from `flask.g`.
+
+    The CMS write paths have to call `content_changed()` before committing.
+    """
+
+    cached_models = (Setting, Menu, MenuEntry, Page, TextEntry, HelpEntry)
+
+    def __init__(self):
+        # engine -> (versions, content kind -> key -> cached value)
+        self.cached = WeakKeyDictionary()
+        event.listen(Session, 'after_flush', self.after_flush)
+
+    @staticmethod
+    def engine():
+        return db.session.get_bind(mapper=inspect(ContentVersion))
+
+    def forget(self, engine):
+        self.cached.pop(engine, None)
+        if has_app_context():
+            g.pop('cms_content', None)
+
+    def after_flush(self, session, flush_context):
+        # changes made in this process are visible at once
+        changed = session.new | session.dirty | session.deleted
+        if any(isinstance(instance, self.cached_models) for instance in changed):
+            self.forget(session.get_bind(mapper=inspect(ContentVersion)))
+
+    @staticmethod
+    def start_request():
+        # `flask.g` outlives the request if the app context was pushed earlier
+        g.pop('cms_content', None)
+
+    def content(self) -> dict:
+        if 'cms_content' not in g:
+            engine = self.engine()
+            versions = (
+                db.session.query(func.sum(ContentVersion.value)).scalar(),
+                imported_data_version()
+            )
+            cached_versions, content = self.cached.get(engine, (None, None))
+            if content is None or cached_versions != versions:
+                content = {}
+                self.cached[engine] = versions, content
+            g.cms_content = content
+        return g.cms_content
+
+    def get(self, kind: str, key, load: Callable):
+        content = self.content().setdefault(kind, {})
+        if key not in content:
+            content[key] = load(key)
+        return content[key]
+
+    def content_changed(self):
+        """Increment the stored version of the content, so that all processes reload it."""
+        if not ContentVersion.query.update({ContentVersion.value: ContentVersion.value + 1}):
+            db.session.add(ContentVersion(value=1))
+        self.forget(self.engine())
+
+
+content_cache = ContentCache()
+
+
+def load_setting_value(name):
+    setting = get_system_setting(name)
+    return setting.value if setting else None
+
+
+def load_menu(menu_id):
+    menu = Menu.query.get(menu_id)
+    if not menu:
+        return None
+    return CachedMenu(menu.name, [CachedMenuEntry.from_entry(entry) for entry in menu.top_level_entries])
+
+
+def load_content_of(model):
+    def load_content(name):
+        entry = model.query.filter_by(name=name).first()
+        return entry.content if entry else None
+    return load_content
+
+
+def get_cached_page(address):
+    pages = content_cache.content().setdefault('page', {})
+    # only the existing pages are cached (there are infinitely many of the missing ones)
+    if address not in pages:
+        page = Page.query.filter_by(address=address).first()
+        if not page:
+            return None
+        pages[address] = CachedPage(page.title, page.address, page.content)
+    return pages[address]
+
+
 def thousand_separated_number(x):
     return '{:,}'.format(int(x))
 
@@ -265,14 +398,13 @@ class ContentManagementSystem(FlaskView):
     @staticmethod
     def _system_menu(name):
         assert name in MENU_SLOT_NAMES
-        setting = get_system_setting(name)
-        if not setting:
+        menu_id = content_cache.get('setting', name, load_setting_value)
+        if menu_id is None:
             return {
                 'is_active': False,
                 'message': Markup('<!-- Menu "' + name + '" is not set --!>')
             }
-        menu_id = setting.int_value
-        menu = Menu.query.get(menu_id)
+        menu = content_cache.get('menu', int(menu_id), load_menu)
         if not menu:
             return {
                 'is_active': False,
@@ -287,18 +419,16 @@ class ContentManagementSystem(FlaskView):
 
     @staticmethod
     def _system_setting(name):
-        setting = get_system_setting(name)
-        if setting:
-            return setting.value
+        return content_cache.get('setting', name, load_setting_value)
 
     @staticmethod
     def _text_entry(name):
-        entry = TextEntry.query.filter_by(name=name).first()
-        if not entry or not entry.content:
+        content = content_cache.get('text_entry', name, load_content_of(TextEntry))
+        if not content:
             if current_user.access_level >= 5:
                 return 'Please, click the pencil icon to add text here.'
             return ''
-        return entry.content
+        return content
 
     @route('/admin/save_text_entry/', methods=['POST'])
     @moderator_or_admin
@@ -313,6 +443,7 @@ class ContentManagementSystem(FlaskView):
         status = 200
         text_entry.content = new_content
         try:
+            content_cache.content_changed()
             db.session.commit()
         except (IntegrityError, OperationalError) as e:
             print(e)
@@ -327,13 +458,13 @@ class ContentManagementSystem(FlaskView):
 
     @staticmethod
     def _inline_help(name):
-        help_entry = HelpEntry.query.filter_by(name=name).first()
-        if not help_entry or not help_entry.content:
+        content = content_cache.get('help_entry', name, load_content_of(HelpEntry))
+        if not content:
             empty = 'This element has no help text defined yet.'
             if current_user.access_level >= 5:
                 empty += '\nPlease, click the pencil icon to add help.'
             return empty
-        return help_entry.content
+        return content
 
     @moderator_or_admin
     def link_list(self):
@@ -355,6 +486,7 @@ class ContentManagementSystem(FlaskView):
             status = 200
             help_entry.content = new_content
             try:
+                content_cache.content_changed()
                 db.session.commit()
             except (IntegrityError, OperationalError) as e:
                 print(e)
@@ -379,7 +511,7 @@ class ContentManagementSystem(FlaskView):
 
     @route('/<path:address>/')
     def page(self, address):
-        page = get_page(address)
+        page = get_cached_page(address) or get_page(address)
         return self._template('page', page=page)
 
     @route('/send_message/', methods=['POST'])
@@ -468,6 +600,7 @@ class ContentManagementSystem(FlaskView):
 
             menu = Menu(name=name)
             db.session.add(menu)
+            content_cache.content_changed()
             db.session.commit()
 
             flash('Added new menu: ' + escape(menu.name), 'success')
@@ -521,6 +654,7 @@ class ContentManagementSystem(FlaskView):
                             entry = MenuEntry.query.get(entry_id)
                             handler(entry, value)
 
+            content_cache.content_changed()
             db.session.commit()
         except ValueError:
             flash('Wrong value for position', 'danger')
@@ -541,6 +675,7 @@ class ContentManagementSystem(FlaskView):
                     db.session.add(setting)
                 setting.value = value
 
+                content_cache.content_changed()
                 db.session.commit()
         return redirect(goto)
 
@@ -557,6 +692,7 @@ class ContentManagementSystem(FlaskView):
             db.session.add(setting)
         setting.value = value
 
+        content_cache.content_changed()
         db.session.commit()
         return redirect(goto)
 
@@ -566,6 +702,7 @@ class ContentManagementSystem(FlaskView):
         if menu:
             name, menu_id = menu.name, menu.id
             db.session.delete(menu)
+            content_cache.content_changed()
             db.session.commit()
             flash(
                 'Successfully removed menu "{0}" (id: {1})'.format(
@@ -585,6 +722,7 @@ class ContentManagementSystem(FlaskView):
             page = Page.query.get(page_id)
             entry = PageMenuEntry(page=page)
             menu.entries.append(entry)
+            content_cache.content_changed()
             db.session.commit()
         except IntegrityError:
             db.session.rollback()
@@ -601,6 +739,7 @@ class ContentManagementSystem(FlaskView):
             address=request.form['url']
         )
         menu.entries.append(entry)
+        content_cache.content_changed()
         db.session.commit()
 
         return redirect(url_for('ContentManagementSystem:list_menus'))
@@ -611,6 +750,7 @@ class ContentManagementSystem(FlaskView):
         entry = MenuEntry.query.get(entry_id)
         menu.entries.remove(entry)
         db.session.delete(entry)
+        content_cache.content_changed()
         db.session.commit()
         return redirect(url_for('ContentManagementSystem:list_menus'))
 
@@ -633,6 +773,7 @@ class ContentManagementSystem(FlaskView):
                 **page_data
             )
             db.session.add(page)
+            content_cache.content_changed()
             db.session.commit()
 
             flash(
@@ -667,6 +808,7 @@ class ContentManagementSystem(FlaskView):
                 if not page.address:
                     raise ValidationError('Address cannot be empty')
 
+                content_cache.content_changed()
                 db.session.commit()
                 flash(
                     'Page saved: ' + link_to_page(page),
@@ -717,6 +859,7 @@ class ContentManagementSystem(FlaskView):
         if page:
             title, page_id = page.title, page.id
             db.session.delete(page)
+            content_cache.content_changed()
             db.session.commit()
             flash(
                 'Successfully removed page "{0}" (id: {1})'.format(
@@ -122,9 +122,17 @@ class HashableDict(dict):
 
 
 class CachedQueries:
+    """Choices of the filters, queried on the first use (rather than on import)."""
 
-    def __init__(self):
+    def __getattr__(self, name):
+        # called only if the attribute is missing, i.e. before the first reload
+        if name.startswith('__'):
+            raise AttributeError(name)
         self.reload()
+        try:
+            return self.__dict__[name]
+        except KeyError:
+            raise AttributeError(name)
 
     def reload(self):
         """Should be called after each cancer and public-dataset addition or change
@@ -441,7 +441,7 @@ class NetworkView(AbstractProteinView):
         return jsonify(response)
 
     def predicted_data(self, refseq):
-        return compress(self.data(refseq, include_mimp_gain_kinases=True))
+        return self.data(refseq, include_mimp_gain_kinases=True)
 
     def data(self, refseq, include_mimp_gain_kinases=False):
         """Internal endpoint used for network rendering and asynchronous updates"""
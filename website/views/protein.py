@@ -12,6 +12,7 @@ from helpers.views import AjaxTableView
 from models import Mutation, Site, source_manager
 from models import Protein
 from .abstract_protein import AbstractProteinView, get_raw_mutations
+from ._commons import compress
 from .chromosome import represent_mutations
 from .sequence import SequenceViewFilters, prepare_sites
 
@@ -135,7 +136,7 @@ class ProteinView(AbstractProteinView):
             filter_manager
         )
 
-        return jsonify(parsed_mutations)
+        return compress(jsonify(parsed_mutations))
 
     def sites(self, refseq):
         """REST API endpoint"""
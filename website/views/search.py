@@ -1,6 +1,11 @@
 import pickle
 from collections import defaultdict
+from concurrent.futures import Executor, ThreadPoolExecutor, TimeoutError
+from functools import lru_cache, partial
+from time import perf_counter
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
 from urllib.parse import unquote
+from weakref import WeakKeyDictionary
 
 from flask import make_response, redirect, abort
 from flask import render_template as template
@@ -9,16 +14,18 @@ from flask import jsonify
 from flask import url_for
 from flask import flash
 from flask import current_app
+from flask import copy_current_request_context
 from flask_classful import FlaskView
 from flask_classful import route
 from flask_login import current_user
 from sqlalchemy.orm import Load
 from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.pool import StaticPool
 
 from app import celery
 from helpers.bioinf import complement
 from models import (
-    Protein, Pathway, Cancer, GeneList, MC3Mutation, Disease, InheritedMutation, ClinicalData,
+    Protein, GeneList, MC3Mutation, Disease, InheritedMutation, ClinicalData,
     OrderedDict,
     List,
 )
@@ -27,15 +34,16 @@ from search.mutation import MutationSearch
 from models import Gene
 from models import Mutation
 from models import UsersMutationsDataset
-from sqlalchemy import exists, or_, text
+from sqlalchemy import exists, text
 from helpers.filters.manager import quote_if_needed
 from helpers.widgets import FilterWidget
 from search.mutation_result import SearchResult
 from search.task import SearchTask, search_task
 from views.gene import prepare_subqueries
 from search.protein_mutations import get_protein_muts
-from database import db, levenshtein_sorted, bdb
+from database import db, levenshtein_sorted, bdb, get_engine
 from search.gene import GeneMatch, search_feature_engines
+from search.suggestions import pathways_index, cancers_index, diseases_index
 
 
 def create_engines(options=None):
@@ -45,20 +53,26 @@ def create_engines(options=None):
     return engines
 
 
-advanced_search_engines = create_engines()
-search_bar_search_engines = create_engines(
-    [
+@lru_cache()
+def advanced_search_engines():
+    return create_engines()
 
-        Load(Gene).defer('full_name').defer('strand').defer('chrom').defer('entrez_id'),
-        Load(Protein).defer('summary').defer('sequence').defer('disorder_map')
-    ]
-)
+
+@lru_cache()
+def search_bar_search_engines():
+    return create_engines(
+        [
+
+            Load(Gene).defer('full_name').defer('strand').defer('chrom').defer('entrez_id'),
+            Load(Protein).defer('summary').defer('sequence').defer('disorder_map')
+        ]
+    )
 
 
 def search_proteins(
         phrase, limit=None, filter_manager=None,
         features=('gene_symbol', 'refseq', 'gene_name', 'uniprot'),
-        engines=advanced_search_engines
+        engines=None
 ):
     """Search for a protein isoform or gene.
     Only genes which have a primary isoforms will be returned.
@@ -78,7 +92,11 @@ def search_proteins(
             the search; must be a subset of search.gene.search_features
         engines:
             mapping of engine name => engine instance of engines to use
+            (the advanced search engines by default)
     """
+    if engines is None:
+        engines = advanced_search_engines()
+
     if isinstance(features, str):
         features = [features]
 
@@ -133,7 +151,7 @@ def make_widgets(filter_manager):
                 filter=filter_manager.filters['Feature.name'],
                 labels=[
                     engine.pretty_name
-                    for engine in advanced_search_engines.values()
+                    for engine in advanced_search_engines().values()
                 ],
                 all_selected_label='All features',
                 class_name='checkboxes-inline'
@@ -415,6 +433,15 @@ class SearchView(FlaskView):
         else:
             return redirect(url_for('SearchView:proteins', proteins=query))
 
+    # time budgets (in seconds) of the sources of autocomplete_all suggestions
+    autocomplete_budgets = {
+        'mutations': 0.5,
+        'genes': 0.5,
+        'diseases': 0.4,
+        'pathways': 0.3,
+        'cancers': 0.3
+    }
+
     def autocomplete_all(self):
         """
         Supports:
@@ -441,11 +468,36 @@ class SearchView(FlaskView):
 
         query = unquote(request.args.get('q')) or ''
 
-        items = []
+        sources = {
+            'genes': partial(autocomplete_gene, query, limit=2 if ' ' in query else 3),
+            'pathways': partial(suggest_matching_pathways, query),
+            'cancers': partial(suggest_matching_cancers, query),
+            'diseases': partial(suggest_matching_diseases, query)
+        }
 
         if ' ' in query or query.upper().startswith('CHR'):
+            sources['mutations'] = partial(autocomplete_mutation, query)
+
+        executor = autocomplete_executor()
+
+        # the sources which did not finish within their budgets are skipped; each of the
+        # threads gets its own database session (removed when its context is popped)
+        results = run_with_budgets(
+            {
+                name: (
+                    copy_current_request_context(source) if executor else source,
+                    self.autocomplete_budgets[name]
+                )
+                for name, source in sources.items()
+            },
+            executor=executor
+        )
+
+        items = []
+
+        if 'mutations' in results:
             # TODO: use exceptions for messaging control?
-            mutation_result = autocomplete_mutation(query)
+            mutation_result = results['mutations']
             if type(mutation_result) is tuple:
                 mutations, are_there_more_muts = mutation_result
                 items.extend(mutations)
@@ -458,41 +510,98 @@ class SearchView(FlaskView):
             else:
                 items.extend(mutation_result)
 
-        if ' ' in query:
-            genes, are_there_more_genes = autocomplete_gene(query, limit=2)
-        else:
-            genes, are_there_more_genes = autocomplete_gene(query, limit=3)
+        if 'genes' in results:
+            genes, are_there_more_genes = results['genes']
 
-        items.extend(genes)
-        if are_there_more_genes:
-            items.append({
-                'type': 'see_more',
-                'name': f'Show all genes matching <i>{query}</i>',
-                'url': url_for('SearchView:proteins', proteins=query)
-            })
+            items.extend(genes)
+            if are_there_more_genes:
+                items.append({
+                    'type': 'see_more',
+                    'name': f'Show all genes matching <i>{query}</i>',
+                    'url': url_for('SearchView:proteins', proteins=query)
+                })
 
-        pathways = suggest_matching_pathways(query)
+        items.extend(results.get('diseases', []))
+        items.extend(results.get('pathways', []))
+        items.extend(results.get('cancers', []))
 
-        cancers = suggest_matching_cancers(query)
+        return jsonify({'entries': items})
 
-        diseases = suggest_matching_diseases(query)
-        items.extend(diseases)
 
-        items.extend(pathways)
-        items.extend(cancers)
+@lru_cache()
+def autocomplete_executor(max_workers=8) -> Optional[Executor]:
+    """Thread pool for the autocomplete sources, shared by the requests.
 
-        return jsonify({'entries': items})
+    None is returned if the database engine cannot be used concurrently
+    (i.e. it has a single connection, as sqlite in-memory databases do).
+    """
+    if isinstance(get_engine('bio').pool, StaticPool):
+        return None
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='autocomplete')
 
 
-def suggest_matching_cancers(query, count=2):
-    cancers = levenshtein_sorted(Cancer.query.filter(
-        or_(
-            Cancer.code.ilike(query + '%'),
-            Cancer.name.ilike('%' + query + '%'),
+def run_with_budgets(tasks: Mapping[str, Tuple[Callable, float]], executor: Executor = None) -> Dict[str, Any]:
+    """Run the tasks concurrently, collecting results of those which finished within their budgets.
+
+    The tasks which did not finish in time are left to complete in background
+    (their results are discarded), so the time of waiting is bounded by the
+    longest of the budgets rather than by the sum of durations of the tasks.
+
+    Args:
+        tasks: name -> (function to run, time budget in seconds)
+        executor: where to submit the tasks; if None, the tasks are run
+            one after another and all the results are returned
+
+    Returns:
+        name -> result, for the tasks which finished in time
+    """
+    if not executor:
+        return {name: task() for name, (task, budget) in tasks.items()}
+
+    start = perf_counter()
+    futures = {
+        name: executor.submit(task)
+        for name, (task, budget) in tasks.items()
+    }
+    results = {}
+
+    for name, (task, budget) in sorted(tasks.items(), key=lambda item: item[1][1]):
+        try:
+            results[name] = futures[name].result(timeout=max(0, start + budget - perf_counter()))
+        except TimeoutError:
+            futures[name].cancel()
+            print(f'{name} did not finish within {budget}s budget')
+
+    return results
+
+
+# database engine -> mutation source name -> name of its gene list
+gene_lists_names = WeakKeyDictionary()
+
+
+def gene_list_name(mutation_source_name) -> Optional[str]:
+    """Name of the gene list of given mutation source.
+
+    The names are cached, as the lists change only on import (missing
+    lists are looked up again).
+    """
+    names = gene_lists_names.setdefault(get_engine('bio'), {})
+    if mutation_source_name not in names:
+        gene_list = (
+            db.session.query(GeneList.name)
+            .filter_by(mutation_source_name=mutation_source_name)
+            .first()
         )
-    ), Cancer.name, query).limit(count)
+        if not gene_list:
+            return None
+        names[mutation_source_name] = gene_list.name
+    return names[mutation_source_name]
+
+
+def suggest_matching_cancers(query, count=2):
+    cancers = cancers_index.search(query, count, or_prefix_of='code')
 
-    tcga_list = GeneList.query.filter_by(mutation_source_name=MC3Mutation.name).first()
+    tcga_list_name = gene_list_name(MC3Mutation.name)
 
     return [
         {
@@ -501,9 +610,9 @@ def suggest_matching_cancers(query, count=2):
             'type': 'cancer',
             'url': url_for(
                 'GeneView:list',
-                list_name=tcga_list.name,
+                list_name=tcga_list_name,
                 filters=(
-                    f'Mutation.sources:in:{tcga_list.mutation_source_name}'
+                    f'Mutation.sources:in:{MC3Mutation.name}'
                     f';Mutation.mc3_cancer_code:in:{cancer.code}'
                 )
             )
@@ -524,14 +633,9 @@ def suggest_matching_diseases(q, count=3):
         potential_disease = q[:-1]
 
     if potential_disease:
-        disease = (
-            levenshtein_sorted(
-                Disease.query.filter(Disease.name.ilike('%' + potential_disease + '%')),
-                Disease.name,
-                potential_disease
-            )
-        ).first()
-        if disease:
+        diseases = diseases_index.search(potential_disease, 1)
+        if diseases:
+            disease = diseases[0]
             return json_message(
                 f'Do you wish to search for <i>{disease.name}</i> mutations? '
                 'Please specify gene, using: <code>{disease} in {gene}</code> schema'
@@ -602,27 +706,23 @@ def suggest_matching_diseases(q, count=3):
                 for disease_name, disease_id, gene, refseq, muts in query
             ]
 
-    diseases = levenshtein_sorted(Disease.query.filter(
-        or_(
-            Disease.name.ilike('%' + q + '%'),
-        )
-    ), Disease.name, q).limit(count)
+    diseases = diseases_index.search(q, count)
 
-    clinvar_list = GeneList.query.filter_by(mutation_source_name=InheritedMutation.name).first()
+    clinvar_list_name = gene_list_name(InheritedMutation.name)
 
-    if not clinvar_list:
+    if not clinvar_list_name:
         print('ClinVar gene list not present cannot suggest diseases just yet')
 
-    if clinvar_list:
+    if clinvar_list_name:
         items += [
             {
                 'name': disease.name,
                 'type': 'disease',
                 'url': url_for(
                     'GeneView:list',
-                    list_name=clinvar_list.name,
+                    list_name=clinvar_list_name,
                     filters=(
-                        f'Mutation.sources:in:{clinvar_list.mutation_source_name}'
+                        f'Mutation.sources:in:{InheritedMutation.name}'
                         f';Mutation.disease_id:in:{quote_if_needed(disease.id)}'
                     )
                 )
@@ -638,20 +738,12 @@ def suggest_matching_pathways(query, count=2):
 
     if query.startswith('GO:'):
         go = query[3:]
-        pathway_filter = Pathway.gene_ontology.like(go + '%')
-        column = Pathway.gene_ontology
+        pathways = pathways_index.search_prefix('gene_ontology', go, count + 1)
     elif query.startswith('REAC:'):
         reactome = query[5:]
-        pathway_filter = Pathway.reactome.like(reactome + '%')
-        column = Pathway.reactome
+        pathways = pathways_index.search_prefix('reactome', reactome, count + 1)
     else:
-        pathway_filter = Pathway.description.like('%' + query + '%')
-        column = Pathway.description
-
-    pathways = Pathway.query.filter(pathway_filter)
-    pathways = levenshtein_sorted(pathways, column, query)
-
-    pathways = pathways.limit(count + 1).all()
+        pathways = pathways_index.search(query, count + 1)
 
     # show {count} of pathways; if we got {count} + 1 results suggest searching for all
 
@@ -698,7 +790,7 @@ def autocomplete_gene(query, limit=5):
 
     Returns: (autocompletion_gene_results, are_there_more)
     """
-    entries = search_proteins(query, limit + 1, engines=search_bar_search_engines)
+    entries = search_proteins(query, limit + 1, engines=search_bar_search_engines())
 
     items = [
         gene.to_json()
@@ -1,20 +1,114 @@
+from collections import defaultdict
+from typing import Iterable, List, NamedTuple, Set
+
 from flask import jsonify
 from flask import redirect
 from flask import request
 from flask_classful import FlaskView
 from flask_classful import route
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from database import db
 from database import get_or_create
+from helpers.cache import imported_data_version
 from models import ShortURL
 from models import BadWord
 from urllib.parse import unquote
 from Levenshtein import distance
 
 
-list_of_profanities = [
-    bad_word.word
-    for bad_word in BadWord.query
-]
+# loaded on the first use; set to None to reload
+list_of_profanities = None
+# the list loaded from the database and the version of imported data at the time
+loaded_profanities = None
+loaded_version = None
+profanities_index = None
+
+
+class DeletionsIndex:
+    """Index of words for finding words within given edit distance of a word.
+
+    Implements the symmetric delete algorithm: each word is indexed under
+    all strings obtained by deleting up to `max_distance` of its characters.
+    Two words within `max_distance` edits from each other always share at
+    least one of such strings, so only the words sharing one with the query
+    need to have the edit distance computed.
+    """
+
+    def __init__(self, words: Iterable[str], max_distance: int):
+        self.max_distance = max_distance
+        self.words_by_deletion = defaultdict(set)
+        for word in words:
+            for deletion in self.deletions(word):
+                self.words_by_deletion[deletion].add(word)
+
+    def deletions(self, word: str) -> Set[str]:
+        deletions = {word}
+        previous = {word}
+        for _ in range(self.max_distance):
+            previous = {
+                variant[:i] + variant[i + 1:]
+                for variant in previous
+                for i in range(len(variant))
+            }
+            deletions.update(previous)
+        return deletions
+
+    def has_word_within(self, word: str) -> bool:
+        """Is any of the indexed words within `max_distance` edits from the word?"""
+        words_by_deletion = self.words_by_deletion
+        checked = set()
+        for deletion in self.deletions(word):
+            candidates = words_by_deletion.get(deletion)
+            if not candidates:
+                continue
+            for candidate in candidates - checked:
+                if distance(word, candidate) <= self.max_distance:
+                    return True
+            checked.update(candidates)
+        return False
+
+
+class ProfanitiesIndex(NamedTuple):
+    words: List[str]
+    exact: Set[str]
+    similar: DeletionsIndex
+
+
+def reset_profanities(session, flush_context):
+    global list_of_profanities
+    changed = session.new | session.dirty | session.deleted
+    if any(isinstance(instance, BadWord) for instance in changed):
+        list_of_profanities = None
+
+
+event.listen(Session, 'after_flush', reset_profanities)
+
+
+def get_profanities():
+    global list_of_profanities, loaded_profanities, loaded_version
+    version = imported_data_version()
+    # the words might have been imported by another process
+    if list_of_profanities is loaded_profanities and version != loaded_version:
+        list_of_profanities = None
+    if list_of_profanities is None:
+        list_of_profanities = [
+            bad_word.word
+            for bad_word in BadWord.query
+        ]
+        loaded_profanities = list_of_profanities
+        loaded_version = version
+    return list_of_profanities
+
+
+def get_profanities_index() -> ProfanitiesIndex:
+    global profanities_index
+    profanities = get_profanities()
+    if profanities_index is None or profanities_index.words is not profanities:
+        profanities_index = ProfanitiesIndex(
+            profanities, set(profanities), DeletionsIndex(profanities, max_distance=2)
+        )
+    return profanities_index
 
 
 def is_word_obscene(word):
@@ -32,16 +126,14 @@ def is_word_obscene(word):
         word = word.replace(representation, char)
 
     word = word.lower()
+    profanities = get_profanities_index()
 
     # for short words (these are valuable!) we want only exact matches
-    if len(word) < 6 and word not in list_of_profanities:
+    if len(word) < 6 and word not in profanities.exact:
         return False
 
     # for long words we need to be more cautious
-    if any(distance(word, profanity) < 3 for profanity in list_of_profanities):
-        return True
-    else:
-        return False
+    return profanities.similar.has_word_within(word)
 
 
 class ShortAddress(FlaskView):